@@ -0,0 +1,93 @@
+"""Compare the streaming extractor against the original BeautifulSoup code.
+
+Runs both extractors over the saved pages in fixtures/html, each page padded
+out to a multi-megabyte document, and reports throughput and peak memory.
+The app no longer depends on BeautifulSoup; install beautifulsoup4 to run
+the legacy side. The streaming side uses lxml when it is installed (it is
+in requirements.txt) and the much slower stdlib parser otherwise, so
+compare numbers from the same backend.
+
+    python benchmarks/bench_extraction.py [--scale 40] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tools import extraction  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'html')
+
+
+def legacy_extract(content: str) -> str:
+    """The extraction BrowserTool used before tools.extraction existed"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def streaming_extract(content: str) -> str:
+    return extraction.extract_text(content)
+
+
+def scale_page(html: str, scale: int) -> str:
+    """Repeat a page's body so it behaves like a very long document"""
+    match = re.search(r'<body[^>]*>(.*)</body>', html, re.DOTALL | re.IGNORECASE)
+    if not match or scale <= 1:
+        return html
+    body = match.group(1)
+    return html[:match.start(1)] + body * scale + html[match.end(1):]
+
+
+def measure(fn, content: str, repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(content)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=40, help='Body repetitions per page')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per page; the best is kept')
+    args = parser.parse_args()
+
+    extractors = [('legacy (bs4)', legacy_extract), ('streaming', streaming_extract)]
+    backend = 'lxml' if extraction.etree is not None else 'html.parser'
+    print(f"Streaming backend: {backend}, budget {extraction.EXTRACT_MAX_CHARS} chars\n")
+    print(f"{'page':<22}{'size':>9}  {'extractor':<14}{'MB/s':>9}{'peak MB':>10}{'chars out':>11}")
+
+    for path in sorted(glob.glob(os.path.join(FIXTURES, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            content = scale_page(f.read(), args.scale)
+        size_mb = len(content.encode('utf-8')) / (1024 * 1024)
+        for label, fn in extractors:
+            try:
+                seconds, peak, chars = measure(fn, content, args.repeat)
+            except ImportError as e:
+                print(f"{os.path.basename(path):<22}{size_mb:>7.1f}MB  {label:<14}skipped ({e})")
+                continue
+            print(f"{os.path.basename(path):<22}{size_mb:>7.1f}MB  {label:<14}"
+                  f"{size_mb / seconds:>9.1f}{peak / (1024 * 1024):>10.1f}{chars:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Measure application startup cost with `python -X importtime`.
+
+Imports each entry point in a fresh interpreter and reports the wall time
+to import it and the slowest modules it pulled in, along with whether
+crewai, langchain or playwright were loaded. Run it on the baseline commit
+and on the current tree to compare.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--top 10]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+SRC = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+# What each deployment path imports before it can do useful work
+ENTRY_POINTS = {
+    "ui": "import visualizer",
+    "worker": "import serving, agents",
+    "batch": "import batch",
+    "agents": "import agents",
+}
+HEAVY_PACKAGES = ("crewai", "langchain", "langchain_community", "playwright", "browser_use", "gradio")
+
+_IMPORTTIME_RE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+
+def import_once(statement: str) -> Tuple[float, List[Tuple[int, str]], str]:
+    """Run one import in a fresh interpreter; returns seconds, (cumulative us, module) rows and errors"""
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(SRC))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=env)
+    rows, errors = [], []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            rows.append((int(match.group(2)), match.group(4)))
+        elif not line.startswith('import time:'):
+            errors.append(line)
+    if result.returncode != 0:
+        return float('nan'), rows, (errors[-1] if errors else f"exit status {result.returncode}")
+    return float(result.stdout.strip().splitlines()[-1]), rows, ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per entry point')
+    parser.add_argument('--top', type=int, default=10, help='Slowest modules to list')
+    args = parser.parse_args()
+
+    for name, statement in ENTRY_POINTS.items():
+        timings: List[float] = []
+        cumulative: Dict[str, int] = {}
+        error = ""
+        for _ in range(args.repeat):
+            seconds, rows, error = import_once(statement)
+            if error:
+                break
+            timings.append(seconds)
+            for micros, module in rows:
+                cumulative[module] = min(micros, cumulative.get(module, micros))
+
+        print(f"== {name}: {statement}")
+        if error:
+            print(f"   failed: {error}\n")
+            continue
+        loaded = [package for package in HEAVY_PACKAGES if package in cumulative]
+        print(f"   median {statistics.median(timings) * 1000:.0f} ms over {len(timings)} runs, "
+              f"{len(cumulative)} modules; heavy packages loaded: {', '.join(loaded) or 'none'}")
+        slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        for module, micros in slowest:
+            print(f"   {micros / 1000:>9.1f} ms  {module}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
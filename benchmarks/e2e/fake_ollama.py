@@ -0,0 +1,176 @@
+"""Ollama-compatible stand-in that answers with canned ReAct output.
+
+Streams tokens at a fixed rate after a configurable time to first token,
+so LLM-bound code paths can be benchmarked without a model. When the
+prompt offers the Browser tool and no observation has come back yet, the
+reply is a Browser action on one of the corpus pages; otherwise it is a
+final answer.
+
+``--think-tokens`` prefixes every reply with a <think> reasoning trace, and
+``--model-rate`` streams named models at their own pace, so model routing
+and trace stripping can be measured.
+
+    python benchmarks/e2e/fake_ollama.py --port 11435 --ttft 0.2 --tokens-per-second 40
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+_TOKEN_RE = re.compile(r'\s*\S+|\s+')
+
+FINAL_ANSWER = (
+    "Thought: I now know the final answer\n"
+    "Final Answer: The sources agree on three main points. First, the topic has grown steadily "
+    "over the past decade, with adoption roughly doubling every two years. Second, the main "
+    "trade-off is between cost and latency, and most teams accept higher cost for lower latency. "
+    "Third, there is still disagreement on long-term maintenance costs, which the sources flag "
+    "as needing further research. Key statistics: 63% adoption, 2.1x growth, 40 ms median latency."
+)
+
+
+class FakeOllama:
+    def __init__(self, ttft: float, tokens_per_second: float, corpus_urls: List[str], think_tokens: int = 0,
+                 model_rates: Optional[Dict[str, float]] = None):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.corpus_urls = corpus_urls
+        self.think_tokens = think_tokens
+        self.model_rates = model_rates or {}
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reply(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+        trace = f"<think>{' '.join(['hmm'] * self.think_tokens)}</think>\n" if self.think_tokens else ''
+        if self.corpus_urls and 'Browser' in prompt and 'Observation:' not in prompt:
+            digest = int(hashlib.sha256(prompt.encode('utf-8')).hexdigest(), 16)
+            url = self.corpus_urls[digest % len(self.corpus_urls)]
+            return trace + (
+                "Thought: I should read a source on this topic\n"
+                "Action: Browser\n"
+                f'Action Input: {{"task_description": "Read {url} and summarise it"}}'
+            )
+        return trace + FINAL_ANSWER
+
+    def tokens(self, text: str, model: str = ''):
+        """Yield the reply token by token at the model's pace"""
+        time.sleep(self.ttft)
+        rate = self.model_rates.get(model, self.tokens_per_second)
+        interval = 1.0 / rate if rate else 0.0
+        for token in _TOKEN_RE.findall(text):
+            yield token
+            if interval:
+                time.sleep(interval)
+
+
+def make_handler(fake: FakeOllama):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == '/api/tags':
+                self._json({"models": [{"name": "fake:latest", "model": "fake:latest"}]})
+            else:
+                self._json({"status": "ok"})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path == '/api/show':
+                self._json({"modelfile": "", "parameters": "", "template": "", "details": {}})
+                return
+            if self.path not in ('/api/chat', '/api/generate'):
+                self.send_error(404)
+                return
+
+            chat = self.path == '/api/chat'
+            if chat:
+                prompt = '\n'.join(str(message.get('content', '')) for message in body.get('messages', []))
+            else:
+                prompt = f"{body.get('system', '')}\n{body.get('prompt', '')}"
+            text = fake.reply(prompt)
+            started = time.perf_counter()
+
+            if not body.get('stream', True):
+                content = ''.join(fake.tokens(text, body.get('model', '')))
+                self._json(self._chunk(chat, content, True, prompt, text, started))
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for token in fake.tokens(text, body.get('model', '')):
+                self._write_chunk(self._chunk(chat, token, False, prompt, text, started))
+            self._write_chunk(self._chunk(chat, '', True, prompt, text, started))
+            self.wfile.write(b'0\r\n\r\n')
+
+        def _chunk(self, chat: bool, content: str, done: bool, prompt: str, text: str, started: float) -> dict:
+            chunk = {"model": "fake", "created_at": time.strftime('%Y-%m-%dT%H:%M:%SZ'), "done": done}
+            if chat:
+                chunk["message"] = {"role": "assistant", "content": content}
+            else:
+                chunk["response"] = content
+            if done:
+                chunk.update({
+                    "done_reason": "stop",
+                    "prompt_eval_count": len(prompt) // 4 + 1,
+                    "eval_count": len(_TOKEN_RE.findall(text)),
+                    "total_duration": int((time.perf_counter() - started) * 1e9),
+                })
+            return chunk
+
+        def _write_chunk(self, payload: dict):
+            data = (json.dumps(payload) + "\n").encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+
+        def _json(self, payload: dict):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int, ttft: float, tokens_per_second: float, corpus_urls: List[str], think_tokens: int = 0,
+          model_rates: Optional[Dict[str, float]] = None) -> ThreadingHTTPServer:
+    fake = FakeOllama(ttft, tokens_per_second, corpus_urls, think_tokens, model_rates)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(fake))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--ttft', type=float, default=0.2, help='Seconds before the first token')
+    parser.add_argument('--tokens-per-second', type=float, default=40.0, help='Streaming rate, 0 for no delay')
+    parser.add_argument('--corpus-url', action='append', default=[], help='Page the fake agent browses')
+    parser.add_argument('--think-tokens', type=int, default=0, help='Reasoning-trace words before each reply')
+    parser.add_argument('--model-rate', action='append', default=[], metavar='MODEL=TPS',
+                        help='Streaming rate for one model name')
+    args = parser.parse_args()
+
+    model_rates = {name: float(rate) for name, rate in (item.split('=', 1) for item in args.model_rate)}
+    server = serve(args.port, args.ttft, args.tokens_per_second, args.corpus_url, args.think_tokens, model_rates)
+    print(f"Fake Ollama listening on http://127.0.0.1:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+"""Offline end-to-end benchmarks against local Ollama and web stand-ins.
+
+Starts the fake Ollama server and the corpus web server as subprocesses,
+points the app at them and runs four scenarios:
+
+    fetch          plain HTTP fetches of every page, then ETag revalidations
+    browser_tool   BrowserTool on single pages and on a batch of all pages
+    agents         each of the three agents on its own one-task crew
+    pipeline       run_research_process for N concurrent sessions
+
+Reports p50/p95 latency, throughput and peak RSS, and compares them with a
+stored baseline (exit status 1 on a regression beyond --tolerance).
+With --routing-tiers the stages are routed across fake models streaming at
+the given rates, and per stage and model routing averages are reported.
+
+    python benchmarks/e2e/run.py --concurrency 4 --iterations 3
+    python benchmarks/e2e/run.py --save-baseline
+    python benchmarks/e2e/run.py --scenario pipeline --think-tokens 200 \
+        --routing-tiers small=120,fake=40
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', '..', 'src')
+BASELINE = os.path.join(HERE, 'baseline.json')
+
+QUERY = "What are the trade-offs of adopting this technology?"
+ANALYSIS_INPUT = "Research findings: adoption doubled in two years; latency fell to 40 ms; costs are disputed."
+
+# Metrics where a larger value is an improvement; everything else should shrink
+HIGHER_IS_BETTER = ('throughput_per_min',)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def start_server(script: str, port: int, *args: str) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, os.path.join(HERE, script), '--port', str(port), *args],
+                               stdout=subprocess.DEVNULL)
+    wait_for_port(port)
+    return process
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def tree_rss_mb(exclude: List[int]) -> float:
+    """Resident memory of this process and its descendants, minus the stand-in servers"""
+    children: Dict[int, List[int]] = {}
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        fields = stat[stat.rindex(')') + 2:].split()
+        children.setdefault(int(fields[1]), []).append(int(pid))
+
+    total = 0
+    pending = [os.getpid()]
+    while pending:
+        pid = pending.pop()
+        if pid in exclude:
+            continue
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            continue
+    return total / (1024 * 1024)
+
+
+class RssSampler(threading.Thread):
+    """Tracks the peak RSS of the app, including headless browsers"""
+
+    def __init__(self, exclude: List[int], interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.exclude = exclude
+        self.interval = interval
+        self.peak = 0.0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, tree_rss_mb(self.exclude))
+
+    def stop(self) -> float:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def timed(fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def summarize(latencies: List[float], wall_seconds: float) -> Dict[str, float]:
+    return {
+        "runs": len(latencies),
+        "p50_seconds": round(percentile(latencies, 0.50), 4),
+        "p95_seconds": round(percentile(latencies, 0.95), 4),
+        "throughput_per_min": round(len(latencies) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+    }
+
+
+def scenario_fetch(urls: List[str], iterations: int, concurrency: int) -> Dict[str, Dict]:
+    from tools.fetcher import page_fetcher
+
+    results = {}
+    pages = {}
+
+    def fetch(url: str):
+        pages[url] = page_fetcher.fetch(url, 10)
+
+    def revalidate(url: str):
+        if not page_fetcher.fetch(url, 10, validators=pages[url]).get("not_modified"):
+            raise RuntimeError(f"{url} was downloaded again instead of revalidated")
+
+    for name, fn in (("fetch.full", fetch), ("fetch.revalidate", revalidate)):
+        latencies, start = [], time.perf_counter()
+        for _ in range(iterations):
+            for url in urls:
+                latencies.append(timed(lambda: fn(url)))
+        results[name] = summarize(latencies, time.perf_counter() - start)
+    return results
+
+
+def scenario_browser_tool(urls: List[str], iterations: int, concurrency: int) -> Dict[str, Dict]:
+    from tools.browser_tool import BrowserTool
+
+    tool = BrowserTool()
+    results = {}
+
+    latencies, start = [], time.perf_counter()
+    for _ in range(iterations):
+        for url in urls:
+            latencies.append(timed(lambda: tool._run(f"Read {url} and summarise it")))
+    results["browser_tool.single"] = summarize(latencies, time.perf_counter() - start)
+
+    batch_task = "Compare these pages: " + " ".join(urls)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(lambda _: timed(lambda: tool._run(batch_task)), range(iterations * concurrency)))
+    results["browser_tool.batch"] = summarize(latencies, time.perf_counter() - start)
+    return results
+
+
+def scenario_agents(urls: List[str], iterations: int, concurrency: int) -> Dict[str, Dict]:
+    from crewai import Crew
+    from agents import build_agents
+    from tasks import get_analysis_task, get_fact_checking_task, get_research_task
+
+    agents = build_agents()
+    cases = {
+        "web_research_specialist": lambda agent: get_research_task(f"{QUERY} See {urls[0]}", agent),
+        "content_analyzer": lambda agent: get_analysis_task(ANALYSIS_INPUT, agent),
+        "fact_checker": lambda agent: get_fact_checking_task(ANALYSIS_INPUT, agent),
+    }
+    results = {}
+    for name, make_task in cases.items():
+        agent = agents[name]
+        latencies, start = [], time.perf_counter()
+        for _ in range(iterations):
+            crew = Crew(agents=[agent], tasks=[make_task(agent)], process="sequential", verbose=False)
+            latencies.append(timed(crew.kickoff))
+        results[f"agent.{name}"] = summarize(latencies, time.perf_counter() - start)
+    return results
+
+
+def scenario_pipeline(urls: List[str], iterations: int, concurrency: int) -> Dict[str, Dict]:
+    from visualizer import run_research_process
+
+    def session(index: int) -> float:
+        query = f"{QUERY} (session {index}) See {urls[index % len(urls)]}"
+        return timed(lambda: [None for _ in run_research_process(query, [])])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(session, range(iterations * concurrency)))
+    return {f"pipeline.sessions_{concurrency}": summarize(latencies, time.perf_counter() - start)}
+
+
+SCENARIOS = {
+    "fetch": scenario_fetch,
+    "browser_tool": scenario_browser_tool,
+    "agents": scenario_agents,
+    "pipeline": scenario_pipeline,
+}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Describe every metric that got worse than the baseline by more than ``tolerance``"""
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric, value in metrics.items():
+            reference = base.get(metric)
+            if metric in ("runs", "stages") or not reference:
+                continue
+            change = (value - reference) / reference
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            marker = "REGRESSION" if worse > tolerance else "ok"
+            line = f"{name:<36}{metric:<22}{reference:>10.3f} -> {value:>10.3f} ({change:+.0%}) {marker}"
+            print(line)
+            if worse > tolerance:
+                regressions.append(line)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (repeatable); defaults to all')
+    parser.add_argument('--iterations', type=int, default=3, help='Timed runs per case')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent sessions or batch calls')
+    parser.add_argument('--ttft', type=float, default=0.2, help='Fake model time to first token')
+    parser.add_argument('--tokens-per-second', type=float, default=40.0, help='Fake model streaming rate')
+    parser.add_argument('--web-latency', type=float, default=0.05, help='Delay per corpus request')
+    parser.add_argument('--warm-caches', action='store_true',
+                        help='Leave the page, LLM and stage caches on (measures repeat runs)')
+    parser.add_argument('--baseline', default=BASELINE, help='Baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown before failing')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    parser.add_argument('--think-tokens', type=int, default=0, help='Fake reasoning-trace words per reply')
+    parser.add_argument('--routing-tiers', default='', metavar='MODEL=TPS,...',
+                        help='Model tiers to route across, fastest first, with their fake streaming rates')
+    args = parser.parse_args(argv)
+    tiers = [item.split('=', 1) for item in args.routing_tiers.split(',') if item]
+
+    from web_server import corpus_pages
+
+    ollama_port, web_port = free_port(), free_port()
+    urls = [f"http://127.0.0.1:{web_port}/{page}" for page in corpus_pages()]
+    servers = [
+        start_server('fake_ollama.py', ollama_port, '--ttft', str(args.ttft),
+                     '--tokens-per-second', str(args.tokens_per_second),
+                     '--think-tokens', str(args.think_tokens),
+                     *[arg for name, rate in tiers for arg in ('--model-rate', f"{name}={rate}")],
+                     *[arg for url in urls for arg in ('--corpus-url', url)]),
+        start_server('web_server.py', web_port, '--latency', str(args.web_latency)),
+    ]
+
+    # Configure the app before any of its modules read the environment
+    cache_dir = tempfile.mkdtemp(prefix='research-bench-')
+    os.environ.update({
+        'RESEARCH_CACHE_DIR': cache_dir,
+        'OLLAMA_BASE_URL': f"http://127.0.0.1:{ollama_port}",
+        'OLLAMA_MODEL': 'fake',
+        'RESEARCH_WORKERS': str(args.concurrency),
+        'RESEARCH_QUEUE_SIZE': str(args.concurrency * args.iterations),
+        # Every corpus page lives on one local host; per-host rate limits would only measure themselves
+        'POLITENESS_HOST_RATE': '1000',
+        'POLITENESS_HOST_BURST': '1000',
+        'POLITENESS_HOST_CONNECTIONS': str(args.concurrency * 4),
+        'ROUTING_TIERS': ','.join(name for name, _ in tiers),
+    })
+    if not args.warm_caches:
+        os.environ.update({'PAGE_CACHE_ENABLED': 'false', 'LLM_CACHE_ENABLED': 'false',
+                           'RUN_STORE_ENABLED': 'false'})
+    sys.path.insert(0, SRC)
+
+    sampler = RssSampler(exclude=[server.pid for server in servers])
+    sampler.start()
+    results: Dict[str, Dict] = {}
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            print(f"Running {name}...", file=sys.stderr)
+            results.update(SCENARIOS[name](urls, args.iterations, args.concurrency))
+        if tiers:
+            from routing import model_router
+            results.update(model_router.summary())
+    finally:
+        peak_rss = sampler.stop()
+        for server in servers:
+            server.terminate()
+    results["process"] = {
+        "peak_rss_mb": round(max(peak_rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024), 1),
+    }
+
+    print(f"\n{'case':<36}{'runs':>6}{'p50 s':>10}{'p95 s':>10}{'per min':>10}")
+    for name, metrics in results.items():
+        if "runs" in metrics:
+            print(f"{name:<36}{metrics['runs']:>6}{metrics['p50_seconds']:>10.3f}"
+                  f"{metrics['p95_seconds']:>10.3f}{metrics['throughput_per_min']:>10.1f}")
+    print(f"peak RSS: {results['process']['peak_rss_mb']} MB\n")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline stored yet; run with --save-baseline to create one")
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
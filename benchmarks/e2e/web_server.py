@@ -0,0 +1,84 @@
+"""Static web server for the recorded page corpus.
+
+Serves the saved pages in benchmarks/fixtures/html with ETag and
+Last-Modified headers, answering matching If-None-Match and
+If-Modified-Since requests with 304 like a real origin, and an optional
+per-request delay standing in for network latency, so fetch, extraction
+and revalidation paths run fully offline.
+
+    python benchmarks/e2e/web_server.py --port 8765 --latency 0.05
+"""
+import argparse
+import functools
+import os
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+CORPUS = os.path.join(os.path.dirname(__file__), '..', 'fixtures', 'html')
+
+
+def etag(path: str) -> str:
+    stat = os.stat(path)
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+class CorpusHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+
+    def send_head(self):
+        if self.latency:
+            time.sleep(self.latency)
+        path = self.translate_path(self.path)
+        if os.path.isfile(path) and 'If-None-Match' in self.headers:
+            # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2),
+            # which the base class already answers
+            tags = [tag.strip() for tag in self.headers['If-None-Match'].split(',')]
+            if '*' in tags or etag(path) in tags or f"W/{etag(path)}" in tags:
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+            del self.headers['If-Modified-Since']
+        return super().send_head()
+
+    def end_headers(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            self.send_header('ETag', etag(path))
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def corpus_pages(corpus: str = CORPUS) -> List[str]:
+    """File names of the recorded pages"""
+    return sorted(name for name in os.listdir(corpus) if name.endswith('.html'))
+
+
+def serve(port: int, latency: float = 0.0, corpus: str = CORPUS) -> ThreadingHTTPServer:
+    handler = type('Handler', (CorpusHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), functools.partial(handler, directory=corpus))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds of delay per request')
+    parser.add_argument('--corpus', default=CORPUS, help='Directory of saved pages')
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.corpus)
+    print(f"Serving {len(corpus_pages(args.corpus))} pages on http://127.0.0.1:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,70 +1,178 @@
 ﻿import os
-from crewai import Agent
-from langchain_community.chat_models import ChatOllama
-from tools.browser_tool import BrowserTool
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import TYPE_CHECKING, Optional
 
-# Initialize tools
-browser_tool = BrowserTool()
+from tracing import tracer
+
+if TYPE_CHECKING:
+    from llm_cache import CachedChatOllama
+    from tools.browser_tool import BrowserTool
+    from tools.memory_tool import ResearchMemoryTool
+
+# crewai, langchain and the browser stack are imported on first use, so
+# importing this module (and starting the UI or a worker) stays cheap
 
 # Configure Ollama
 ollama_base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
 ollama_model = os.getenv('OLLAMA_MODEL', 'deepseek-r1:8b')
 
-# Create a shared Ollama configuration
-ollama = ChatOllama(
-    model=f"ollama/{ollama_model}",
-    base_url=ollama_base_url,
-    temperature=0.7,
-    streaming=True,
-    verbose=True
-)
-
-# Web Research Specialist
-web_research_specialist = Agent(
-    role='Web Research Specialist',
-    goal='Search and gather accurate information from the web',
-    backstory="""You are an expert at web research and information gathering. 
-    Your goal is to find relevant and accurate information from reliable sources.""",
-    tools=[browser_tool],
-    allow_delegation=False,
-    llm=ollama,
-    verbose=True
-)
-
-# Content Analyzer
-content_analyzer = Agent(
-    role='Content Analyzer',
-    goal='Analyze and synthesize research findings',
-    backstory="""You are an expert at analyzing and synthesizing information.
-    Your goal is to process research findings and extract key insights.""",
-    tools=[browser_tool],
-    allow_delegation=True,
-    llm=ChatOllama(
-        model=f"ollama/{ollama_model}",
-        base_url=ollama_base_url,
-        temperature=0.5,
+# Module attributes that resolve to the default agent set on first access
+_DEFAULT_AGENT_NAMES = ("web_research_specialist", "content_analyzer", "fact_checker")
+_registry_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def get_browser_tool() -> 'BrowserTool':
+    """The shared browser tool, created on first use.
+
+    The tool is stateless and its pool and caches are thread-safe, so every
+    agent set shares one instance.
+    """
+    from tools.browser_tool import BrowserTool
+
+    return BrowserTool()
+
+@lru_cache(maxsize=None)
+def get_memory_tool() -> Optional['ResearchMemoryTool']:
+    """The shared research memory tool, or None when MEMORY_ENABLED is off"""
+    from tools.memory_index import MEMORY_ENABLED
+
+    if not MEMORY_ENABLED:
+        return None
+    from tools.memory_tool import ResearchMemoryTool
+
+    return ResearchMemoryTool()
+
+def create_llm(agent_name: str, temperature: float, model: str = None, base_url: str = None) -> 'CachedChatOllama':
+    """Create an Ollama client for one agent"""
+    from llm_cache import CachedChatOllama
+    from callbacks import LLMTraceHandler, TokenEventHandler
+
+    callbacks = [TokenEventHandler(agent_name)]
+    if tracer.enabled:
+        callbacks.append(LLMTraceHandler(agent_name))
+    # Completions are served from the persistent LLM cache when possible
+    return CachedChatOllama(
+        agent_name=agent_name,
+        model=f"ollama/{model or ollama_model}",
+        base_url=base_url or ollama_base_url,
+        temperature=temperature,
         streaming=True,
+        callbacks=callbacks,
         verbose=True
-    ),
-    verbose=True
-)
-
-# Fact Checker
-fact_checker = Agent(
-    role='Fact Checker',
-    goal='Verify information accuracy and credibility',
-    backstory="""You are an expert fact checker with a keen eye for detail.
-    Your goal is to verify the accuracy of information and assess source credibility.""",
-    tools=[browser_tool],
-    allow_delegation=True,
-    llm=ChatOllama(
-        model=f"ollama/{ollama_model}",
-        base_url=ollama_base_url,
-        temperature=0.3,
-        streaming=True,
+    )
+
+def build_agents(model: str = None, base_url: str = None) -> dict:
+    """Create a fresh set of agents with their own LLM clients.
+
+    crewai agents keep executor state while they run, so every research job
+    that runs concurrently needs its own set.
+    """
+    from crewai import Agent
+
+    browser_tool = get_browser_tool()
+    memory_tool = get_memory_tool()
+
+    # Web Research Specialist
+    backstory = """You are an expert at web research and information gathering. 
+        Your goal is to find relevant and accurate information from reliable sources."""
+    if memory_tool is not None:
+        # Pages read in earlier sessions answer follow-up questions without a live fetch
+        backstory += """
+        Before browsing, you check your research memory of pages read in earlier sessions,
+        and you only browse for what it does not already cover."""
+    web_research_specialist = Agent(
+        role='Web Research Specialist',
+        goal='Search and gather accurate information from the web',
+        backstory=backstory,
+        tools=[memory_tool, browser_tool] if memory_tool is not None else [browser_tool],
+        allow_delegation=False,
+        llm=create_llm('Web Research Specialist', 0.7, model, base_url),
         verbose=True
-    ),
-    verbose=True
-)
+    )
+
+    # Content Analyzer
+    content_analyzer = Agent(
+        role='Content Analyzer',
+        goal='Analyze and synthesize research findings',
+        backstory="""You are an expert at analyzing and synthesizing information.
+        Your goal is to process research findings and extract key insights.""",
+        tools=[browser_tool],
+        allow_delegation=True,
+        llm=create_llm('Content Analyzer', 0.5, model, base_url),
+        verbose=True
+    )
+
+    # Fact Checker
+    fact_checker = build_fact_checker(model, base_url)
+
+    return {
+        "web_research_specialist": web_research_specialist,
+        "content_analyzer": content_analyzer,
+        "fact_checker": fact_checker,
+    }
+
+def build_fact_checker(model: str = None, base_url: str = None):
+    """Create a fact checker on its own LLM client.
+
+    Claim-level verification runs several of these side by side.
+    """
+    from crewai import Agent
+
+    return Agent(
+        role='Fact Checker',
+        goal='Verify information accuracy and credibility',
+        backstory="""You are an expert fact checker with a keen eye for detail.
+        Your goal is to verify the accuracy of information and assess source credibility.""",
+        tools=[get_browser_tool()],
+        allow_delegation=True,
+        llm=create_llm('Fact Checker', 0.3, model, base_url),
+        verbose=True
+    )
+
+_agent_sets = {}
+_idle_fact_checkers = {}
+
+def get_agents(model: str = None, base_url: str = None) -> dict:
+    """Shared agent set for one Ollama configuration, built on first use.
+
+    For single-user code paths; concurrent jobs should call build_agents().
+    """
+    key = (model or ollama_model, base_url or ollama_base_url)
+    agents = _agent_sets.get(key)
+    if agents is None:
+        with _registry_lock:
+            agents = _agent_sets.get(key)
+            if agents is None:
+                agents = _agent_sets[key] = build_agents(*key)
+    return agents
+
+@contextmanager
+def lease_fact_checker(model: str = None, base_url: str = None):
+    """Borrow an idle fact checker for one crew, building one only when all are busy.
+
+    Agents are returned to the pool afterwards, so claim verification keeps
+    as many warm fact checkers as it has ever run side by side.
+    """
+    key = (model or ollama_model, base_url or ollama_base_url)
+    with _registry_lock:
+        idle = _idle_fact_checkers.setdefault(key, [])
+        agent = idle.pop() if idle else None
+    if agent is None:
+        agent = build_fact_checker(*key)
+    try:
+        yield agent
+    finally:
+        with _registry_lock:
+            _idle_fact_checkers[key].append(agent)
+
+def __getattr__(name: str):
+    # Default agent set for single-user use, e.g. `from agents import fact_checker`
+    if name in _DEFAULT_AGENT_NAMES:
+        return get_agents()[name]
+    if name == "browser_tool":
+        return get_browser_tool()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # You can add more agents here if needed for more complex workflows
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""Headless batch runner for the research pipeline.
+
+Reads one query per line (or JSON objects with a "query" field) from a file
+or stdin, runs the research, analysis and fact checking pipeline for each
+with bounded parallelism, and appends one JSON record per query to the
+output file as soon as it finishes. Re-running with the same output file
+skips queries that already completed.
+
+    python src/batch.py queries.txt -o results.jsonl --parallel 2
+    cat queries.txt | python src/batch.py - -o results.jsonl
+
+Stage outputs are checkpointed in the run store, so a failed query resumes
+from its last completed stage. --rerun-from fact_check re-runs only the
+fact check (for example after changing its model settings) and reuses
+the checkpointed research and analysis.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional, Set, TextIO
+
+from event_system import event_system
+from llm_gateway import workload_scope
+from run_store import STAGES
+
+BATCH_PARALLELISM = int(os.getenv('BATCH_PARALLELISM', '2'))
+
+
+def query_id(query: str) -> str:
+    """Stable identifier used to match queries against earlier output"""
+    return hashlib.sha256(' '.join(query.split()).encode('utf-8')).hexdigest()[:16]
+
+
+def read_queries(stream: TextIO) -> List[str]:
+    """Parse queries from plain lines or JSONL, skipping blanks and comments"""
+    queries = []
+    for line in stream:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            line = json.loads(line)["query"]
+        queries.append(line)
+    return queries
+
+
+def completed_queries(output_path: str) -> Set[str]:
+    """IDs of queries that already finished successfully in an earlier run"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run killed mid-write can leave a truncated last line
+                continue
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+
+class BatchRunner:
+    """Runs the research pipeline over many queries.
+
+    Each worker thread builds its own agents; page fetches are shared
+    through the page cache, and identical in-flight fetches from different
+    queries are collapsed into one download by BrowserTool.
+    """
+
+    def __init__(self, output_path: str, parallelism: int = BATCH_PARALLELISM, rerun_from: Optional[str] = None):
+        self.output_path = output_path
+        self.parallelism = max(1, parallelism)
+        self.rerun_from = rerun_from
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.stats = {"ok": 0, "failed": 0, "skipped": 0}
+
+    def run(self, queries: Iterable[str]) -> dict:
+        """Run every query not already completed; returns throughput stats"""
+        # Re-running a stage means revisiting queries that already completed
+        done = set() if self.rerun_from else completed_queries(self.output_path)
+        pending = []
+        for query in dict.fromkeys(queries):
+            if query_id(query) in done:
+                self.stats["skipped"] += 1
+            else:
+                pending.append(query)
+
+        print(f"Running {len(pending)} queries ({self.stats['skipped']} already done) "
+              f"with parallelism {self.parallelism}", file=sys.stderr)
+
+        start = time.perf_counter()
+        with open(self.output_path, 'a', encoding='utf-8') as output:
+            with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="batch") as executor:
+                for _ in executor.map(lambda q: self._run_one(q, output), pending):
+                    pass
+        elapsed = time.perf_counter() - start
+
+        completed = self.stats["ok"] + self.stats["failed"]
+        self.stats["elapsed_seconds"] = round(elapsed, 1)
+        self.stats["queries_per_hour"] = round(completed / elapsed * 3600, 1) if elapsed else 0.0
+        return self.stats
+
+    def _pipeline(self):
+        """This thread's pipeline, built with its own agents on first use"""
+        pipeline = getattr(self._local, 'pipeline', None)
+        if pipeline is None:
+            from agents import build_agents
+            from pipeline import ResearchPipeline
+
+            pipeline = self._local.pipeline = ResearchPipeline(build_agents())
+        return pipeline
+
+    def _run_one(self, query: str, output: TextIO):
+        started = time.time()
+        try:
+            # Batch generations yield the model to interactive sessions
+            with event_system.session(), workload_scope("batch"):
+                results = self._pipeline().run(query, rerun_from=self.rerun_from)
+            error = results.pop("error")
+        except Exception as e:
+            results, error = {}, str(e)
+
+        record = {
+            "id": query_id(query),
+            "query": query,
+            "status": "failed" if error else "ok",
+            "error": error,
+            **results,
+            "started_at": started,
+            "seconds": round(time.time() - started, 1),
+        }
+        with self._write_lock:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            self.stats[record["status"]] += 1
+        print(f"[{record['status']}] {query} ({record['seconds']}s)", file=sys.stderr)
+
+
+def run_batch(queries: Iterable[str], output_path: str, parallelism: int = BATCH_PARALLELISM,
+              rerun_from: Optional[str] = None) -> dict:
+    """Python API: run queries and stream results to ``output_path`` as JSONL"""
+    return BatchRunner(output_path, parallelism, rerun_from).run(queries)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run research queries in batch")
+    parser.add_argument('input', help="File with one query per line, or - for stdin")
+    parser.add_argument('-o', '--output', required=True, help="JSONL file to append results to")
+    parser.add_argument('-p', '--parallel', type=int, default=BATCH_PARALLELISM,
+                        help="Queries to run at the same time")
+    parser.add_argument('--rerun-from', choices=STAGES,
+                        help="Recompute this stage and later ones instead of using checkpoints")
+    args = parser.parse_args(argv)
+
+    if args.input == '-':
+        queries = read_queries(sys.stdin)
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            queries = read_queries(f)
+
+    stats = run_batch(queries, args.output, args.parallel, args.rerun_from)
+    print(f"Done: {stats['ok']} ok, {stats['failed']} failed, {stats['skipped']} skipped "
+          f"in {stats['elapsed_seconds']}s ({stats['queries_per_hour']} queries/hour)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
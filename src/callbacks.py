@@ -0,0 +1,96 @@
+import time
+from typing import Any, Dict, List
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+from event_system import event_system
+from cancellation import check_cancelled
+from tracing import RATE_BUCKETS, tracer
+from tools.ranking import estimate_tokens
+
+
+class TokenEventHandler(BaseCallbackHandler):
+    """Forwards streamed LLM tokens to the event system.
+
+    Also aborts the generation as soon as the surrounding job is cancelled.
+    """
+
+    # Let JobCancelled propagate instead of being logged and swallowed
+    raise_error: bool = True
+
+    def __init__(self, source: str):
+        self.source = source
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        check_cancelled()
+        if token:
+            event_system.notify_token(self.source, token)
+
+
+class LLMTraceHandler(BaseCallbackHandler):
+    """Records a span per LLM call with token counts, time to first token and throughput"""
+
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+        self._calls: Dict[UUID, Dict[str, Any]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]],
+                            *, run_id: UUID, **kwargs: Any) -> None:
+        prompt = ''.join(str(message.content) for batch in messages for message in batch)
+        self._start(run_id, prompt)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, ''.join(prompts))
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.get(run_id)
+        if call is not None:
+            if call["first_token"] is None:
+                call["first_token"] = time.perf_counter()
+            call["tokens"] += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        info = (generation.generation_info if generation else None) or {}
+        text = generation.text if generation else ''
+
+        # Ollama reports exact counts; fall back to estimates for cached or partial responses
+        prompt_tokens = info.get('prompt_eval_count') or estimate_tokens(call["prompt"])
+        completion_tokens = info.get('eval_count') or call["tokens"] or estimate_tokens(text)
+        elapsed = time.perf_counter() - call["started"]
+        ttft = (call["first_token"] or time.perf_counter()) - call["started"]
+        generating = elapsed - ttft
+        tokens_per_second = completion_tokens / generating if generating > 0 else 0.0
+
+        call["span"].finish(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                            ttft=round(ttft, 4), tokens_per_second=round(tokens_per_second, 1))
+        metrics = tracer.metrics
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens, help="Prompt tokens sent to the LLM",
+                    agent=self.agent_name)
+        metrics.inc("llm_completion_tokens_total", completion_tokens, help="Completion tokens generated",
+                    agent=self.agent_name)
+        metrics.observe("llm_time_to_first_token_seconds", ttft, help="Time to the first streamed token",
+                        agent=self.agent_name)
+        if tokens_per_second:
+            metrics.observe("llm_tokens_per_second", tokens_per_second, RATE_BUCKETS,
+                            help="Completion tokens generated per second", agent=self.agent_name)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        call = self._calls.pop(run_id, None)
+        if call is not None:
+            call["span"].finish(error=type(error).__name__)
+
+    def _start(self, run_id: UUID, prompt: str):
+        self._calls[run_id] = {
+            "span": tracer.start_span("llm.call", agent=self.agent_name),
+            "prompt": prompt,
+            "started": time.perf_counter(),
+            "first_token": None,
+            "tokens": 0,
+        }
@@ -0,0 +1,36 @@
+from contextlib import contextmanager
+import contextvars
+import threading
+from typing import Optional
+
+# Cancellation token of the job running in the current context
+_current_token: contextvars.ContextVar = contextvars.ContextVar('cancel_token', default=None)
+
+
+class JobCancelled(Exception):
+    """Raised inside a research job once it has been cancelled"""
+
+
+@contextmanager
+def cancel_scope(token: threading.Event):
+    """Make ``token`` the cancellation token for code run in this context"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+
+
+def is_cancelled() -> bool:
+    token: Optional[threading.Event] = _current_token.get()
+    return token is not None and token.is_set()
+
+
+def check_cancelled():
+    """Raise JobCancelled if the current job has been cancelled.
+
+    Called at natural checkpoints (between stages, before fetches, on every
+    streamed token) since crewai offers no way to interrupt a running crew.
+    """
+    if is_cancelled():
+        raise JobCancelled("Research job was cancelled")
@@ -0,0 +1,172 @@
+import hashlib
+import itertools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from tools.page_cache import normalize_url
+
+# Citation index configuration
+CITATION_MAX_ENTRIES = int(os.getenv('CITATION_MAX_ENTRIES', '500'))
+CITATION_PREVIEW_CHARS = int(os.getenv('CITATION_PREVIEW_CHARS', '500'))
+# Leading characters of a cited page's text that its SimHash covers. Pages that share
+# a boilerplate intro must be told apart by their body, but hashing a whole long page
+# would stall event delivery.
+CITATION_FINGERPRINT_CHARS = int(os.getenv('CITATION_FINGERPRINT_CHARS', '8000'))
+# Fingerprints this many bits apart or fewer are treated as the same document
+CITATION_NEAR_DUPLICATE_BITS = int(os.getenv('CITATION_NEAR_DUPLICATE_BITS', '6'))  # at most 7
+CITATION_MAX_ALIASES = 8
+
+_WORD_RE = re.compile(r'\w+')
+_SHINGLE_SIZE = 3
+# Below this many words a fingerprint says too little to call two pages the same
+_MIN_FINGERPRINT_WORDS = 20
+_BANDS = 8  # 64-bit fingerprints split into eight 8-bit bands
+_BAND_BITS = 64 // _BANDS
+_BAND_MASK = (1 << _BAND_BITS) - 1
+
+
+def citation_key(url: str) -> str:
+    """URL identity for citations: http/https, www. and trailing slashes don't matter"""
+    key = normalize_url(url).split('://', 1)[1]
+    if key.startswith('www.'):
+        key = key[4:]
+    path, _, query = key.partition('?')
+    path = path.rstrip('/') or path
+    return f"{path}?{query}" if query else path
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word shingles; similar texts differ in few bits.
+
+    Returns 0 for texts too short to fingerprint.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < _MIN_FINGERPRINT_WORDS:
+        return 0
+
+    weights = [0] * 64
+    for i in range(len(words) - _SHINGLE_SIZE + 1):
+        shingle = ' '.join(words[i:i + _SHINGLE_SIZE])
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _bands(fingerprint: int) -> List[Tuple[int, int]]:
+    return [(band, fingerprint >> (band * _BAND_BITS) & _BAND_MASK) for band in range(_BANDS)]
+
+
+class Citation:
+    """One distinct source, with every URL it was seen under"""
+
+    __slots__ = ('seq', 'title', 'url', 'preview', 'fingerprint', 'count', 'first_seen', 'last_seen', 'aliases')
+
+    def __init__(self, seq: int, title: str, url: str, preview: str, fingerprint: int):
+        self.seq = seq
+        self.title = title
+        self.url = url
+        self.preview = preview
+        self.fingerprint = fingerprint
+        self.count = 1
+        self.first_seen = self.last_seen = time.time()
+        # Near-duplicate copies (syndicated articles, mirrors) found at other URLs
+        self.aliases: Tuple[str, ...] = ()
+
+
+class CitationIndex:
+    """Deduplicated, bounded set of the sources cited in a session.
+
+    Citations are keyed by normalized URL, so a page fetched by several
+    agents is one entry with an access count. Pages at other URLs whose
+    content SimHash is within CITATION_NEAR_DUPLICATE_BITS of a known
+    source are folded into it as aliases. Candidate matches come from
+    banded lookup tables (by pigeonhole, any match within 7 bits shares at
+    least one of the eight 8-bit bands), so both checks are O(1) on
+    average. The least recently cited sources are evicted beyond
+    ``max_entries``.
+    """
+
+    def __init__(self, max_entries: int = CITATION_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self._citations: 'OrderedDict[int, Citation]' = OrderedDict()
+        self._by_key: Dict[str, Citation] = {}
+        self._by_band: Dict[Tuple[int, int], List[Citation]] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.accesses = 0
+        self.evicted = 0
+
+    def add(self, title: Optional[str], url: str, content: str) -> Tuple[Citation, bool]:
+        """Record a citation; returns its entry and whether it is a new source.
+
+        ``content`` is the page's extracted text. Its first
+        CITATION_FINGERPRINT_CHARS are fingerprinted, and only a preview is kept.
+        """
+        key = citation_key(url)
+        with self._lock:
+            self.accesses += 1
+            citation = self._by_key.get(key)
+            if citation is None:
+                fingerprint = simhash(content[:CITATION_FINGERPRINT_CHARS])
+                citation = self._near_duplicate(fingerprint)
+                if citation is None:
+                    preview = content[:CITATION_PREVIEW_CHARS]
+                    if len(content) > CITATION_PREVIEW_CHARS:
+                        preview += "..."
+                    citation = Citation(next(self._seq), title or url, url, preview, fingerprint)
+                    self._insert(key, citation)
+                    return citation, True
+                if len(citation.aliases) < CITATION_MAX_ALIASES:
+                    citation.aliases += (url,)
+                    self._by_key[key] = citation
+
+            citation.count += 1
+            citation.last_seen = time.time()
+            self._citations.move_to_end(citation.seq)
+            return citation, False
+
+    def __len__(self) -> int:
+        return len(self._citations)
+
+    def __iter__(self) -> Iterator[Citation]:
+        """Sources in the order they were first cited"""
+        with self._lock:
+            citations = list(self._citations.values())
+        return iter(sorted(citations, key=lambda citation: citation.seq))
+
+    def _near_duplicate(self, fingerprint: int) -> Optional[Citation]:
+        if not fingerprint:
+            return None
+        for band in _bands(fingerprint):
+            for candidate in self._by_band.get(band, ()):
+                if bin(candidate.fingerprint ^ fingerprint).count('1') <= CITATION_NEAR_DUPLICATE_BITS:
+                    return candidate
+        return None
+
+    def _insert(self, key: str, citation: Citation):
+        self._citations[citation.seq] = citation
+        self._by_key[key] = citation
+        if citation.fingerprint:
+            for band in _bands(citation.fingerprint):
+                self._by_band.setdefault(band, []).append(citation)
+        while len(self._citations) > self.max_entries:
+            self._evict(self._citations.popitem(last=False)[1])
+
+    def _evict(self, citation: Citation):
+        self.evicted += 1
+        for url in (citation.url,) + citation.aliases:
+            key = citation_key(url)
+            if self._by_key.get(key) is citation:
+                del self._by_key[key]
+        if citation.fingerprint:
+            for band in _bands(citation.fingerprint):
+                bucket = self._by_band.get(band)
+                if bucket is not None:
+                    bucket.remove(citation)
+                    if not bucket:
+                        del self._by_band[band]
@@ -0,0 +1,307 @@
+import contextvars
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from event_system import event_system
+from cancellation import check_cancelled
+from llm_gateway import llm_gateway
+from routing import current_route, ollama_model_name
+from tracing import tracer
+from tools.page_cache import RESEARCH_CACHE_DIR
+from tools.ranking import format_passages, select_passages
+
+# Claim verification configuration
+# "claims" verifies extracted claims in parallel; "task" runs the single fact checking task
+FACT_CHECK_MODE = os.getenv('FACT_CHECK_MODE', 'claims')
+CLAIM_MAX_CLAIMS = int(os.getenv('CLAIM_MAX_CLAIMS', '12'))
+# Claims verified at once. Generations are still limited by the gateway's LLM_MAX_IN_FLIGHT,
+# so the default (0) runs one worker more than that: the extra one gathers the next
+# claim's evidence while the others wait for or hold a generation slot
+CLAIM_PARALLELISM = int(os.getenv('CLAIM_PARALLELISM', '0'))
+CLAIM_EVIDENCE_SOURCES = int(os.getenv('CLAIM_EVIDENCE_SOURCES', '3'))
+CLAIM_EVIDENCE_TOKENS = int(os.getenv('CLAIM_EVIDENCE_TOKENS', '600'))
+CLAIM_CACHE_PATH = os.getenv('CLAIM_CACHE_PATH', os.path.join(RESEARCH_CACHE_DIR, 'verdicts.sqlite3'))
+CLAIM_CACHE_TTL = float(os.getenv('CLAIM_CACHE_TTL', str(7 * 86400)))
+
+VERDICTS = ("supported", "partially supported", "refuted", "unverified")
+
+_BULLET_RE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"“])')
+_HEADING_RE = re.compile(r'^\s*(#+\s|[A-Z][^.!?]{0,60}:\s*$)')
+# Statements about the research itself rather than the world
+_NOT_A_CLAIM_RE = re.compile(
+    r'\b(further research|more research|needs? (?:more|further)|unclear|it is (?:important|worth) (?:to note|noting)'
+    r'|in (?:summary|conclusion)|this (?:analysis|report)|we (?:recommend|suggest))\b',
+    re.IGNORECASE
+)
+# A claim worth checking names something concrete: a number, a date or a proper noun
+_CHECKABLE_RE = re.compile(
+    r'\d|\b(?!(?:The|This|These|That|Those|It|They|We|There|Overall|However|An?|In|Our)\b)[A-Z][a-z]+\b'
+    r'.*\b(?:is|are|was|were|has|have|had|will|can|remains?|leads?|led|holds?|held'
+    r'|reported|found|shows?|showed|announced|launched|released|owns?|owned)\b'
+)
+_VERDICT_RE = re.compile(r'verdict\s*[:\-]\s*\**\s*(supported|partially supported|refuted|unverified)', re.IGNORECASE)
+_CONFIDENCE_RE = re.compile(r'confidence\s*[:\-]\s*\**\s*(high|medium|low)', re.IGNORECASE)
+_EXPLANATION_RE = re.compile(r'explanation\s*[:\-]\s*(.+)', re.IGNORECASE | re.DOTALL)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    claim TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    confidence TEXT NOT NULL,
+    explanation TEXT NOT NULL,
+    sources TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def normalize_claim(claim: str) -> str:
+    """Case, punctuation and whitespace-insensitive form of a claim"""
+    return ' '.join(re.sub(r'[^\w\s%.]', ' ', claim.lower()).replace('. ', ' ').split()).rstrip('.')
+
+
+def extract_claims(text: str, max_claims: int = CLAIM_MAX_CLAIMS) -> List[str]:
+    """Pull discrete, checkable factual statements out of an analysis"""
+    claims: Dict[str, str] = {}
+    for line in text.splitlines():
+        if not line.strip() or _HEADING_RE.match(line):
+            continue
+        line = _BULLET_RE.sub('', line).strip().strip('*').strip()
+        for sentence in _SENTENCE_RE.split(line):
+            sentence = sentence.strip()
+            words = len(sentence.split())
+            if words < 4 or words > 60 or sentence.endswith('?'):
+                continue
+            if _NOT_A_CLAIM_RE.search(sentence) or not _CHECKABLE_RE.search(sentence):
+                continue
+            claims.setdefault(normalize_claim(sentence), sentence)
+            if len(claims) >= max_claims:
+                return list(claims.values())
+    return list(claims.values())
+
+
+def parse_verdict(output: str) -> Dict[str, str]:
+    """Read the verdict, confidence and explanation out of a verification answer"""
+    verdict = _VERDICT_RE.search(output)
+    confidence = _CONFIDENCE_RE.search(output)
+    explanation = _EXPLANATION_RE.search(output)
+    return {
+        "verdict": verdict.group(1).lower() if verdict else "unverified",
+        "confidence": confidence.group(1).lower() if confidence else "low",
+        "explanation": ' '.join((explanation.group(1) if explanation else output).split())[:600],
+    }
+
+
+class VerdictCache:
+    """Persistent verdicts shared across runs and processes.
+
+    Keyed by normalized claim text, the model and sampling settings that
+    judged it and a hash of the evidence it was judged against.
+    """
+
+    def __init__(self, path: str = CLAIM_CACHE_PATH, ttl: float = CLAIM_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; sqlite3 connections must not cross threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(claim: str, model: str, evidence: str = '') -> str:
+        """``model`` should also identify the sampling settings"""
+        evidence_hash = hashlib.sha256(' '.join(evidence.split()).encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{model}\n{evidence_hash}\n{normalize_claim(claim)}".encode('utf-8')).hexdigest()
+
+    def get(self, claim: str, model: str, evidence: str = '') -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            'SELECT verdict, confidence, explanation, sources, created_at FROM verdicts WHERE key = ?',
+            (self.key(claim, model, evidence),)
+        ).fetchone()
+        if row is None or time.time() - row[4] > self.ttl:
+            return None
+        return {"claim": claim, "verdict": row[0], "confidence": row[1], "explanation": row[2],
+                "sources": json.loads(row[3]), "cached": True}
+
+    def put(self, claim: str, model: str, evidence: str, result: Dict[str, Any]):
+        self._conn.execute(
+            'INSERT OR REPLACE INTO verdicts (key, claim, verdict, confidence, explanation, sources, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (self.key(claim, model, evidence), claim, result["verdict"], result["confidence"], result["explanation"],
+             json.dumps(result["sources"]), time.time())
+        )
+
+
+# Create a shared cache instance
+verdict_cache = VerdictCache()
+
+
+class ClaimVerifier:
+    """Fact checks an analysis one claim at a time.
+
+    Each claim becomes its own small crew task with evidence passages
+    ranked against that claim, so claims are verified in parallel instead
+    of one after another in a single long conversation. Each claim
+    borrows an idle fact checker from a shared pool, since crewai agents
+    cannot be shared between concurrent crews. Verdicts are cached per
+    claim, model and evidence; ``reuse_verdicts=False`` recomputes them
+    (and refreshes the cache), as when the fact checking stage is rerun.
+    """
+
+    def __init__(self, agent, parallelism: int = CLAIM_PARALLELISM, reuse_verdicts: bool = True):
+        self.agent = agent
+        self.parallelism = max(1, parallelism or llm_gateway.max_in_flight + 1)
+        self.reuse_verdicts = reuse_verdicts
+        llm = getattr(agent, 'llm', None)
+        self.model = str(getattr(llm, 'model', '') or '')
+        self.temperature = getattr(llm, 'temperature', None)
+        self.base_url = getattr(llm, 'base_url', None)
+
+    def verify(self, analysis: str, sources_text: str = "") -> Optional[str]:
+        """Verify the claims in ``analysis``; None if it has nothing to check claim by claim"""
+        from tools.browser_tool import cited_urls
+
+        claims = extract_claims(analysis)
+        if not claims:
+            return None
+        sources = cited_urls(f"{sources_text}\n{analysis}")[:CLAIM_EVIDENCE_SOURCES]
+
+        event_system.notify_step(
+            thought=f"Verifying {len(claims)} claims independently",
+            action="Claim Extraction",
+            input_data="\n".join(claims),
+            observation=f"Up to {self.parallelism} claims at a time against {len(sources)} sources"
+        )
+        with ThreadPoolExecutor(max_workers=min(self.parallelism, len(claims)), thread_name_prefix="claims") as executor:
+            # Copy our context per claim so events, cancellation and tracing follow the job
+            futures = [executor.submit(contextvars.copy_context().run, self._verify_one, claim, sources)
+                       for claim in claims]
+            results = [future.result() for future in futures]
+        return format_report(results)
+
+    def _cache_model(self) -> str:
+        """The model that will actually judge the claim, with its sampling settings"""
+        decision = current_route()
+        model = decision.effective_model(self.model) if decision else self.model
+        return f"{model}@temperature={self.temperature}"
+
+    def _verify_one(self, claim: str, sources: List[str]) -> Dict[str, Any]:
+        check_cancelled()
+        model = self._cache_model()
+        with tracer.span("claim.evidence", sources=len(sources)):
+            evidence, used = self._gather_evidence(claim, sources)
+        cached = verdict_cache.get(claim, model, evidence) if self.reuse_verdicts else None
+        if cached is not None:
+            event_system.notify_step(
+                thought="Reused an earlier verdict",
+                action="Claim Verdict",
+                input_data=claim,
+                observation=f"{cached['verdict']} ({cached['confidence']} confidence, cached)"
+            )
+            return cached
+
+        with tracer.span("claim.verify", agent=self.agent.role) as span:
+            output = self._ask(claim, evidence)
+            result = {"claim": claim, **parse_verdict(output), "sources": used, "cached": False}
+            span.set(verdict=result["verdict"])
+
+        verdict_cache.put(claim, model, evidence, result)
+        event_system.notify_step(
+            thought="Verified claim",
+            action="Claim Verdict",
+            input_data=claim,
+            observation=f"{result['verdict']} ({result['confidence']} confidence)"
+        )
+        return result
+
+    def _gather_evidence(self, claim: str, sources: List[str]):
+        """Passages from each source that bear on this claim"""
+        from agents import get_browser_tool
+
+        tool = get_browser_tool()
+        budget = max(CLAIM_EVIDENCE_TOKENS // max(len(sources), 1), 1)
+        sections, used = [], []
+        for url in sources:
+            check_cancelled()
+            page = tool._fetch_url(url)  # page cache and shared in-flight fetches keep repeats cheap
+            if not page["ok"]:
+                continue
+            passages = select_passages(page["text"], claim, budget)
+            sections.append(f"Source: {page['title'] or url}\nURL: {url}\n{format_passages(passages)}")
+            used.append(url)
+        return "\n\n".join(sections), used
+
+    def _ask(self, claim: str, evidence: str) -> str:
+        from crewai import Crew, Task
+        from agents import lease_fact_checker
+
+        evidence_block = evidence or "No evidence was gathered; use the Browser tool on a reliable source URL if you know one."
+        with lease_fact_checker(ollama_model_name(self.model) or None, self.base_url) as agent:
+            task = Task(
+                description=f"""Verify this single claim:
+        "{claim}"
+
+        Evidence:
+        {evidence_block}
+
+        Judge the claim only against the evidence and any sources you check yourself.""",
+                expected_output="""Exactly these lines:
+        Verdict: Supported, Partially supported, Refuted or Unverified
+        Confidence: High, Medium or Low
+        Explanation: one or two sentences citing the evidence""",
+                agent=agent
+            )
+            crew = Crew(agents=[agent], tasks=[task], process="sequential", verbose=False)
+            return str(crew.kickoff())
+
+
+def format_report(results: List[Dict[str, Any]]) -> str:
+    """Merge claim verdicts into the verification report sections the fact checking task produces"""
+    by_verdict: Dict[str, List[Dict[str, Any]]] = {verdict: [] for verdict in VERDICTS}
+    source_counts: Dict[str, List[str]] = {}
+    for result in results:
+        by_verdict.get(result["verdict"], by_verdict["unverified"]).append(result)
+        for url in result["sources"]:
+            source_counts.setdefault(url, []).append(result["verdict"])
+
+    def bullets(items, render):
+        return "\n".join(render(item) for item in items) if items else "- None"
+
+    confirmed = by_verdict["supported"] + by_verdict["partially supported"]
+    concerns = by_verdict["refuted"] + by_verdict["unverified"]
+    symbols = {"supported": "✅", "partially supported": "🟡", "refuted": "❌", "unverified": "❔"}
+
+    return f"""Verification Report ({len(results)} claims checked independently)
+
+Confirmed Facts and Statistics:
+{bullets(confirmed, lambda r: f"- {r['claim']} ({r['verdict']}, {r['confidence']} confidence)")}
+
+Source Credibility Assessment:
+{bullets(sorted(source_counts.items()), lambda item: f"- {item[0]}: evidence for {len(item[1])} claims, "
+         f"{sum(v == 'refuted' for v in item[1])} of them refuted")}
+
+Cross-Reference Results:
+{bullets(results, lambda r: f"- {symbols.get(r['verdict'], '❔')} {r['claim']}: {r['explanation']}")}
+
+Identified Biases or Concerns:
+{bullets(concerns, lambda r: f"- {r['verdict'].capitalize()}: {r['claim']}")}
+"""
@@ -1,5 +1,160 @@
-from typing import Dict, Any, Callable, List
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from datetime import datetime
+from collections import deque
+from contextlib import contextmanager
+import contextvars
+import os
+import threading
+import uuid
+import weakref
+
+# Dispatch configuration
+EVENT_DISPATCH = os.getenv('EVENT_DISPATCH', 'async')  # async or sync
+EVENT_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '1000'))
+# What to do when the queue is full: coalesce (merge streamed tokens, then drop progress
+# steps, never losing tokens, messages or citations), drop_oldest, drop_newest or block
+# (handlers publishing from the dispatcher thread coalesce rather than wait on themselves)
+EVENT_OVERFLOW_POLICY = os.getenv('EVENT_OVERFLOW_POLICY', 'coalesce')
+
+# Session that events emitted from the current context belong to
+_current_session: contextvars.ContextVar = contextvars.ContextVar('event_session', default=None)
+# Set while work in this context should run without publishing events
+_muted: contextvars.ContextVar = contextvars.ContextVar('events_muted', default=False)
+
+
+class Subscription:
+    """Handle for a subscribed handler; unsubscribes on exit when used as a context manager.
+
+    Bound methods are held weakly, so a subscriber that is garbage collected
+    drops out of the bus on its own.
+    """
+
+    def __init__(self, bus: 'EventSystem', kind: str, handler: Callable, session_id: Optional[str]):
+        self._bus = bus
+        self.kind = kind
+        self.session_id = session_id
+        if hasattr(handler, '__self__') and hasattr(handler, '__func__'):
+            self._ref = weakref.WeakMethod(handler)
+        else:
+            self._ref = lambda: handler
+
+    @property
+    def handler(self) -> Optional[Callable]:
+        return self._ref()
+
+    def unsubscribe(self):
+        self._bus._remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unsubscribe()
+
+
+class _EventQueue:
+    """Bounded queue between publishers and the dispatcher thread"""
+
+    def __init__(self, maxsize: int, policy: str):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._items: deque = deque()
+        self._unfinished = 0
+        self._cond = threading.Condition()
+        self._consumer: Optional[threading.Thread] = None
+
+    def put(self, item: Tuple):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                if self.policy == 'coalesce':
+                    if self._coalesce(item):
+                        return
+                elif self.policy == 'block':
+                    if threading.current_thread() is self._consumer:
+                        # The dispatcher would wait for itself, so a handler that
+                        # publishes makes room the way 'coalesce' does instead
+                        if self._coalesce(item):
+                            return
+                    else:
+                        while len(self._items) >= self.maxsize:
+                            self._cond.wait()
+                elif self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return
+                else:
+                    self._drop_one()
+            self._items.append(item)
+            self._unfinished += 1
+            self._cond.notify_all()
+
+    def _drop_one(self):
+        """Make room by discarding the oldest event"""
+        del self._items[0]
+        self._unfinished -= 1
+        self.dropped += 1
+
+    def _coalesce(self, item: Tuple) -> bool:
+        """Make room without losing text; True if ``item`` was merged into a queued event.
+
+        Tokens are appended to the session's latest event when that is a
+        token from the same source, so per-session order is kept. Failing
+        that, queued runs of such tokens are merged, then the oldest
+        progress step is dropped, and as a last resort the publisher waits.
+        """
+        kind, session_id, args = item
+        if kind == 'token':
+            for index in range(len(self._items) - 1, -1, -1):
+                queued = self._items[index]
+                if queued[1] != session_id:
+                    continue
+                if queued[0] == 'token' and queued[2][0] == args[0]:
+                    self._items[index] = (kind, session_id, (args[0], queued[2][1] + args[1]))
+                    return True
+                break
+
+        latest: Dict[Any, int] = {}
+        for index, queued in enumerate(self._items):
+            previous = latest.get(queued[1])
+            if (previous is not None and queued[0] == 'token' and self._items[previous][0] == 'token'
+                    and self._items[previous][2][0] == queued[2][0]):
+                source, text = self._items[previous][2]
+                self._items[previous] = ('token', queued[1], (source, text + queued[2][1]))
+                del self._items[index]
+                self._unfinished -= 1
+                return False
+            latest[queued[1]] = index
+
+        victim = next((i for i, queued in enumerate(self._items) if queued[0] == 'step'), None)
+        if victim is not None:
+            del self._items[victim]
+            self._unfinished -= 1
+            self.dropped += 1
+            return False
+
+        # A handler publishing from the dispatcher thread must not wait on itself
+        while len(self._items) >= self.maxsize and threading.current_thread() is not self._consumer:
+            self._cond.wait()
+        return False
+
+    def get(self) -> Tuple:
+        with self._cond:
+            self._consumer = threading.current_thread()
+            while not self._items:
+                self._cond.wait()
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def task_done(self):
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._unfinished <= 0, timeout=timeout)
+
 
 class EventSystem:
     _instance = None
@@ -12,36 +167,133 @@ class EventSystem:
 
     def _initialize(self):
         """Initialize event handlers"""
-        self._step_handlers: List[Callable] = []
-        self._citation_handlers: List[Callable] = []
-        self._message_handlers: List[Callable] = []
+        self._handlers: Dict[str, List[Subscription]] = {"step": [], "citation": [], "message": [], "token": []}
+        self._lock = threading.Lock()
+        self._queue = _EventQueue(EVENT_QUEUE_SIZE, EVENT_OVERFLOW_POLICY)
+        self._dispatcher: Optional[threading.Thread] = None
+
+    @contextmanager
+    def session(self, session_id: Optional[str] = None):
+        """Scope events emitted in this context to one session"""
+        session_id = session_id or uuid.uuid4().hex
+        token = _current_session.set(session_id)
+        try:
+            yield session_id
+        finally:
+            _current_session.reset(token)
+
+    @contextmanager
+    def muted(self):
+        """Discard events emitted in this context, e.g. from background work nobody asked to see"""
+        token = _muted.set(True)
+        try:
+            yield
+        finally:
+            _muted.reset(token)
+
+    def current_session(self) -> Optional[str]:
+        return _current_session.get()
+
+    def subscribe(self, kind: str, handler: Callable, session_id: Optional[str] = None) -> Subscription:
+        """Subscribe to one kind of event.
+
+        Handlers subscribed inside a session only see that session's events;
+        handlers subscribed outside any session see every event.
+        """
+        subscription = Subscription(self, kind, handler, session_id or _current_session.get())
+        with self._lock:
+            self._handlers[kind] = self._handlers[kind] + [subscription]
+        return subscription
 
-    def subscribe_to_step(self, handler: Callable[[str, str, str, str], None]):
+    def subscribe_to_step(self, handler: Callable[[str, str, str, str], None], session_id: Optional[str] = None):
         """Subscribe to step updates"""
-        self._step_handlers.append(handler)
+        return self.subscribe("step", handler, session_id)
 
-    def subscribe_to_citation(self, handler: Callable[[str, str, str], None]):
+    def subscribe_to_citation(self, handler: Callable[[str, str, str], None], session_id: Optional[str] = None):
         """Subscribe to citation updates"""
-        self._citation_handlers.append(handler)
+        return self.subscribe("citation", handler, session_id)
 
-    def subscribe_to_message(self, handler: Callable[[str, str], None]):
+    def subscribe_to_message(self, handler: Callable[[str, str], None], session_id: Optional[str] = None):
         """Subscribe to message updates"""
-        self._message_handlers.append(handler)
+        return self.subscribe("message", handler, session_id)
+
+    def subscribe_to_token(self, handler: Callable[[str, str], None], session_id: Optional[str] = None):
+        """Subscribe to streamed LLM tokens"""
+        return self.subscribe("token", handler, session_id)
+
+    def _remove(self, subscription: Subscription):
+        with self._lock:
+            handlers = self._handlers[subscription.kind]
+            if subscription in handlers:
+                # Copy on write so dispatch can iterate without holding the lock
+                self._handlers[subscription.kind] = [s for s in handlers if s is not subscription]
 
     def notify_step(self, thought: str, action: str, input_data: str, observation: str):
         """Notify all step handlers"""
-        for handler in self._step_handlers:
-            handler(thought, action, input_data, observation)
+        self._publish("step", (thought, action, input_data, observation))
 
     def notify_citation(self, title: str, url: str, content: str):
         """Notify all citation handlers"""
-        for handler in self._citation_handlers:
-            handler(title, url, content)
+        self._publish("citation", (title, url, content))
 
     def notify_message(self, role: str, content: str):
         """Notify all message handlers"""
-        for handler in self._message_handlers:
-            handler(role, content)
+        self._publish("message", (role, content))
+
+    def notify_token(self, source: str, token: str):
+        """Notify all token handlers"""
+        self._publish("token", (source, token))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued event has been delivered"""
+        if EVENT_DISPATCH == 'sync':
+            return True
+        return self._queue.join(timeout)
+
+    @property
+    def dropped(self) -> int:
+        """Events discarded by the overflow policy"""
+        return self._queue.dropped
+
+    def _publish(self, kind: str, args: Tuple):
+        if _muted.get():
+            return
+        event = (kind, _current_session.get(), args)
+        if EVENT_DISPATCH == 'sync':
+            self._deliver(event)
+            return
+        self._ensure_dispatcher()
+        self._queue.put(event)
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None:
+            with self._lock:
+                if self._dispatcher is None:
+                    self._dispatcher = threading.Thread(target=self._dispatch_loop, name="event-dispatcher", daemon=True)
+                    self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        while True:
+            event = self._queue.get()
+            try:
+                self._deliver(event)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, event: Tuple):
+        kind, session_id, args = event
+        for subscription in self._handlers[kind]:
+            handler = subscription.handler
+            if handler is None:
+                # The subscriber was garbage collected
+                self._remove(subscription)
+                continue
+            if subscription.session_id is not None and subscription.session_id != session_id:
+                continue
+            try:
+                handler(*args)
+            except Exception as e:
+                print(f"Event handler error ({kind}): {e}")
 
 # Create a singleton instance
-event_system = EventSystem() 
\ No newline at end of file
+event_system = EventSystem()
@@ -0,0 +1,288 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_community.chat_models import ChatOllama
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from event_system import event_system
+from llm_gateway import llm_gateway
+from routing import REASONING_TRACE_TOKENS, ROUTING_EARLY_STOP, current_route, filter_stream, ollama_model_name
+from tools.page_cache import RESEARCH_CACHE_DIR
+
+# Cache configuration
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(RESEARCH_CACHE_DIR, 'llm.sqlite3'))
+LLM_CACHE_MAX_MB = float(os.getenv('LLM_CACHE_MAX_MB', '256'))
+# Cache sampled (temperature > 0) completions too, pinning the sampling seed
+# so a cached answer is one the model would actually have produced. Every
+# agent samples, so turning this off leaves the cache unused.
+LLM_CACHE_DETERMINISTIC = os.getenv('LLM_CACHE_DETERMINISTIC', 'true').lower() in ('1', 'true', 'yes')
+LLM_CACHE_SEED = int(os.getenv('LLM_CACHE_SEED', '42'))
+
+_TOKEN_RE = re.compile(r'\S+\s*|\s+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    generation_info TEXT,
+    generation_seconds REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class LLMResponseCache:
+    """Persistent store of completed generations, shared across processes.
+
+    Uses the same SQLite/WAL layout as the page cache and evicts the least
+    recently used responses once it grows past LLM_CACHE_MAX_MB.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = int(LLM_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats: Dict[str, Dict[str, float]] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; sqlite3 connections must not cross threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            'SELECT text, generation_info, generation_seconds FROM responses WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return {
+            "text": row[0],
+            "generation_info": json.loads(row[1]) if row[1] else None,
+            "generation_seconds": row[2],
+        }
+
+    def put(self, key: str, model: str, text: str, generation_info: Optional[dict], generation_seconds: float):
+        info = json.dumps(generation_info, default=str) if generation_info else None
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, model, text, generation_info, generation_seconds, accessed_at, size) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, model, text, info, generation_seconds, time.time(),
+                 len(text.encode('utf-8')) + len(info or ''))
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def record(self, agent_name: str, hit: bool, saved_seconds: float = 0.0) -> Dict[str, float]:
+        """Count a hit or miss for an agent and return its running totals"""
+        with self._lock:
+            stats = self.stats.setdefault(agent_name, {"hits": 0, "misses": 0, "saved_seconds": 0.0})
+            stats["hits" if hit else "misses"] += 1
+            stats["saved_seconds"] += saved_seconds
+            return dict(stats)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used responses until the cache fits its cap"""
+        total = conn.execute('SELECT coalesce(sum(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% so we don't pay for eviction on every insert
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall():
+            if freed >= target:
+                break
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            freed += size
+
+
+# Create a shared cache instance
+llm_cache = LLMResponseCache()
+
+
+class CachedChatOllama(ChatOllama):
+    """ChatOllama that answers repeated prompts from the persistent LLM cache.
+
+    Cache hits are replayed token by token through the callback manager, so
+    streaming consumers see the same event sequence as a live generation.
+    Misses go to the server through the shared LLM gateway, on the model
+    chosen by the current route decision, with reasoning traces and early
+    stopping applied to the response stream.
+    """
+
+    agent_name: str = "default"
+
+    def _cache_key(self, messages: List[BaseMessage], stop: Optional[List[str]]) -> Optional[str]:
+        """Key on model, sampling and routing settings, system prompt and messages; None if uncacheable"""
+        if not LLM_CACHE_ENABLED:
+            return None
+        if self.temperature and not LLM_CACHE_DETERMINISTIC:
+            return None
+        decision = current_route()
+        payload = {
+            "model": self._routed_model(),
+            # Filtered and early-stopped responses differ from full ones
+            "reasoning_tokens": REASONING_TRACE_TOKENS,
+            "sections": decision.sections if decision and ROUTING_EARLY_STOP else None,
+            "temperature": self.temperature,
+            "seed": LLM_CACHE_SEED if self.temperature else None,
+            "system": self.system,
+            "stop": stop or self.stop,
+            # Whitespace-only differences should not defeat the cache
+            "messages": [(m.type, ' '.join(str(m.content).split())) for m in messages],
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _routed_model(self) -> str:
+        decision = current_route()
+        return decision.effective_model(self.model) if decision else self.model
+
+    def _sampling_kwargs(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # Extra kwargs end up in Ollama's options, which is where the seed lives
+        if self.temperature and LLM_CACHE_DETERMINISTIC and LLM_CACHE_ENABLED:
+            return {"seed": LLM_CACHE_SEED, **kwargs}
+        return kwargs
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key = self._cache_key(messages, stop)
+        cached = llm_cache.get(key) if key else None
+        if cached is not None:
+            for token in _TOKEN_RE.findall(cached["text"]):
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=ChatGenerationChunk(message=AIMessageChunk(content=token)))
+            self._record_hit(cached)
+            return ChatResult(generations=[ChatGeneration(
+                message=AIMessage(content=cached["text"]),
+                generation_info=cached["generation_info"],
+            )])
+
+        start = time.perf_counter()
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **self._sampling_kwargs(kwargs))
+        if key:
+            generation = result.generations[0]
+            llm_cache.put(key, self._routed_model(), generation.text, generation.generation_info, time.perf_counter() - start)
+            llm_cache.record(self.agent_name, hit=False)
+        return result
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager=None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        key = self._cache_key(messages, stop)
+        cached = llm_cache.get(key) if key else None
+        if cached is not None:
+            for token in _TOKEN_RE.findall(cached["text"]):
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
+            self._record_hit(cached)
+            return
+
+        start = time.perf_counter()
+        parts = []
+        generation_info = None
+        for chunk in super()._stream(messages, stop=stop, run_manager=run_manager, **self._sampling_kwargs(kwargs)):
+            parts.append(chunk.text)
+            generation_info = chunk.generation_info or generation_info
+            yield chunk
+        if key:
+            llm_cache.put(key, self._routed_model(), ''.join(parts), generation_info, time.perf_counter() - start)
+            llm_cache.record(self.agent_name, hit=False)
+
+    def _create_stream(
+        self,
+        api_url: str,
+        payload: Any,
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[str]:
+        # Builds the same request as ChatOllama, but sends it through the
+        # gateway's pooled session once a generation slot is free
+        if self.stop is not None and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        stop = self.stop if self.stop is not None else (stop or [])
+
+        params = self._default_params
+        for key in self._default_params:
+            if key in kwargs:
+                params[key] = kwargs[key]
+        # Clients are configured with litellm-style "ollama/<model>" names, which
+        # the Ollama API itself does not accept
+        params["model"] = ollama_model_name(self._routed_model())
+        if "options" in kwargs:
+            params["options"] = kwargs["options"]
+        else:
+            params["options"] = {
+                **params["options"],
+                "stop": stop,
+                **{k: v for k, v in kwargs.items() if k not in self._default_params},
+            }
+
+        if payload.get("messages"):
+            request_payload = {"messages": payload.get("messages", []), **params}
+        else:
+            request_payload = {"prompt": payload.get("prompt"), "images": payload.get("images", []), **params}
+
+        headers = {"Content-Type": "application/json", **(self.headers if isinstance(self.headers, dict) else {})}
+        lines = llm_gateway.stream(api_url, request_payload, headers, self.timeout, self._check_response)
+        return filter_stream(lines, current_route())
+
+    def _check_response(self, response):
+        if response.status_code == 404:
+            raise OllamaEndpointNotFoundError(
+                "Ollama call failed with status code 404. "
+                "Maybe your model is not found "
+                f"and you should pull the model with `ollama pull {ollama_model_name(self._routed_model())}`."
+            )
+        if response.status_code != 200:
+            raise ValueError(f"Ollama call failed with status code {response.status_code}. "
+                             f"Details: {response.text}")
+
+    def _record_hit(self, cached: Dict[str, Any]):
+        stats = llm_cache.record(self.agent_name, hit=True, saved_seconds=cached["generation_seconds"])
+        total = stats["hits"] + stats["misses"]
+        event_system.notify_step(
+            thought=f"Reused cached completion for {self.agent_name}",
+            action="LLM Cache",
+            input_data=self.model,
+            observation=f"hit rate {stats['hits'] / total:.0%} ({stats['hits']}/{total}), "
+                        f"{stats['saved_seconds']:.1f}s of generation saved"
+        )
@@ -0,0 +1,191 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from event_system import event_system
+from cancellation import check_cancelled
+from tracing import tracer
+
+# Gateway configuration
+# A local Ollama server runs one generation per model at a time unless
+# OLLAMA_NUM_PARALLEL is raised, so extra concurrent requests only queue there
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '1'))
+LLM_POOL_CONNECTIONS = int(os.getenv('LLM_POOL_CONNECTIONS', '8'))
+# Waits longer than this are reported as a research step
+LLM_QUEUE_NOTIFY_SECONDS = float(os.getenv('LLM_QUEUE_NOTIFY_SECONDS', '1.0'))
+
+# Scheduling order: interactive work first, then later pipeline stages, then older jobs
+WORKLOAD_PRIORITY = {"interactive": 0, "batch": 1}
+
+_workload: contextvars.ContextVar = contextvars.ContextVar('llm_workload', default=("interactive", 0.0))
+_stage: contextvars.ContextVar = contextvars.ContextVar('llm_stage', default=0)
+
+
+@contextmanager
+def workload_scope(kind: str):
+    """Mark LLM calls made in this context as one job of an interactive or batch workload"""
+    if kind not in WORKLOAD_PRIORITY:
+        raise ValueError(f"Unknown workload {kind!r}")
+    token = _workload.set((kind, time.monotonic()))
+    try:
+        yield
+    finally:
+        _workload.reset(token)
+
+
+@contextmanager
+def stage_scope(stage_index: int):
+    """Mark LLM calls made in this context as belonging to a pipeline stage (0 = first)"""
+    token = _stage.set(stage_index)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+class LLMGateway:
+    """Shared front door to the Ollama server.
+
+    Every generation goes through one pooled keep-alive HTTP session and
+    must hold one of ``max_in_flight`` slots. Callers waiting for a slot
+    are served by priority rather than arrival: interactive sessions before
+    batch runs, later pipeline stages before earlier ones (so research that
+    is already under way finishes before new jobs start generating), and
+    older jobs before newer ones.
+    """
+
+    def __init__(self, max_in_flight: int = LLM_MAX_IN_FLIGHT, pool_connections: int = LLM_POOL_CONNECTIONS):
+        self.max_in_flight = max(1, max_in_flight)
+        self.pool_connections = max(self.max_in_flight, pool_connections)
+        self._session = None
+        self._cond = threading.Condition()
+        self._waiting: list = []
+        self._in_flight = 0
+        self._seq = itertools.count()
+        self.stats = {"requests": 0, "queued": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+
+    @property
+    def session(self):
+        """Pooled keep-alive HTTP session, created on first use"""
+        if self._session is None:
+            with self._cond:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_connections)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    @contextmanager
+    def slot(self):
+        """Hold an in-flight generation slot for the enclosed block"""
+        waited = self._acquire()
+        try:
+            yield waited
+        finally:
+            self._release()
+
+    def stream(self, url: str, payload: Dict[str, Any], headers: Dict[str, str], timeout: Optional[float],
+               check: Callable[[Any], None]) -> Iterator[str]:
+        """POST a streaming generation request and yield its response lines.
+
+        The slot is taken when iteration starts and held until the stream is
+        exhausted or closed. ``check`` may raise on an error response.
+        """
+        with self.slot():
+            response = self.session.post(url, headers=headers, json=payload, stream=True, timeout=timeout)
+            try:
+                response.encoding = 'utf-8'
+                check(response)
+                yield from response.iter_lines(decode_unicode=True)
+            finally:
+                response.close()
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._waiting)
+
+    def _priority(self):
+        kind, job_started = _workload.get()
+        return WORKLOAD_PRIORITY[kind], -_stage.get(), job_started, next(self._seq)
+
+    def _acquire(self) -> float:
+        priority = self._priority()
+        labels = {"workload": _workload.get()[0], "stage": str(_stage.get())}
+        start = time.perf_counter()
+        with self._cond:
+            self.stats["requests"] += 1
+            if self._in_flight < self.max_in_flight and not self._waiting:
+                self._in_flight += 1
+                self._publish()
+                tracer.metrics.observe("llm_gateway_wait_seconds", 0.0,
+                                       help="Time generations waited for an LLM slot", **labels)
+                return 0.0
+
+            self.stats["queued"] += 1
+            entry = [priority, False]
+            heapq.heappush(self._waiting, entry)
+            self._publish()
+            position = sum(1 for other in self._waiting if other[0] < priority) + 1
+            try:
+                while not entry[1]:
+                    # Wake periodically so a cancelled job leaves the queue
+                    self._cond.wait(timeout=0.5)
+                    if not entry[1]:
+                        check_cancelled()
+            except BaseException:
+                # Interrupted while queued: give up our place, or pass on a slot we were just granted
+                if entry[1]:
+                    self._release_locked()
+                else:
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._publish()
+                raise
+
+            waited = time.perf_counter() - start
+            self.stats["wait_seconds"] += waited
+            self.stats["max_wait_seconds"] = max(self.stats["max_wait_seconds"], waited)
+
+        tracer.metrics.observe("llm_gateway_wait_seconds", waited,
+                               help="Time generations waited for an LLM slot", **labels)
+        if waited >= LLM_QUEUE_NOTIFY_SECONDS:
+            event_system.notify_step(
+                thought="Waited for the shared model",
+                action="LLM Queue",
+                input_data=f"{labels['workload']} workload, stage {labels['stage']}",
+                observation=f"Started generating after {waited:.1f}s in the queue (joined at position {position})"
+            )
+        return waited
+
+    def _release(self):
+        with self._cond:
+            self._release_locked()
+
+    def _release_locked(self):
+        self._in_flight -= 1
+        if self._waiting and self._in_flight < self.max_in_flight:
+            entry = heapq.heappop(self._waiting)
+            entry[1] = True
+            self._in_flight += 1
+            self._cond.notify_all()
+        self._publish()
+
+    def _publish(self):
+        tracer.metrics.set("llm_gateway_queue_depth", len(self._waiting),
+                           help="Generations waiting for an LLM slot")
+        tracer.metrics.set("llm_gateway_in_flight", self._in_flight,
+                           help="Generations currently running")
+
+
+# Create a shared gateway instance
+llm_gateway = LLMGateway()
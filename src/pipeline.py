@@ -0,0 +1,290 @@
+import contextlib
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from crewai import Crew
+from event_system import event_system
+from cancellation import JobCancelled, check_cancelled, is_cancelled
+from run_store import RUN_STORE_ENABLED, STAGES, run_store
+from llm_gateway import stage_scope
+from routing import expected_sections, model_router, route_scope, strip_reasoning
+from tasks import get_research_task, get_analysis_task, get_fact_checking_task
+from claims import FACT_CHECK_MODE, ClaimVerifier
+from citations import CITATION_FINGERPRINT_CHARS
+from tracing import tracer
+from agents import get_browser_tool
+from tools.browser_tool import cited_urls, session_pages_scope
+
+# Pipeline configuration
+# Fetch pages cited in streamed research output while the earlier stages are still running
+PIPELINE_PREFETCH = os.getenv('PIPELINE_PREFETCH', 'true').lower() in ('1', 'true', 'yes')
+PIPELINE_PREFETCH_MAX = int(os.getenv('PIPELINE_PREFETCH_MAX', '8'))
+PIPELINE_PREFETCH_WORKERS = int(os.getenv('PIPELINE_PREFETCH_WORKERS', '2'))
+
+
+class _Prefetcher:
+    """Reads pages cited by upstream output before the agents that need them ask.
+
+    Fed streamed tokens as the research agent writes, and whole stage
+    outputs as they complete. Each new URL is fetched in the background
+    into the run's session pages, so analysis and fact checking find it
+    there instead of waiting on the network. Prefetches publish no events:
+    a page only shows up as a citation once an agent actually reads it.
+    """
+
+    def __init__(self, pages, limit: int = PIPELINE_PREFETCH_MAX, workers: int = PIPELINE_PREFETCH_WORKERS):
+        self.pages = pages
+        self.limit = limit
+        # Jobs run in the run's context so their events, cancellation and session pages carry over
+        self._context = contextvars.copy_context()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="prefetch")
+        self._seen = set()
+        self._buffer = ""
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def feed_token(self, source: str, token: str):
+        """Scan streamed text, holding back a possibly unfinished trailing URL"""
+        with self._lock:
+            self._buffer += token
+            cut = max(self._buffer.rfind(' '), self._buffer.rfind('\n'))
+            if cut < 0:
+                return
+            complete, self._buffer = self._buffer[:cut], self._buffer[cut:]
+        self.feed_text(complete)
+
+    def feed_text(self, text: str):
+        for url in cited_urls(text):
+            with self._lock:
+                if self._closed or url in self._seen or len(self._seen) >= self.limit:
+                    continue
+                self._seen.add(url)
+            if url not in self.pages:
+                self._executor.submit(self._context.copy().run, self._fetch, url)
+
+    def _fetch(self, url: str):
+        if self._closed or is_cancelled() or url in self.pages:
+            return
+        with tracer.span("pipeline.prefetch", url=url), event_system.muted():
+            get_browser_tool()._fetch_url(url, origin="prefetch")
+
+    def close(self):
+        """Cancel queued prefetches; ones already fetching finish silently in the background"""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_stage(stage, query, agent, task, upstream_key, rerun, variant=None, execute=None):
+    """Run one stage as a single-task crew, or reuse its checkpoint from an earlier run.
+
+    ``execute`` replaces the crew with a custom runner that returns the
+    stage output, or None to fall back to the crew. The stage runs on the
+    model the router picks for it, and its output is passed on without
+    reasoning traces.
+    """
+    # The routed model and the task prompt are part of the checkpoint key; the
+    # decision is only timed and recorded if the stage actually runs below
+    decision = model_router.decide(stage, query, agent)
+    if decision.routed:
+        variant = f"{variant}/{decision.model}" if variant else decision.model
+    key = run_store.stage_key(query, stage, agent, upstream_key, variant,
+                              prompt=f"{task.description}\n{task.expected_output}")
+
+    if RUN_STORE_ENABLED and not rerun:
+        with tracer.span("checkpoint.load", stage=stage) as span:
+            checkpoint = run_store.load(query, stage, key)
+            span.set(hit=checkpoint is not None)
+        if checkpoint is not None:
+            # Replay the stage's citations so this session shows its sources too
+            for title, url, content in checkpoint["citations"]:
+                event_system.notify_citation(title, url, content)
+            event_system.notify_step(
+                thought=f"Reusing checkpointed {stage} output",
+                action="Checkpoint",
+                input_data=query,
+                observation=f"Skipped the {stage} stage ({key})"
+            )
+            return strip_reasoning(checkpoint["output"]), key
+
+    # Collect the citations this stage produces so they can be checkpointed with it,
+    # keeping as much of each page as the citation index fingerprints
+    citations = []
+    with event_system.subscribe_to_citation(
+            lambda title, url, content: citations.append([title, url, content[:CITATION_FINGERPRINT_CHARS]])):
+        # Later stages get the model first so jobs already under way finish sooner
+        with stage_scope(STAGES.index(stage)), route_scope(decision):
+            output = execute() if execute is not None else None
+            if output is None:
+                decision.sections = expected_sections(task.expected_output)
+                crew = Crew(
+                    agents=[agent],
+                    tasks=[task],
+                    process="sequential",
+                    verbose=True
+                )
+                with tracer.span("crew.kickoff", stage=stage, agent=agent.role, model=decision.model):
+                    output = str(crew.kickoff())
+        output = strip_reasoning(output)
+        model_router.finish(decision)
+        event_system.flush(timeout=5)
+
+    if RUN_STORE_ENABLED:
+        run_store.save(query, stage, key, output, citations, agent)
+    return output, key
+
+class ResearchPipeline:
+    """Runs the research, analysis and fact checking stages for one session's agents.
+
+    Built once per worker (or batch thread) and reused for every query it
+    runs. Each stage's output is handed to the next stage's task
+    explicitly, so downstream agents work from the upstream findings
+    instead of re-browsing to reconstruct them. The stages themselves run
+    one after another, each as its own single-task crew, since every stage
+    needs the finished output of the one before. What overlaps is page
+    fetching: pages read by any stage are shared with the later ones for
+    the rest of the run, and pages cited in the research output are
+    fetched while the research and analysis stages are still running.
+    """
+
+    def __init__(self, agents):
+        self.agents = agents
+
+    def run(self, query, rerun_from=None):
+        """Run the pipeline for a query.
+
+        Completed stages are checkpointed in the run store and reused on
+        later runs with the same query and configuration. ``rerun_from``
+        names a stage ("research", "analysis" or "fact_check") to recompute
+        along with everything after it.
+
+        Returns the output of each stage, plus the error message if a stage failed.
+        """
+        with session_pages_scope() as pages:
+            prefetcher = _Prefetcher(pages) if PIPELINE_PREFETCH else None
+            try:
+                return self._run(query, rerun_from, prefetcher)
+            finally:
+                if prefetcher is not None:
+                    prefetcher.close()
+                self._report_reuse(query, pages)
+
+    def _run(self, query, rerun_from, prefetcher):
+        agents = self.agents
+        results = {"research": None, "analysis": None, "fact_check": None, "error": None}
+        rerun = set(STAGES[STAGES.index(rerun_from):]) if rerun_from else set()
+
+        # Add initial message
+        event_system.notify_message("user", query)
+        event_system.notify_message("assistant", "🔍 Starting research process...")
+
+        with tracer.span("research.run", query=query):
+            try:
+                # 1. Research Task, prefetching the pages it cites as they stream in
+                researcher = agents["web_research_specialist"]
+                with self._watch_tokens(researcher, prefetcher):
+                    research_output, research_key = _run_stage(
+                        "research", query, researcher,
+                        get_research_task(query, researcher),
+                        None, "research" in rerun
+                    )
+                if prefetcher is not None:
+                    prefetcher.feed_text(research_output)
+                results["research"] = research_output
+                event_system.notify_message("assistant", f"📝 Research Findings:\n\n{research_output}")
+                check_cancelled()
+
+                # 2. Analysis Task with research results as input
+                analysis_output, analysis_key = _run_stage(
+                    "analysis", query, agents["content_analyzer"],
+                    get_analysis_task(research_output, agents["content_analyzer"]),
+                    research_key, "analysis" in rerun
+                )
+                if prefetcher is not None:
+                    prefetcher.feed_text(analysis_output)
+                results["analysis"] = analysis_output
+                event_system.notify_message("assistant", f"🔍 Analysis Results:\n\n{analysis_output}")
+                check_cancelled()
+
+                # 3. Fact Checking Task with analysis results as input, verified
+                # claim by claim in parallel unless FACT_CHECK_MODE=task
+                claim_mode = FACT_CHECK_MODE == "claims"
+                final_output, _ = _run_stage(
+                    "fact_check", query, agents["fact_checker"],
+                    get_fact_checking_task(analysis_output, agents["fact_checker"], cited_urls(research_output)),
+                    analysis_key, "fact_check" in rerun,
+                    variant=FACT_CHECK_MODE,
+                    # A fact_check rerun re-judges every claim instead of replaying cached verdicts
+                    execute=(lambda: ClaimVerifier(agents["fact_checker"], reuse_verdicts="fact_check" not in rerun)
+                             .verify(analysis_output, research_output))
+                    if claim_mode else None
+                )
+                results["fact_check"] = final_output
+
+                # Add final comprehensive result
+                final_summary = f"""
+        🎯 Final Research Results:
+
+        1️⃣ Initial Research:
+        {research_output}
+
+        2️⃣ Analysis:
+        {analysis_output}
+
+        3️⃣ Fact Check:
+        {final_output}
+        """
+                event_system.notify_message("assistant", final_summary)
+
+            except JobCancelled:
+                event_system.notify_message("assistant", "🛑 Research cancelled.")
+                raise
+            except Exception as e:
+                # crewai may wrap the JobCancelled raised from a token callback
+                if is_cancelled():
+                    event_system.notify_message("assistant", "🛑 Research cancelled.")
+                    raise JobCancelled("Research job was cancelled") from e
+                error_msg = f"❌ An error occurred: {str(e)}"
+                event_system.notify_message("assistant", error_msg)
+                print(f"Error details: {e}")
+                results["error"] = str(e)
+
+        return results
+
+    @staticmethod
+    def _watch_tokens(agent, prefetcher):
+        """Feed the agent's streamed tokens to the prefetcher while the block runs"""
+        if prefetcher is None:
+            return contextlib.nullcontext()
+        role = agent.role
+        return event_system.subscribe_to_token(
+            lambda source, token: prefetcher.feed_token(source, token) if source == role else None
+        )
+
+    @staticmethod
+    def _report_reuse(query, pages):
+        stats = pages.stats
+        avoided = stats["reused"] + stats["prefetch_hits"]
+        if not avoided and not stats["prefetched"]:
+            return
+        tracer.metrics.inc("pipeline_browser_calls_avoided_total", avoided,
+                           help="Browser calls answered from pages already read in the same run")
+        event_system.notify_step(
+            thought="Shared pages between stages",
+            action="Page Reuse",
+            input_data=query,
+            observation=f"Avoided {avoided} redundant browser calls: {stats['reused']} pages already read by "
+                        f"an earlier agent, {stats['prefetch_hits']} fetched ahead of time "
+                        f"({stats['prefetched']} prefetched, {stats['fetched']} read by agents)"
+        )
+
+
+def run_research_pipeline(query, agents, rerun_from=None):
+    """Run the research, analysis and fact checking crews for a query.
+
+    Convenience wrapper for one-off runs; long-lived workers keep a
+    ResearchPipeline per agent set.
+    """
+    return ResearchPipeline(agents).run(query, rerun_from)
@@ -0,0 +1,384 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from event_system import event_system
+from tracing import JsonlExport, tracer
+
+# Routing configuration
+# Comma-separated Ollama models, fastest first, e.g. "qwen2.5:3b,llama3.1:8b,deepseek-r1:8b".
+# Empty keeps every agent on its own model.
+ROUTING_TIERS = [model.strip() for model in os.getenv('ROUTING_TIERS', '').split(',') if model.strip()]
+# Tiers added to the query's complexity level (0-2) for each stage
+ROUTING_STAGE_BIAS = os.getenv('ROUTING_STAGE_BIAS', 'research=0,analysis=0,fact_check=1')
+# Reasoning-trace tokens (<think>...</think>) kept in what agents and later stages see; -1 keeps all
+REASONING_TRACE_TOKENS = int(os.getenv('REASONING_TRACE_TOKENS', '0'))
+# Stop generating once every section the task asks for has been written. Opt-in: the
+# last section ends at its first full paragraph, so longer closing sections get cut short
+ROUTING_EARLY_STOP = os.getenv('ROUTING_EARLY_STOP', 'false').lower() in ('1', 'true', 'yes')
+ROUTING_SECTION_MIN_CHARS = int(os.getenv('ROUTING_SECTION_MIN_CHARS', '200'))
+# Per-decision JSONL log for tuning the tiers; opt-in, and rotated like TRACE_PATH
+ROUTING_LOG_PATH = os.getenv('ROUTING_LOG_PATH', '')
+
+COMPLEXITY_LABELS = ("simple", "moderate", "complex")
+
+_THINK_OPEN = '<think>'
+_THINK_CLOSE = '</think>'
+_THINK_RE = re.compile(r'<think>(.*?)(?:</think>|$)\s*', re.DOTALL)
+_FINAL_ANSWER = 'Final Answer:'
+_COMPARE_RE = re.compile(
+    r'\b(compare|comparison|versus|vs\.?|trade-?offs?|pros and cons|differences?|better than)\b', re.IGNORECASE)
+_CAUSAL_RE = re.compile(r'\b(why|how does|how do|impact|effects?|implications?|causes?|consequences?)\b',
+                        re.IGNORECASE)
+_SCOPE_RE = re.compile(r'\b(history|evolution|trends?|over time|since \d{4}|between \d{4}|future|forecast)\b',
+                       re.IGNORECASE)
+
+_current_route: contextvars.ContextVar = contextvars.ContextVar('route_decision', default=None)
+
+
+def _parse_stage_bias(spec: str) -> Dict[str, int]:
+    bias = {}
+    for item in spec.split(','):
+        if '=' in item:
+            stage, value = item.split('=', 1)
+            bias[stage.strip()] = int(value)
+    return bias
+
+
+def query_complexity(query: str) -> Tuple[int, List[str]]:
+    """Complexity level (0 simple, 1 moderate, 2 complex) and the signals behind it"""
+    words = len(query.split())
+    reasons = []
+    if words > 25:
+        reasons.append("long query")
+    if query.count('?') > 1 or len(re.findall(r'\band\b|;', query)) > 2:
+        reasons.append("several questions")
+    if _COMPARE_RE.search(query):
+        reasons.append("comparison")
+    if _CAUSAL_RE.search(query):
+        reasons.append("causal")
+    if _SCOPE_RE.search(query):
+        reasons.append("time span")
+    if not reasons and words <= 10:
+        return 0, ["short factual query"]
+    return (2 if len(reasons) >= 2 else 1), reasons or ["open-ended query"]
+
+
+def strip_reasoning(text: str, keep_tokens: int = REASONING_TRACE_TOKENS) -> str:
+    """Remove <think> reasoning traces, or cap each one at ``keep_tokens`` words"""
+    if keep_tokens < 0 or _THINK_OPEN not in text:
+        return text
+
+    def cap(match):
+        if not keep_tokens:
+            return ''
+        words = match.group(1).split()
+        kept = ' '.join(words[:keep_tokens])
+        return f"{_THINK_OPEN}{kept}{' ...' if len(words) > keep_tokens else ''}{_THINK_CLOSE}\n"
+
+    return _THINK_RE.sub(cap, text)
+
+
+def expected_sections(expected_output: str) -> List[str]:
+    """Heading phrases (first two words) of the bullet list in a task's expected output"""
+    sections = []
+    for line in expected_output.splitlines():
+        line = line.strip()
+        if line.startswith(('-', '*')):
+            words = re.findall(r'\w[\w-]*', line)[:2]
+            if words:
+                sections.append(' '.join(words).lower())
+    return sections
+
+
+class ReasoningFilter:
+    """Streaming counterpart of strip_reasoning: drops trace tokens as they arrive"""
+
+    def __init__(self, keep_tokens: int = REASONING_TRACE_TOKENS):
+        self.keep_tokens = keep_tokens
+        self.stripped_tokens = 0
+        self._in_trace = False
+        self._kept = 0
+        self._pending = ''
+        self._after_trace = False
+
+    def feed(self, token: str) -> str:
+        """Visible part of a streamed token"""
+        if self.keep_tokens < 0:
+            return token
+        text, self._pending = self._pending + token, ''
+        visible = []
+        while text:
+            tag = _THINK_CLOSE if self._in_trace else _THINK_OPEN
+            index = text.find(tag)
+            if index == -1:
+                # Hold back a tail that could be the start of a split tag
+                hold = next((n for n in range(min(len(tag) - 1, len(text)), 0, -1) if tag.startswith(text[-n:])), 0)
+                self._pending = text[len(text) - hold:] if hold else ''
+                self._emit(text[:len(text) - hold], visible)
+                break
+            self._emit(text[:index], visible)
+            text = text[index + len(tag):]
+            if self._in_trace:
+                self._in_trace = False
+                if self.keep_tokens and self._kept:
+                    visible.append(_THINK_CLOSE + '\n')
+                self._after_trace = True
+            else:
+                self._in_trace = True
+                self._kept = 0
+                if self.keep_tokens:
+                    visible.append(_THINK_OPEN)
+        return ''.join(visible)
+
+    def _emit(self, text: str, visible: List[str]):
+        if not self._in_trace:
+            if self._after_trace:
+                # Drop the whitespace separating a trace from the answer
+                text = text.lstrip()
+                self._after_trace = not text
+            visible.append(text)
+            return
+        for token in re.findall(r'\s*\S+|\s+$', text):
+            if self._kept < self.keep_tokens:
+                self._kept += 1
+                visible.append(token)
+            elif token.strip():
+                self.stripped_tokens += 1
+
+
+class SectionWatcher:
+    """Notices when a final answer has written every expected section.
+
+    Complete once each heading phrase has appeared at the start of a line
+    after "Final Answer:" and the last of them has at least ``min_chars``
+    of body ending in a paragraph break.
+    """
+
+    def __init__(self, sections: List[str], min_chars: int = ROUTING_SECTION_MIN_CHARS):
+        self.patterns = [re.compile(r'^[\s#*>\-\d.)]*' + re.escape(section), re.IGNORECASE | re.MULTILINE)
+                         for section in sections]
+        self.min_chars = min_chars
+        self._text = ''
+
+    def feed(self, text: str) -> bool:
+        self._text += text
+        if not self.patterns or '\n' not in text:
+            return False
+        start = self._text.find(_FINAL_ANSWER)
+        if start == -1:
+            return False
+        answer = self._text[start:]
+        positions = []
+        for pattern in self.patterns:
+            match = pattern.search(answer)
+            if match is None:
+                return False
+            positions.append(match.end())
+        return answer.find('\n\n', max(positions) + self.min_chars) != -1
+
+
+class RouteDecision:
+    """The model chosen for one pipeline stage, and what that choice saved"""
+
+    def __init__(self, stage: str, query: str, default_model: str, model: str, complexity: int,
+                 reasons: List[str]):
+        self.stage = stage
+        self.query = query
+        self.default_model = default_model
+        self.model = model
+        self.complexity = complexity
+        self.reasons = reasons
+        self.sections: List[str] = []
+        self.started: Optional[float] = None  # Set when the stage starts running in route_scope
+        self.calls = 0
+        self.completion_tokens = 0
+        self.reasoning_tokens_stripped = 0
+        self.early_stops = 0
+        self._lock = threading.Lock()
+
+    @property
+    def routed(self) -> bool:
+        return self.model != self.default_model
+
+    def effective_model(self, model: str) -> str:
+        """Model to request for a client configured with ``model``"""
+        return self.model if model == self.default_model else model
+
+    def record_call(self, completion_tokens: int, stripped_tokens: int, stopped_early: bool):
+        with self._lock:
+            self.calls += 1
+            self.completion_tokens += completion_tokens
+            self.reasoning_tokens_stripped += stripped_tokens
+            self.early_stops += int(stopped_early)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "complexity": COMPLEXITY_LABELS[self.complexity],
+            "reasons": self.reasons,
+            "model": self.model,
+            "default_model": self.default_model,
+            "calls": self.calls,
+            "completion_tokens": self.completion_tokens,
+            "reasoning_tokens_stripped": self.reasoning_tokens_stripped,
+            "early_stops": self.early_stops,
+        }
+
+
+@contextmanager
+def route_scope(decision: Optional[RouteDecision]):
+    """Send LLM calls made in this context to the decision's model, timing the stage"""
+    if decision is not None and decision.started is None:
+        decision.started = time.perf_counter()
+    token = _current_route.set(decision)
+    try:
+        yield decision
+    finally:
+        _current_route.reset(token)
+
+
+def current_route() -> Optional[RouteDecision]:
+    return _current_route.get()
+
+
+def ollama_model_name(model: str) -> str:
+    """Model name as the Ollama server knows it, without the "ollama/" provider prefix"""
+    return model.split('/', 1)[1] if model.startswith('ollama/') else model
+
+
+def filter_stream(lines: Iterable[str], decision: Optional[RouteDecision],
+                  keep_tokens: int = REASONING_TRACE_TOKENS) -> Iterator[str]:
+    """Apply reasoning-trace filtering and early stopping to Ollama's ndjson stream.
+
+    Works on the raw response lines, so both the streaming and the
+    aggregated generation paths see the filtered text.
+    """
+    trace = ReasoningFilter(keep_tokens)
+    watcher = SectionWatcher(decision.sections) if decision and ROUTING_EARLY_STOP and decision.sections else None
+    tokens = 0
+    stopped = False
+    try:
+        for line in lines:
+            if not line:
+                continue
+            chunk = json.loads(line)
+            chat = "message" in chunk
+            content = chunk["message"].get("content", "") if chat else chunk.get("response", "")
+            visible = ""
+            if content:
+                tokens += 1
+                visible = trace.feed(content)
+                if chat:
+                    chunk["message"]["content"] = visible
+                else:
+                    chunk["response"] = visible
+                line = json.dumps(chunk)
+            yield line
+            if watcher is not None and visible and watcher.feed(visible):
+                # Closing the stream closes the response, which ends the generation server-side
+                stopped = True
+                break
+    finally:
+        close = getattr(lines, 'close', None)
+        if close is not None:
+            close()
+        if decision is not None:
+            decision.record_call(tokens, trace.stripped_tokens, stopped)
+
+
+class ModelRouter:
+    """Chooses a model tier per pipeline stage and query complexity.
+
+    The tier index is the query's complexity level plus the stage's bias,
+    clamped to the configured tier list. Every decision is compared with
+    the running average for the stage's default model to estimate the time
+    it saved, exported as metrics and, when ROUTING_LOG_PATH is set,
+    appended there with its latency, token counts, stripped reasoning
+    tokens and early stops.
+    """
+
+    def __init__(self, tiers: List[str] = ROUTING_TIERS, stage_bias: str = ROUTING_STAGE_BIAS,
+                 log_path: str = ROUTING_LOG_PATH):
+        self.tiers = tiers
+        self.stage_bias = _parse_stage_bias(stage_bias)
+        self._log = JsonlExport(log_path)
+        self._lock = threading.Lock()
+        # (stage, model) -> [decisions, total seconds, completion tokens]
+        self._totals: Dict[Tuple[str, str], List[float]] = {}
+
+    def decide(self, stage: str, query: str, agent) -> RouteDecision:
+        """Pick the model for ``agent``'s LLM on this stage of this query.
+
+        Only a choice: nothing is timed or recorded unless the stage then
+        runs in route_scope and is passed to finish.
+        """
+        default_model = str(getattr(getattr(agent, 'llm', None), 'model', '') or '')
+        level, reasons = query_complexity(query)
+        model = default_model
+        if self.tiers:
+            index = min(max(level + self.stage_bias.get(stage, 0), 0), len(self.tiers) - 1)
+            # Keep the provider prefix the client was configured with, e.g. "ollama/"
+            prefix = default_model.rsplit('/', 1)[0] + '/' if '/' in default_model else ''
+            model = prefix + self.tiers[index]
+        return RouteDecision(stage, query, default_model, model, level, reasons)
+
+    def finish(self, decision: RouteDecision):
+        """Record a stage that ran in route_scope"""
+        if decision.started is None:
+            return
+        seconds = time.perf_counter() - decision.started
+        record = {"time": time.time(), "query": decision.query, "seconds": round(seconds, 3),
+                  **decision.to_dict()}
+        with self._lock:
+            baseline = self._totals.get((decision.stage, decision.default_model))
+            if decision.routed and baseline and baseline[0]:
+                record["estimated_saved_seconds"] = round(baseline[1] / baseline[0] - seconds, 3)
+            totals = self._totals.setdefault((decision.stage, decision.model), [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += decision.completion_tokens
+        self._log.write(record)
+
+        labels = {"stage": decision.stage, "model": decision.model}
+        metrics = tracer.metrics
+        metrics.inc("routing_decisions_total", help="Pipeline stages routed to a model",
+                    complexity=record["complexity"], **labels)
+        metrics.observe("routing_stage_seconds", seconds, help="Stage latency by routed model", **labels)
+        metrics.inc("routing_reasoning_tokens_stripped_total", decision.reasoning_tokens_stripped,
+                    help="Reasoning-trace tokens kept out of agent and downstream prompts", **labels)
+        metrics.inc("routing_early_stops_total", decision.early_stops,
+                    help="Generations stopped once every expected section was written", **labels)
+
+        if decision.routed or decision.reasoning_tokens_stripped or decision.early_stops:
+            saved = record.get("estimated_saved_seconds")
+            event_system.notify_step(
+                thought=f"Routed the {decision.stage} stage",
+                action="Model Routing",
+                input_data=f"{record['complexity']} query ({', '.join(decision.reasons)})",
+                observation=f"{decision.model} in {seconds:.1f}s"
+                            + (f" (~{saved:.1f}s faster than {decision.default_model})" if saved is not None else "")
+                            + f"; {decision.reasoning_tokens_stripped} reasoning tokens stripped, "
+                              f"{decision.early_stops} early stops"
+            )
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per stage and model averages, for benchmark comparisons"""
+        with self._lock:
+            return {
+                f"routing.{stage}.{model}": {
+                    "stages": int(count),
+                    "mean_seconds": round(seconds / count, 4),
+                    "completion_tokens": round(tokens / count, 1),
+                }
+                for (stage, model), (count, seconds, tokens) in self._totals.items()
+            }
+
+
+# Create a shared router instance
+model_router = ModelRouter()
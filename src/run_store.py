@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from tools.page_cache import RESEARCH_CACHE_DIR
+
+# Run store configuration
+RUN_STORE_ENABLED = os.getenv('RUN_STORE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RUN_STORE_DIR = os.getenv('RUN_STORE_DIR', os.path.join(RESEARCH_CACHE_DIR, 'runs'))
+# Checkpoints older than this are ignored and pruned, so stale research is redone; 0 keeps them forever
+RUN_STORE_MAX_AGE = float(os.getenv('RUN_STORE_MAX_AGE', str(7 * 86400)))
+_PRUNE_INTERVAL = 3600
+
+# Pipeline stages in execution order
+STAGES = ("research", "analysis", "fact_check")
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def agent_config(agent) -> Dict[str, Any]:
+    """The parts of an agent's setup that change what a stage produces"""
+    llm = getattr(agent, 'llm', None)
+    return {
+        "role": getattr(agent, 'role', None),
+        "model": getattr(llm, 'model', None),
+        "temperature": getattr(llm, 'temperature', None),
+    }
+
+
+class RunStore:
+    """Durable checkpoints of pipeline stage outputs.
+
+    Each stage is keyed by the query, its own agent configuration and the
+    key of the stage before it. Changing a later stage's settings (say the
+    fact checker's temperature) therefore only invalidates that stage,
+    while the research and analysis checkpoints are reused. Files are
+    written atomically so a crash never leaves a half-written checkpoint.
+    Checkpoints older than ``max_age`` seconds are not loaded, and saving
+    prunes them (at most once an hour) so the store does not grow forever.
+    """
+
+    def __init__(self, root: str = RUN_STORE_DIR, max_age: float = RUN_STORE_MAX_AGE):
+        self.root = root
+        self.max_age = max_age
+        self._pruned_at = 0.0
+
+    def stage_key(self, query: str, stage: str, agent, upstream_key: Optional[str],
+                  variant: Optional[str] = None, prompt: Optional[str] = None) -> str:
+        """``variant`` distinguishes different ways of running the same stage;
+        ``prompt`` is the task the agent is given, so editing a task template
+        invalidates the checkpoints made with the old one"""
+        return _digest({
+            "query": ' '.join(query.split()),
+            "stage": stage,
+            "config": agent_config(agent),
+            "upstream": upstream_key,
+            "variant": variant,
+            "prompt": _digest(prompt) if prompt is not None else None,
+        })
+
+    def _path(self, query: str, stage: str, key: str) -> str:
+        return os.path.join(self.root, _digest(' '.join(query.split())), f"{stage}-{key}.json")
+
+    def load(self, query: str, stage: str, key: str) -> Optional[Dict[str, Any]]:
+        """A completed stage checkpoint, or None"""
+        try:
+            with open(self._path(query, stage, key), encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if self.max_age and time.time() - record.get("created_at", 0) > self.max_age:
+            return None
+        return record
+
+    def save(self, query: str, stage: str, key: str, output: str, citations: List[List[str]], agent=None):
+        """Persist a finished stage"""
+        path = self._path(query, stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {
+            "query": query,
+            "stage": stage,
+            "key": key,
+            "config": agent_config(agent) if agent is not None else None,
+            "output": output,
+            "citations": citations,
+            "created_at": time.time(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(record, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if self.max_age and time.time() - self._pruned_at > _PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired checkpoints, leftover temp files and empty run directories"""
+        self._pruned_at = time.time()
+        if not self.max_age:
+            return 0
+        cutoff = self._pruned_at - self.max_age
+        removed = 0
+        try:
+            run_dirs = os.listdir(self.root)
+        except OSError:
+            return 0
+        for run_dir in run_dirs:
+            run_path = os.path.join(self.root, run_dir)
+            try:
+                names = os.listdir(run_path)
+            except OSError:
+                continue
+            expired = 0
+            for name in names:
+                path = os.path.join(run_path, name)
+                try:
+                    # Files are never modified after the atomic rename, so mtime is the save time
+                    if os.path.getmtime(path) < cutoff:
+                        os.unlink(path)
+                        expired += 1
+                except OSError:
+                    continue
+            if expired == len(names):
+                try:
+                    os.rmdir(run_path)
+                except OSError:
+                    pass
+            removed += expired
+        return removed
+
+
+# Create a shared store instance
+run_store = RunStore()
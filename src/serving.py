@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import List, Optional
+
+from event_system import event_system
+from cancellation import JobCancelled, cancel_scope
+from llm_gateway import workload_scope
+
+# Serving configuration
+RESEARCH_WORKERS = int(os.getenv('RESEARCH_WORKERS', '2'))
+RESEARCH_QUEUE_SIZE = int(os.getenv('RESEARCH_QUEUE_SIZE', '8'))
+# Assumed job duration until real jobs have completed
+RESEARCH_ETA_SECONDS = float(os.getenv('RESEARCH_ETA_SECONDS', '300'))
+
+
+class QueueFull(Exception):
+    """Raised when the admission queue cannot take another job"""
+
+
+class ResearchJob:
+    """One research request and its lifecycle"""
+
+    def __init__(self, query: str, session_id: str, rerun_from: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.query = query
+        self.rerun_from = rerun_from
+        self.session_id = session_id
+        self.status = "queued"  # queued, running, done, failed or cancelled
+        self.error: Optional[BaseException] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.done = threading.Event()
+
+    def _finish(self, status: str, error: Optional[BaseException] = None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        self.done.set()
+
+
+class ResearchServer:
+    """Runs research jobs on a fixed pool of workers behind a bounded queue.
+
+    Each worker owns its own set of agents, since crewai agents are not safe
+    to share between concurrent crews; the browser tool, page cache and LLM
+    cache are shared. Every job runs in its own event session, so
+    concurrent users never see each other's steps or citations.
+    """
+
+    def __init__(self, workers: int = RESEARCH_WORKERS, queue_size: int = RESEARCH_QUEUE_SIZE):
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self._pending: deque = deque()
+        self._running: List[ResearchJob] = []
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._avg_duration = RESEARCH_ETA_SECONDS
+
+    def submit(self, query: str, session_id: str, rerun_from: Optional[str] = None) -> ResearchJob:
+        """Admit a job or raise QueueFull"""
+        self._start()
+        job = ResearchJob(query, session_id, rerun_from)
+        with self._cond:
+            idle = self.workers - len(self._running)
+            if len(self._pending) >= idle + self.queue_size:
+                raise QueueFull(f"{len(self._pending)} research jobs are already waiting")
+            self._pending.append(job)
+            self._cond.notify()
+        return job
+
+    def position(self, job: ResearchJob) -> int:
+        """1-based place in the queue, or 0 once the job has started"""
+        with self._cond:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def eta(self, job: ResearchJob) -> float:
+        """Rough seconds until the job starts"""
+        position = self.position(job)
+        if position == 0:
+            return 0.0
+        with self._cond:
+            idle = self.workers - len(self._running)
+        if position <= idle:
+            return 0.0
+        # Each round of `workers` jobs ahead of us takes about one average job
+        return ((position - idle - 1) // self.workers + 1) * self._avg_duration
+
+    def cancel(self, job: ResearchJob):
+        """Cancel a queued job immediately, or ask a running one to stop"""
+        job.cancel_event.set()
+        with self._cond:
+            if job in self._pending:
+                self._pending.remove(job)
+                job._finish("cancelled")
+
+    def _start(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"research-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker_loop(self):
+        from agents import build_agents
+        from pipeline import ResearchPipeline
+
+        pipeline = None
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                job = self._pending.popleft()
+                self._running.append(job)
+
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                if pipeline is None:
+                    # Built on the first job so spawning workers stays cheap, then
+                    # reused for every job this worker runs
+                    pipeline = ResearchPipeline(build_agents())
+                with event_system.session(job.session_id), cancel_scope(job.cancel_event), \
+                        workload_scope("interactive"):
+                    pipeline.run(job.query, rerun_from=job.rerun_from)
+                job._finish("done")
+            except JobCancelled as e:
+                job._finish("cancelled", e)
+            except Exception as e:
+                job._finish("failed", e)
+            finally:
+                with self._cond:
+                    self._running.remove(job)
+                    # finished_at is unset if a BaseException (e.g. SystemExit) skipped _finish
+                    duration = (job.finished_at or time.time()) - job.started_at
+                    # Exponential moving average keeps the ETA responsive to recent jobs
+                    self._avg_duration = 0.7 * self._avg_duration + 0.3 * duration
+
+
+# Create a shared server instance
+research_server = ResearchServer()
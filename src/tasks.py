@@ -1,10 +1,10 @@
 ﻿from crewai import Task
 from event_system import event_system
 
-# Import the agents defined in agents.py
-from agents import web_research_specialist, content_analyzer, fact_checker
+# Default agents are looked up on use, so importing tasks builds nothing
+import agents as default_agents
 
-def get_research_task(query: str) -> Task:
+def get_research_task(query: str, agent=None) -> Task:
     """Create a research task for the web research specialist"""
     event_system.notify_step(
         thought="Creating research task",
@@ -25,11 +25,11 @@ def get_research_task(query: str) -> Task:
         - Statistics and data
         - Expert opinions
         - Source citations""",
-        agent=web_research_specialist,
+        agent=agent or default_agents.web_research_specialist,
         context=None  # Remove context for initial task
     )
 
-def get_analysis_task(research_results: str) -> Task:
+def get_analysis_task(research_results: str, agent=None) -> Task:
     """Create an analysis task for the content analyzer"""
     event_system.notify_step(
         thought="Creating analysis task",
@@ -39,22 +39,27 @@ def get_analysis_task(research_results: str) -> Task:
     )
     
     return Task(
-        description="""Analyze the research findings and:
+        description=f"""Analyze the research findings below and:
         1. Identify main themes and patterns
         2. Extract key insights
         3. Organize information logically
         4. Highlight significant findings
-        5. Note areas needing further research""",
+        5. Note areas needing further research
+
+        Work from these findings; only browse for gaps they leave open.
+
+        Research findings:
+        {research_results}""",
         expected_output="""Comprehensive analysis including:
         - Main themes identified
         - Key insights extracted
         - Logical organization of findings
         - Areas for further research""",
-        agent=content_analyzer,
-        context=None  # Remove context, will be passed through crew execution
+        agent=agent or default_agents.content_analyzer,
+        context=None  # Upstream output is in the description, so checkpointed stages need no crew
     )
 
-def get_fact_checking_task(analysis_results: str) -> Task:
+def get_fact_checking_task(analysis_results: str, agent=None, sources=None) -> Task:
     """Create a fact checking task for the fact checker"""
     event_system.notify_step(
         thought="Creating fact checking task",
@@ -63,18 +68,25 @@ def get_fact_checking_task(analysis_results: str) -> Task:
         observation="Initializing fact checking task"
     )
     
+    source_list = "\n".join(f"        - {url}" for url in sources) if sources else "        (none cited)"
     return Task(
-        description="""Verify the analyzed information:
+        description=f"""Verify the analyzed information below:
         1. Check accuracy of facts and statistics
         2. Verify source credibility
         3. Cross-reference key claims
         4. Identify potential biases
-        5. Flag any questionable information""",
+        5. Flag any questionable information
+
+        Analysis to verify:
+        {analysis_results}
+
+        Sources cited by the research:
+{source_list}""",
         expected_output="""Verification report including:
         - Confirmed facts and statistics
         - Source credibility assessment
         - Cross-reference results
         - Identified biases or concerns""",
-        agent=fact_checker,
-        context=None  # Remove context, will be passed through crew execution
+        agent=agent or default_agents.fact_checker,
+        context=None  # Upstream output is in the description, so checkpointed stages need no crew
     )
\ No newline at end of file
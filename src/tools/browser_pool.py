@@ -0,0 +1,238 @@
+import atexit
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+from urllib.parse import urlsplit
+
+from tracing import tracer
+
+# Pool configuration
+BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))
+BROWSER_MAX_NAVIGATIONS = int(os.getenv('BROWSER_MAX_NAVIGATIONS', '100'))
+BROWSER_MAX_RSS_MB = int(os.getenv('BROWSER_MAX_RSS_MB', '0'))  # 0 disables the memory check
+BROWSER_JOB_TIMEOUT = float(os.getenv('BROWSER_JOB_TIMEOUT', '60'))
+
+# Request interception: only text matters, so skip everything that does not carry it.
+# Scripts and XHR stay allowed because pages reach the browser precisely when they
+# need JavaScript to render their content.
+BROWSER_BLOCK_RESOURCE_TYPES = frozenset(filter(None, os.getenv(
+    'BROWSER_BLOCK_RESOURCE_TYPES', 'image,media,font,stylesheet,texttrack,manifest,other'
+).lower().split(',')))
+_TRACKER_HOSTS = (
+    'doubleclick.net', 'googlesyndication.com', 'googleadservices.com', 'google-analytics.com',
+    'googletagmanager.com', 'googletagservices.com', 'adservice.google.com', 'connect.facebook.net',
+    'amazon-adsystem.com', 'adnxs.com', 'criteo.com', 'criteo.net', 'taboola.com', 'outbrain.com',
+    'scorecardresearch.com', 'quantserve.com', 'chartbeat.com', 'moatads.com', 'pubmatic.com',
+    'rubiconproject.com', 'casalemedia.com', 'openx.net', 'hotjar.com', 'clarity.ms',
+    'bat.bing.com', 'cdn.segment.com', 'mixpanel.com', 'nr-data.net', 'optimizely.com',
+)
+BROWSER_BLOCK_TRACKERS = os.getenv('BROWSER_BLOCK_TRACKERS', 'true').lower() in ('1', 'true', 'yes')
+# Comma-separated extra hosts to block, and hosts that are never blocked (subdomains included)
+BROWSER_BLOCK_HOSTS = frozenset(
+    (_TRACKER_HOSTS if BROWSER_BLOCK_TRACKERS else ())
+    + tuple(filter(None, os.getenv('BROWSER_BLOCK_HOSTS', '').lower().split(',')))
+)
+BROWSER_ALLOW_HOSTS = frozenset(filter(None, os.getenv('BROWSER_ALLOW_HOSTS', '').lower().split(',')))
+
+
+def _host_matches(host: str, domains: frozenset) -> bool:
+    """Whether ``host`` is one of ``domains`` or a subdomain of one"""
+    labels = host.split('.')
+    return any('.'.join(labels[i:]) in domains for i in range(len(labels)))
+
+
+def block_reason(resource_type: str, url: str, is_main_document: bool = False) -> Optional[str]:
+    """Why the browser should not download a request, or None to let it through"""
+    if is_main_document:
+        return None
+    host = urlsplit(url).hostname or ''
+    if _host_matches(host, BROWSER_ALLOW_HOSTS):
+        return None
+    if _host_matches(host, BROWSER_BLOCK_HOSTS):
+        return "tracker"
+    if resource_type in BROWSER_BLOCK_RESOURCE_TYPES:
+        return resource_type
+    return None
+
+
+def _route_request(route):
+    """Playwright route handler that aborts blocked requests"""
+    request = route.request
+    reason = block_reason(request.resource_type, request.url,
+                          request.is_navigation_request() and request.frame.parent_frame is None)
+    if reason is None:
+        route.continue_()
+        return
+    tracer.metrics.inc("browser_blocked_requests_total",
+                       help="Browser subrequests aborted by request interception", reason=reason)
+    route.abort('blockedbyclient')
+
+
+def _descendant_rss_mb() -> Optional[float]:
+    """Resident memory of every process spawned by this one (Linux only)"""
+    try:
+        children = {}
+        for pid in os.listdir('/proc'):
+            if not pid.isdigit():
+                continue
+            with open(f'/proc/{pid}/stat') as f:
+                stat = f.read()
+            # The command name may contain spaces, so split after its closing paren
+            fields = stat[stat.rindex(')') + 2:].split()
+            children.setdefault(int(fields[1]), []).append(int(pid))
+
+        page_size = os.sysconf('SC_PAGE_SIZE')
+        total = 0
+        pending = list(children.get(os.getpid(), []))
+        while pending:
+            pid = pending.pop()
+            pending.extend(children.get(pid, []))
+            try:
+                with open(f'/proc/{pid}/statm') as f:
+                    total += int(f.read().split()[1]) * page_size
+            except OSError:
+                continue
+        return total / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+class _BrowserWorker(threading.Thread):
+    """Owns one warm Chromium process.
+
+    Playwright's sync API is bound to the thread that started it, so every
+    browser, context and page is created and used on this thread only.
+    """
+
+    def __init__(self, pool: 'BrowserPool', index: int):
+        super().__init__(name=f"browser-worker-{index}", daemon=True)
+        self.pool = pool
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._navigations = 0
+
+    def run(self):
+        from playwright.sync_api import sync_playwright
+
+        self._playwright = sync_playwright().start()
+        try:
+            while True:
+                job = self.pool._jobs.get()
+                if job is None:
+                    break
+                context, fn, future = job
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    # Run in the submitter's context so its session and trace span carry over
+                    future.set_result(context.run(self._execute, fn))
+                except BaseException as e:
+                    future.set_exception(e)
+        finally:
+            self._close_browser()
+            self._playwright.stop()
+
+    def _execute(self, fn: Callable[[Any], Any]) -> Any:
+        """Run a job against a fresh page in the worker's warm context"""
+        self._ensure_browser()
+        page = self._context.new_page()
+        try:
+            return fn(page)
+        finally:
+            self._navigations += 1
+            try:
+                page.close()
+                self._context.clear_cookies()
+            except Exception:
+                # The browser died underneath us; the health check relaunches it
+                pass
+
+    def _ensure_browser(self):
+        """Launch, health-check and recycle the browser as needed"""
+        if self._browser is not None and self._needs_recycle():
+            self._close_browser()
+        if self._browser is None:
+            with tracer.span("browser.launch", worker=self.name):
+                self._browser = self._playwright.chromium.launch(headless=True)
+                self._context = self._browser.new_context()
+                if BROWSER_BLOCK_RESOURCE_TYPES or BROWSER_BLOCK_HOSTS:
+                    self._context.route('**/*', _route_request)
+            self._navigations = 0
+
+    def _needs_recycle(self) -> bool:
+        if not self._browser.is_connected():
+            return True
+        if BROWSER_MAX_NAVIGATIONS and self._navigations >= BROWSER_MAX_NAVIGATIONS:
+            return True
+        if BROWSER_MAX_RSS_MB:
+            rss = _descendant_rss_mb()
+            if rss is not None and rss > BROWSER_MAX_RSS_MB:
+                return True
+        return False
+
+    def _close_browser(self):
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+        self._browser = None
+        self._context = None
+
+
+class BrowserPool:
+    """Long-lived pool of warm headless Chromium workers.
+
+    Callers hand the pool a function that receives a Playwright page; the
+    function runs on one of the worker threads and its return value (or
+    exception) is handed back to the caller. Pages are always closed after
+    the job, including on the error path.
+    """
+
+    def __init__(self, size: int = BROWSER_POOL_SIZE):
+        self.size = max(1, size)
+        self._jobs: queue.Queue = queue.Queue()
+        self._workers: List[_BrowserWorker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Browser pool has been shut down")
+            if not self._workers:
+                self._workers = [_BrowserWorker(self, i) for i in range(self.size)]
+                for worker in self._workers:
+                    worker.start()
+                atexit.register(self.close)
+
+    def submit(self, fn: Callable[[Any], Any]) -> Future:
+        """Queue a page job and return a future for its result"""
+        self._start()
+        future: Future = Future()
+        self._jobs.put((contextvars.copy_context(), fn, future))
+        return future
+
+    def run(self, fn: Callable[[Any], Any], timeout: Optional[float] = BROWSER_JOB_TIMEOUT) -> Any:
+        """Run a page job on a pooled browser and wait for its result"""
+        return self.submit(fn).result(timeout=timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Stop all workers and their browsers"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            worker.join(timeout=timeout)
+
+
+# Create a shared pool instance
+browser_pool = BrowserPool()
@@ -1,24 +1,96 @@
-import asyncio
+import contextvars
 import os
+import threading
+from contextlib import contextmanager
 from crewai.tools import BaseTool
-from browser_use import Agent as BrowserAgent
-from langchain_community.llms import Ollama
 from dotenv import load_dotenv
 from event_system import event_system
-from typing import Any, Dict, Optional
-from playwright.sync_api import sync_playwright
-from bs4 import BeautifulSoup
+from cancellation import check_cancelled
+from tracing import tracer
+from tools.browser_pool import BROWSER_POOL_SIZE
+from tools.fetcher import inflight_fetches, page_fetcher
+from tools.page_cache import PAGE_CACHE_ENABLED, normalize_url, page_cache
+from tools.extraction import extract_text
+from tools.memory_index import MEMORY_ENABLED, research_memory
+from tools.ranking import RANK_TOKEN_BUDGET, estimate_tokens, format_passages, select_passages
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import re
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Batch fetch configuration
+BROWSER_BATCH_CONCURRENCY = int(os.getenv('BROWSER_BATCH_CONCURRENCY', str(BROWSER_POOL_SIZE)))
+BROWSER_URL_TIMEOUT = float(os.getenv('BROWSER_URL_TIMEOUT', '30'))
+
+URL_PATTERN = re.compile(r'https?://[^\s<>"]+|www\.[^\s<>"]+')
+
+# Pages already read during the current pipeline run
+_session_pages: contextvars.ContextVar = contextvars.ContextVar('session_pages', default=None)
+
+
+def cited_urls(text: str) -> List[str]:
+    """URLs mentioned in a piece of text, in first-seen order"""
+    return list(dict.fromkeys(url.rstrip('.,;:)]\'') for url in URL_PATTERN.findall(text)))
+
+
+class SessionPages:
+    """Extracted pages shared by every stage of one pipeline run.
+
+    Downstream agents often browse the same sources the research agent
+    already read; those calls are answered from here without touching the
+    page cache, network or browser. Pages fetched ahead of time by the
+    pipeline's prefetcher are tracked separately from ones an agent read.
+    """
+
+    def __init__(self):
+        self._pages: Dict[str, Dict[str, Any]] = {}
+        self._origins: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.stats = {"fetched": 0, "prefetched": 0, "reused": 0, "prefetch_hits": 0}
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        key = normalize_url(url)
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self.stats["reused" if self._origins[key] == "tool" else "prefetch_hits"] += 1
+            return page
+
+    def put(self, url: str, page: Dict[str, Any], origin: str = "tool"):
+        key = normalize_url(url)
+        with self._lock:
+            if key not in self._pages:
+                self._pages[key] = page
+                self._origins[key] = origin
+                self.stats["fetched" if origin == "tool" else "prefetched"] += 1
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return normalize_url(url) in self._pages
+
+
+@contextmanager
+def session_pages_scope():
+    """Share pages read in this context between all of a run's stages"""
+    pages = SessionPages()
+    token = _session_pages.set(pages)
+    try:
+        yield pages
+    finally:
+        _session_pages.reset(token)
+
 class BrowserTool(BaseTool):
     name: str = "Browser"
-    description: str = "Browse websites and extract information"
+    description: str = (
+        "Browse websites and extract information. "
+        "Include one or more URLs; several URLs are fetched concurrently."
+    )
 
     def _run(self, task_description: str) -> str:
         """Run the browser tool with the given task description"""
+        check_cancelled()
         event_system.notify_step(
             thought="Starting browser task",
             action="Browser Navigation",
@@ -26,80 +98,205 @@ class BrowserTool(BaseTool):
             observation="Initializing browser"
         )
 
+        # Extract every URL from the task description, keeping first-seen order
+        urls = cited_urls(task_description)
+        if not urls:
+            error_msg = "No URL found in task description"
+            event_system.notify_step(
+                thought="Task failed",
+                action="URL Extraction",
+                input_data=task_description,
+                observation=error_msg
+            )
+            return error_msg
+
+        with tracer.span("browser_tool.run", urls=len(urls)):
+            if len(urls) == 1:
+                return self._rank(self._fetch_url(urls[0]), task_description, RANK_TOKEN_BUDGET)["text"]
+
+            return self._fetch_batch(urls, task_description)
+
+    def _fetch_batch(self, urls: List[str], task_description: str) -> str:
+        """Fetch several URLs concurrently and combine the source-labelled results"""
+        event_system.notify_step(
+            thought=f"Fetching {len(urls)} pages concurrently",
+            action="Batch Page Load",
+            input_data="\n".join(urls),
+            observation=f"Up to {BROWSER_BATCH_CONCURRENCY} pages in flight"
+        )
+
+        with ThreadPoolExecutor(max_workers=max(1, min(BROWSER_BATCH_CONCURRENCY, len(urls)))) as executor:
+            # Each worker runs in a copy of our context so events stay in the caller's session
+            futures = [executor.submit(contextvars.copy_context().run, self._fetch_url, url) for url in urls]
+            results = [future.result() for future in futures]
+
+        # Share the token budget between the pages
+        budget = max(RANK_TOKEN_BUDGET // len(urls), 1)
+        results = [self._rank(result, task_description, budget) for result in results]
+
+        succeeded = sum(1 for result in results if result["ok"])
+        event_system.notify_step(
+            thought="Completed batch browser task",
+            action="Batch Content Extraction",
+            input_data="\n".join(urls),
+            observation=f"Fetched {succeeded} of {len(urls)} pages"
+        )
+
+        sections = []
+        for index, result in enumerate(results, start=1):
+            header = f"=== Source {index}: {result['title'] or result['url']} ===\nURL: {result['url']}"
+            sections.append(f"{header}\n{result['text']}")
+        return "\n\n".join(sections)
+
+    def _fetch_url(self, url: str, origin: str = "tool") -> Dict[str, Any]:
+        """Fetch and extract a single URL, never raising.
+
+        ``origin`` is "prefetch" when the pipeline reads a page ahead of the
+        agents that will cite it.
+        """
+        pages: Optional[SessionPages] = _session_pages.get()
+        if pages is not None:
+            page = pages.get(url)
+            if page is not None:
+                event_system.notify_step(
+                    thought="Page already read in this run",
+                    action="Session Reuse",
+                    input_data=url,
+                    observation=f"Reused {len(page['text'])} characters without another browser call"
+                )
+                event_system.notify_citation(title=page["title"], url=url, content=page["text"])
+                return page
+
+        result = self._fetch_url_uncached(url)
+        if pages is not None and result["ok"]:
+            pages.put(url, result, origin)
+        return result
+
+    def _fetch_url_uncached(self, url: str) -> Dict[str, Any]:
         try:
-            with sync_playwright() as p:
-                # Launch browser
-                browser = p.chromium.launch(headless=True)
-                context = browser.new_context()
-                page = context.new_page()
-
-                # Extract URL from task description
-                url_match = re.search(r'https?://[^\s<>"]+|www\.[^\s<>"]+', task_description)
-                if url_match:
-                    url = url_match.group()
-                    
-                    event_system.notify_step(
-                        thought=f"Navigating to {url}",
-                        action="Page Load",
-                        input_data=url,
-                        observation="Loading webpage"
-                    )
-
-                    # Navigate to the page
-                    page.goto(url)
-                    page.wait_for_load_state('networkidle')
-
-                    # Get page content
-                    content = page.content()
-                    soup = BeautifulSoup(content, 'html.parser')
-
-                    # Remove script and style elements
-                    for script in soup(["script", "style"]):
-                        script.decompose()
-
-                    # Extract text
-                    text = soup.get_text()
-                    lines = (line.strip() for line in text.splitlines())
-                    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                    text = ' '.join(chunk for chunk in chunks if chunk)
-
-                    # Close browser
-                    browser.close()
-
-                    # Add citation
-                    event_system.notify_citation(
-                        source=page.title(),
-                        url=url,
-                        content=text[:500] + "..."  # First 500 chars as preview
-                    )
-
-                    event_system.notify_step(
-                        thought="Completed browser task",
-                        action="Content Extraction",
-                        input_data=url,
-                        observation=f"Successfully extracted {len(text)} characters of content"
-                    )
-
-                    return text
-                else:
-                    error_msg = "No URL found in task description"
-                    event_system.notify_step(
-                        thought="Task failed",
-                        action="URL Extraction",
-                        input_data=task_description,
-                        observation=error_msg
-                    )
-                    return error_msg
+            event_system.notify_step(
+                thought=f"Navigating to {url}",
+                action="Page Load",
+                input_data=url,
+                observation="Loading webpage"
+            )
+
+            with tracer.span("page_cache.lookup", url=url):
+                cached = page_cache.get(url) if PAGE_CACHE_ENABLED else None
+            if cached and cached["fresh"]:
+                return self._serve_cached(url, cached, "hits")
+
+            # Concurrent requests for the same page, from any session or batch
+            # query, share a single download
+            page, shared = inflight_fetches.do(normalize_url(url), lambda: self._download(url, cached))
+            if page.get("not_modified"):
+                # A follower may not have looked at the cache entry the leader revalidated
+                cached = cached or page_cache.get(url)
+                if cached:
+                    return self._serve_cached(url, cached, "revalidated")
+                # The entry was evicted since it was revalidated, so fetch the page in full
+                page = self._download(url, None)
+            title, text = page["title"], page["text"]
+
+            if shared:
+                event_system.notify_step(
+                    thought="Joined an in-flight fetch of the same page",
+                    action="Shared Fetch",
+                    input_data=url,
+                    observation="Reused the result of a concurrent download"
+                )
+
+            # Add citation; the citation index fingerprints the text and keeps a preview
+            event_system.notify_citation(title=title, url=url, content=text)
+
+            event_system.notify_step(
+                thought="Completed browser task",
+                action="Content Extraction",
+                input_data=url,
+                observation=f"Successfully extracted {len(text)} characters of content "
+                            f"(served by {page['tier']} tier, "
+                            f"{page_fetcher.hit_ratio():.0%} of pages served without a browser)"
+            )
+
+            return {"url": url, "title": title, "text": text, "ok": True, "tier": page["tier"]}
 
         except Exception as e:
+            if isinstance(e, FutureTimeoutError):
+                e = f"timed out after {BROWSER_URL_TIMEOUT:g}s"
             error_msg = f"Error during browser task: {str(e)}"
             event_system.notify_step(
                 thought="Task failed",
                 action="Browser Error",
-                input_data=task_description,
+                input_data=url,
                 observation=error_msg
             )
-            return error_msg
+            return {"url": url, "title": None, "text": error_msg, "ok": False, "tier": None}
+
+    def _download(self, url: str, cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Fetch, extract and cache a page"""
+        # Plain HTTP first, warm pooled browser only when the page needs JavaScript.
+        # Stale entries are revalidated with their ETag/Last-Modified.
+        page = page_fetcher.fetch(url, BROWSER_URL_TIMEOUT, validators=cached)
+        if page.get("not_modified"):
+            page_cache.touch(url)
+            return page
+
+        title, content = page["title"], page["html"]
+        with tracer.span("page.extract", url=url, html_chars=len(content)) as span:
+            text = extract_text(content)
+            span.set(text_chars=len(text))
+
+        if PAGE_CACHE_ENABLED:
+            page_cache.put(url, title, content, text,
+                           etag=page.get("etag"), last_modified=page.get("last_modified"))
+            page_cache.record("misses")
+            self._notify_cache_stats(url)
+
+        if MEMORY_ENABLED:
+            # Later sessions can answer from this page without fetching it again
+            with tracer.span("memory.add", url=url) as span:
+                span.set(chunks=research_memory.add(url, title, text))
+
+        return {"title": title, "text": text, "tier": page["tier"]}
+
+    @staticmethod
+    def _rank(result: Dict[str, Any], task_description: str, token_budget: int) -> Dict[str, Any]:
+        """Keep only the passages most relevant to the task within the token budget"""
+        if not result["ok"]:
+            return result
+        with tracer.span("passage.rank", url=result["url"]):
+            passages = select_passages(result["text"], task_description, token_budget)
+        if not passages:
+            return result
+        ranked = format_passages(passages)
+        if len(passages) > 1 or passages[0]["score"] is not None:
+            event_system.notify_step(
+                thought="Ranked page passages against the task",
+                action="Passage Ranking",
+                input_data=result["url"],
+                observation=f"Kept {len(passages)} passages: ~{estimate_tokens(ranked)} of "
+                            f"~{estimate_tokens(result['text'])} tokens"
+            )
+        return {**result, "text": ranked}
+
+    def _serve_cached(self, url: str, cached: Dict[str, Any], outcome: str) -> Dict[str, Any]:
+        """Answer from the page cache without touching the network or browser"""
+        page_cache.record(outcome, bytes_saved=cached["html_size"])
+        self._notify_cache_stats(url)
+
+        event_system.notify_citation(title=cached["title"], url=url, content=cached["text"])
+        return {"url": url, "title": cached["title"], "text": cached["text"], "ok": True, "tier": "cache"}
+
+    @staticmethod
+    def _notify_cache_stats(url: str):
+        stats = page_cache.stats
+        event_system.notify_step(
+            thought="Checked page cache",
+            action="Page Cache",
+            input_data=url,
+            observation=f"hits={stats['hits']} revalidated={stats['revalidated']} "
+                        f"misses={stats['misses']} bytes_saved={stats['bytes_saved']}"
+        )
 
 # # --- Optional: Example Usage for Testing ---
 # # Uncomment the block below to test the tool directly.
@@ -0,0 +1,190 @@
+import os
+import re
+from html.parser import HTMLParser
+from typing import List, Optional
+
+try:
+    from lxml import etree
+except ImportError:  # lxml ships with requirements.txt; the stdlib parser is an equivalent but far slower fallback
+    etree = None
+
+# Extraction configuration
+EXTRACT_MAX_CHARS = int(os.getenv('EXTRACT_MAX_CHARS', '100000'))
+EXTRACT_FEED_SIZE = 64 * 1024
+
+# Subtrees that never hold readable content; their text is dropped unseen
+SKIP_TAGS = frozenset({
+    'script', 'style', 'noscript', 'template', 'svg', 'canvas', 'iframe', 'object',
+    'nav', 'header', 'footer', 'aside', 'form', 'button', 'select', 'textarea', 'head',
+})
+BLOCK_TAGS = frozenset({
+    'p', 'div', 'section', 'article', 'main', 'li', 'ul', 'ol', 'dl', 'dt', 'dd',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'blockquote', 'table', 'tr', 'td', 'th',
+    'figcaption', 'br', 'hr', 'body',
+})
+VOID_TAGS = frozenset({
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr',
+})
+MAIN_TAGS = frozenset({'main', 'article'})
+
+# Matched against whole id/class tokens, or their dash/underscore-separated parts
+_BOILERPLATE_RE = re.compile(
+    r'(?:^|[-_])(?:cookies?|consent|banner|sidebar|comments?|advert\w*|ads?|promo|share|'
+    r'social|newsletter|subscribe|related|breadcrumbs?|menu|popup|modal)(?:[-_]|$)',
+    re.IGNORECASE
+)
+
+
+class _StopParsing(Exception):
+    """Raised once the character budget has been collected"""
+
+
+class _TextCollector:
+    """Parser target that turns start/end/data events into text blocks.
+
+    Boilerplate subtrees are skipped by depth counting, so their text is
+    never buffered. Each finished block remembers whether it sat inside a
+    <main>/<article> element and how much of it was link text, which is
+    all the main-content detection needs.
+    """
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.blocks: List[tuple] = []  # (text, in_main, link_chars)
+        self.main_chars = 0
+        self.total_chars = 0
+        self._stack: List[tuple] = []  # (tag, skipped, is_main, is_link)
+        self._skip = 0
+        self._main = 0
+        self._link = 0
+        self._buffer: List[str] = []
+        self._buffer_link_chars = 0
+
+    def start(self, tag: str, attrs):
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        is_main = tag in MAIN_TAGS
+        skipped = tag in SKIP_TAGS or (
+            not is_main and tag not in ('html', 'body') and self._is_boilerplate(attrs)
+        )
+        is_link = tag == 'a'
+        self._skip += skipped
+        self._main += is_main
+        self._link += is_link
+        self._stack.append((tag, skipped, is_main, is_link))
+
+    def end(self, tag: str):
+        tag = tag.lower()
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in VOID_TAGS:
+            return
+        # Tolerate unbalanced markup by closing up to the matching open tag
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                for _, skipped, is_main, is_link in self._stack[i:]:
+                    self._skip -= skipped
+                    self._main -= is_main
+                    self._link -= is_link
+                del self._stack[i:]
+                break
+
+    def data(self, data: str):
+        if self._skip:
+            return
+        self._buffer.append(data)
+        if self._link:
+            self._buffer_link_chars += len(data)
+
+    def close(self):
+        self._flush()
+
+    def comment(self, text):
+        pass
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        text = ' '.join(''.join(self._buffer).split())
+        self._buffer = []
+        link_chars, self._buffer_link_chars = self._buffer_link_chars, 0
+        if not text:
+            return
+        in_main = self._main > 0
+        self.blocks.append((text, in_main, link_chars))
+        self.total_chars += len(text)
+        if in_main:
+            self.main_chars += len(text)
+        # Stop once the main content fills the budget, or the page as a whole
+        # is far past it with no main content in sight
+        if self.main_chars >= self.max_chars or self.total_chars >= self.max_chars * 3:
+            raise _StopParsing()
+
+    @staticmethod
+    def _is_boilerplate(attrs) -> bool:
+        if not attrs:
+            return False
+        items = attrs.items() if hasattr(attrs, 'items') else attrs
+        for name, value in items:
+            if value and name in ('id', 'class', 'role'):
+                if any(_BOILERPLATE_RE.search(token) for token in value.split()):
+                    return True
+        return False
+
+
+class _StdlibParser(HTMLParser):
+    """Adapts the stdlib event parser to the collector's target interface"""
+
+    def __init__(self, target: _TextCollector):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+def _select_main_content(blocks: List[tuple]) -> List[str]:
+    """Keep <main>/<article> blocks if present, otherwise drop link-heavy blocks"""
+    main = [text for text, in_main, _ in blocks if in_main]
+    if sum(len(text) for text in main) >= 200:
+        return main
+    return [
+        text for text, _, link_chars in blocks
+        if link_chars / len(text) < 0.5 or len(text) >= 200
+    ]
+
+
+def extract_text(html: str, max_chars: Optional[int] = None) -> str:
+    """Extract the readable main content of a page as plain text.
+
+    The HTML is fed to an event parser in chunks, so boilerplate subtrees
+    are never materialized and parsing stops as soon as ``max_chars`` of
+    content has been collected. Blocks are separated by newlines.
+    """
+    max_chars = max_chars or EXTRACT_MAX_CHARS
+    collector = _TextCollector(max_chars)
+    if etree is not None:
+        parser = etree.HTMLParser(target=collector, remove_comments=True)
+    else:
+        parser = _StdlibParser(collector)
+
+    try:
+        for offset in range(0, len(html), EXTRACT_FEED_SIZE):
+            parser.feed(html[offset:offset + EXTRACT_FEED_SIZE])
+        parser.close()
+        collector.close()
+    except _StopParsing:
+        pass
+
+    text = '\n'.join(_select_main_content(collector.blocks))
+    return text[:max_chars]
@@ -0,0 +1,231 @@
+import html as html_lib
+import os
+import re
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from tools.browser_pool import browser_pool
+from tools.politeness import (POLITENESS_ENABLED, THROTTLE_STATUSES, HostThrottled, RobotsDisallowed,
+                              politeness)
+from tracing import tracer
+
+# Fetch configuration
+FETCH_HTTP_FIRST = os.getenv('FETCH_HTTP_FIRST', 'true').lower() in ('1', 'true', 'yes')
+FETCH_MIN_TEXT_CHARS = int(os.getenv('FETCH_MIN_TEXT_CHARS', '500'))
+FETCH_USER_AGENT = os.getenv(
+    'FETCH_USER_AGENT',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+)
+# One of domcontentloaded, load, networkidle or selector:<css selector>
+BROWSER_WAIT_UNTIL = os.getenv('BROWSER_WAIT_UNTIL', 'domcontentloaded')
+BROWSER_WAIT_DEADLINE = float(os.getenv('BROWSER_WAIT_DEADLINE', '10'))
+
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+_INVISIBLE_RE = re.compile(r'<(script|style|noscript|template)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_NOSCRIPT_RE = re.compile(r'<noscript\b[^>]*>(.*?)</noscript\s*>', re.IGNORECASE | re.DOTALL)
+_JS_WALL_RE = re.compile(r'(enable|requires?|turn on)\s+javascript', re.IGNORECASE)
+_SPA_ROOT_RE = re.compile(
+    r'<(div|main)\s[^>]*id=["\'](root|app|__next|__nuxt|svelte)["\'][^>]*>\s*</\1>',
+    re.IGNORECASE
+)
+
+
+def extract_title(content: str) -> str:
+    """Pull the document title out of raw HTML"""
+    match = _TITLE_RE.search(content)
+    return html_lib.unescape(match.group(1)).strip() if match else ""
+
+
+def needs_javascript(content: str) -> bool:
+    """Guess whether a server-rendered page is missing content that JavaScript would add"""
+    if _SPA_ROOT_RE.search(content):
+        return True
+    if any(_JS_WALL_RE.search(block) for block in _NOSCRIPT_RE.findall(content)):
+        return True
+    visible = _TAG_RE.sub(' ', _INVISIBLE_RE.sub(' ', content))
+    visible_chars = len(''.join(visible.split()))
+    return visible_chars < FETCH_MIN_TEXT_CHARS
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run ``fn`` unless a call for ``key`` is already in flight.
+
+        Returns the result and whether it was shared from another caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+class TieredFetcher:
+    """Fetch pages over plain HTTP first and fall back to a headless browser.
+
+    The HTTP tier uses one pooled keep-alive client shared by all threads.
+    Pages that look like they need JavaScript (almost no text, a noscript
+    wall or an SPA shell) are escalated to the browser pool. Every result
+    records the tier that served it so the hit ratio can be checked.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+        self.stats = {"http": 0, "browser": 0, "escalated": 0}
+
+    @property
+    def client(self):
+        """Shared keep-alive HTTP client, created on first use"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import httpx
+
+                    self._client = httpx.Client(
+                        follow_redirects=True,
+                        headers={"User-Agent": FETCH_USER_AGENT},
+                        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+                    )
+        return self._client
+
+    def fetch(self, url: str, timeout: float, validators: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Fetch a URL, returning its title, HTML and serving tier.
+
+        ``validators`` may carry a cached ``etag``/``last_modified``; if the
+        server confirms the cached copy is current the result has
+        ``not_modified`` set and no HTML.
+        """
+        if not re.match(r'https?://', url):
+            url = f"https://{url}"
+        if POLITENESS_ENABLED and not politeness.allowed(url, self._fetch_robots):
+            raise RobotsDisallowed(f"robots.txt of {url.split('/')[2]} disallows fetching {url}")
+
+        if FETCH_HTTP_FIRST or validators:
+            result = self._polite(url, lambda: self._traced_http(url, timeout, validators))
+            if result is not None:
+                self._count("http")
+                return result
+            self._count("escalated")
+
+        title, content = self._polite(url, lambda: self._traced_browser(url, timeout))
+        self._count("browser")
+        return {"url": url, "title": title, "html": content, "tier": "browser"}
+
+    def hit_ratio(self) -> float:
+        """Share of pages served without a browser"""
+        total = self.stats["http"] + self.stats["browser"]
+        return self.stats["http"] / total if total else 0.0
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _polite(url: str, attempt: Callable[[], Any]) -> Any:
+        """Run a request under the host's politeness limits, retrying after 429/503"""
+        if not POLITENESS_ENABLED:
+            return attempt()
+        return politeness.run(url, attempt)
+
+    def _traced_http(self, url: str, timeout: float, validators: Optional[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+        with tracer.span("fetch.http", url=url) as span:
+            result = self._fetch_http(url, timeout, validators)
+            span.set(escalated=result is None)
+        return result
+
+    def _traced_browser(self, url: str, timeout: float) -> Tuple[str, str]:
+        with tracer.span("fetch.browser", url=url):
+            return browser_pool.run(
+                lambda page: self._load_page(page, url, timeout),
+                timeout=timeout + 5  # A little slack over the in-page deadline
+            )
+
+    def _fetch_robots(self, robots_url: str) -> Optional[str]:
+        """robots.txt text, or None when the site has none"""
+        with tracer.span("fetch.robots", url=robots_url):
+            response = self.client.get(robots_url, timeout=10)
+        return response.text if response.status_code == 200 else None
+
+    def _fetch_http(self, url: str, timeout: float,
+                    validators: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """Try the plain HTTP tier; None means the page should be escalated"""
+        headers = {}
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        try:
+            response = self.client.get(url, timeout=timeout, headers=headers)
+        except Exception:
+            return None
+        if response.status_code in THROTTLE_STATUSES:
+            raise HostThrottled(url, response.status_code, response.headers.get('retry-after'))
+        if response.status_code == 304 and validators:
+            return {"url": url, "title": None, "html": None, "tier": "http", "not_modified": True}
+        if response.status_code != 200:
+            return None
+        content_type = response.headers.get('content-type', '')
+        if 'html' not in content_type and 'text/plain' not in content_type:
+            return None
+        content = response.text
+        if 'html' in content_type and needs_javascript(content):
+            return None
+        return {
+            "url": url,
+            "title": extract_title(content),
+            "html": content,
+            "tier": "http",
+            "etag": response.headers.get('etag'),
+            "last_modified": response.headers.get('last-modified'),
+        }
+
+    @staticmethod
+    def _load_page(page, url: str, timeout: float):
+        """Navigate a pooled page with the configured wait strategy"""
+        page.set_default_timeout(timeout * 1000)
+        with tracer.span("browser.navigate", url=url):
+            response = page.goto(url, wait_until='domcontentloaded')
+        if response is not None and response.status in THROTTLE_STATUSES:
+            raise HostThrottled(url, response.status, response.headers.get('retry-after'))
+
+        deadline = min(BROWSER_WAIT_DEADLINE, timeout) * 1000
+        with tracer.span("browser.load_wait", strategy=BROWSER_WAIT_UNTIL) as span:
+            try:
+                if BROWSER_WAIT_UNTIL.startswith('selector:'):
+                    page.wait_for_selector(BROWSER_WAIT_UNTIL[len('selector:'):], timeout=deadline)
+                elif BROWSER_WAIT_UNTIL != 'domcontentloaded':
+                    page.wait_for_load_state(BROWSER_WAIT_UNTIL, timeout=deadline)
+            except Exception:
+                # Deadline reached; use whatever has rendered so far
+                span.set(deadline_reached=True)
+        return page.title(), page.content()
+
+
+# Create shared fetcher instances
+page_fetcher = TieredFetcher()
+inflight_fetches = SingleFlight()
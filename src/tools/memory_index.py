@@ -0,0 +1,316 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from tools.page_cache import RESEARCH_CACHE_DIR, normalize_url
+from tools.ranking import chunk_text, tokenize
+
+# Research memory configuration
+MEMORY_ENABLED = os.getenv('MEMORY_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+MEMORY_DIR = os.getenv('MEMORY_DIR', os.path.join(RESEARCH_CACHE_DIR, 'memory'))
+MEMORY_DIM = int(os.getenv('MEMORY_DIM', '1024'))  # power of two; 2 bytes per dimension per chunk
+MEMORY_MAX_CHUNKS = int(os.getenv('MEMORY_MAX_CHUNKS', '100000'))
+MEMORY_TOP_K = int(os.getenv('MEMORY_TOP_K', '5'))
+MEMORY_MIN_SCORE = float(os.getenv('MEMORY_MIN_SCORE', '0.15'))
+MEMORY_MAX_AGE = float(os.getenv('MEMORY_MAX_AGE', str(30 * 86400)))  # older passages are not returned
+MEMORY_PER_SOURCE = 2  # passages returned from any one page
+
+# Rows scored per step, so a search never materializes the whole matrix as float32
+_SEARCH_BLOCK_BYTES = 16 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    title TEXT,
+    sha TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_key ON chunks (key);
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    sha TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    bucket INTEGER PRIMARY KEY,
+    df INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class ResearchMemory:
+    """Persistent retrieval index over every page the browser tool has read.
+
+    Pages are split into the same passages the ranker uses. Each passage is
+    a signed hashed TF vector (``dim`` buckets, L2-normalized) stored as a
+    float16 row of a flat file that is memory-mapped for search and only
+    ever appended to; passage text, source URL and fetch time live in
+    SQLite next to per-bucket document frequencies. Queries are weighted by
+    IDF and scored against every row in fixed-size blocks, so search is one
+    pass of matrix-vector products with no index to rebuild.
+
+    Re-reading an unchanged page only refreshes its fetch time; a changed
+    page appends new rows and retires the old ones. Once the file passes
+    ``max_chunks`` rows it is compacted into a new generation holding the
+    newest live passages. Appends run inside a SQLite write transaction,
+    which also serializes writers in other processes.
+    """
+
+    def __init__(self, directory: str = MEMORY_DIR, dim: int = MEMORY_DIM, max_chunks: int = MEMORY_MAX_CHUNKS):
+        if dim & (dim - 1):
+            raise ValueError("MEMORY_DIM must be a power of two")
+        self.directory = directory
+        self.dim = dim
+        self.max_chunks = max(1, max_chunks)
+        self.stats = {"pages_added": 0, "pages_unchanged": 0, "chunks_added": 0, "searches": 0, "hits": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._mapped: Optional[Tuple[int, int, np.ndarray]] = None  # generation, rows, matrix
+        self._idf: Optional[Tuple[int, np.ndarray]] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; sqlite3 connections must not cross threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, 'memory.sqlite3'), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            conn.execute('INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)', ('dim', self.dim))
+            conn.execute('INSERT OR IGNORE INTO meta (name, value) VALUES (?, ?)', ('generation', 0))
+            stored = conn.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()[0]
+            if stored != self.dim:
+                raise ValueError(f"Research memory in {self.directory} was built with MEMORY_DIM={stored}")
+            self._local.conn = conn
+        return conn
+
+    def add(self, url: str, title: Optional[str], text: str) -> int:
+        """Index a page's extracted text; returns the number of passages added"""
+        if not text.strip():
+            return 0
+        key = normalize_url(url)
+        sha = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        now = time.time()
+        conn = self._conn
+
+        row = conn.execute('SELECT sha FROM pages WHERE key = ?', (key,)).fetchone()
+        if row is not None and row[0] == sha:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('UPDATE pages SET fetched_at = ? WHERE key = ?', (now, key))
+                conn.execute('UPDATE chunks SET fetched_at = ? WHERE key = ? AND sha = ?', (now, key, sha))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            self._count("pages_unchanged")
+            return 0
+
+        passages = chunk_text(text)
+        vectors, buckets = zip(*(self._vectorize(passage["text"]) for passage in passages))
+        matrix = np.vstack(vectors).astype(np.float16)
+        df = Counter(bucket for chunk_buckets in buckets for bucket in chunk_buckets)
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            generation, rows = self._generation_and_rows(conn)
+            self._append(generation, rows, matrix)
+            conn.executemany(
+                'INSERT INTO chunks (id, key, url, title, sha, start, text, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(rows + i, key, url, title, sha, passage["start"], passage["text"], now)
+                 for i, passage in enumerate(passages)]
+            )
+            conn.executemany(
+                'INSERT INTO buckets (bucket, df) VALUES (?, ?) ON CONFLICT (bucket) DO UPDATE SET df = df + excluded.df',
+                df.items()
+            )
+            conn.execute('INSERT OR REPLACE INTO pages (key, sha, fetched_at) VALUES (?, ?, ?)', (key, sha, now))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._count("pages_added")
+        self._count("chunks_added", len(passages))
+        if rows + len(passages) > self.max_chunks:
+            self.compact()
+        return len(passages)
+
+    def search(self, query: str, k: int = MEMORY_TOP_K, min_score: float = MEMORY_MIN_SCORE,
+               max_age: float = MEMORY_MAX_AGE) -> List[Dict[str, Any]]:
+        """Top passages for ``query``, best first, from pages that are still current"""
+        self._count("searches")
+        vector, _ = self._vectorize(query)
+        if not vector.any():
+            return []
+        generation, matrix = self._matrix()
+        rows = matrix.shape[0]
+        if not rows:
+            return []
+
+        # IDF-weight the query; stored rows stay plain TF so appends never touch them
+        weighted = vector * self._idf_weights(rows) ** 2
+        weighted /= np.linalg.norm(weighted)
+        scores = np.empty(rows, dtype=np.float32)
+        block = max(1, _SEARCH_BLOCK_BYTES // (self.dim * 4))
+        for start in range(0, rows, block):
+            scores[start:start + block] = matrix[start:start + block].astype(np.float32) @ weighted
+
+        # Over-fetch so retired and stale passages can be filtered out
+        candidates = min(rows, k * 4 + MEMORY_PER_SOURCE * k)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = [int(i) for i in top[np.argsort(-scores[top])] if scores[i] >= min_score]
+        if not top:
+            return []
+
+        placeholders = ','.join('?' * len(top))
+        found = {
+            row[0]: row for row in self._conn.execute(
+                f'SELECT c.id, c.url, c.title, c.start, c.text, c.fetched_at FROM chunks c '
+                f'JOIN pages p ON p.key = c.key AND p.sha = c.sha '
+                f'WHERE c.id IN ({placeholders}) AND c.fetched_at >= ?',
+                (*top, time.time() - max_age)
+            )
+        }
+        if self._generation_and_rows(self._conn)[0] != generation:
+            return []  # Compacted while we searched; row ids no longer line up
+
+        results, per_source = [], Counter()
+        for chunk_id in top:
+            row = found.get(chunk_id)
+            if row is None or per_source[row[1]] >= MEMORY_PER_SOURCE:
+                continue
+            per_source[row[1]] += 1
+            results.append({"url": row[1], "title": row[2], "start": row[3], "text": row[4],
+                            "fetched_at": row[5], "score": float(scores[chunk_id])})
+            if len(results) >= k:
+                break
+        if results:
+            self._count("hits")
+        return results
+
+    def compact(self):
+        """Rewrite the index with only the newest current passages"""
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            generation, rows = self._generation_and_rows(conn)
+            live = [row[0] for row in conn.execute(
+                'SELECT c.id FROM chunks c JOIN pages p ON p.key = c.key AND p.sha = c.sha ORDER BY c.id'
+            )]
+            # Leave headroom so we don't compact again on the next few pages
+            keep = live[-int(self.max_chunks * 0.9):] if len(live) > self.max_chunks * 0.9 else live
+            old = self._open(generation, rows)
+            with open(self._path(generation + 1), 'wb') as f:
+                block = max(1, _SEARCH_BLOCK_BYTES // (self.dim * 2))
+                for start in range(0, len(keep), block):
+                    f.write(np.ascontiguousarray(old[keep[start:start + block]]).tobytes())
+
+            conn.execute('CREATE TEMP TABLE IF NOT EXISTS keep_ids (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)')
+            conn.execute('DELETE FROM keep_ids')
+            conn.executemany('INSERT INTO keep_ids (old, new) VALUES (?, ?)',
+                             [(old_id, new_id) for new_id, old_id in enumerate(keep)])
+            conn.execute('DELETE FROM chunks WHERE id NOT IN (SELECT old FROM keep_ids)')
+            # Renumber through negative ids so no update collides with a row not yet moved
+            conn.execute('UPDATE chunks SET id = -1 - (SELECT new FROM keep_ids WHERE old = chunks.id)')
+            conn.execute('UPDATE chunks SET id = -1 - id')
+            conn.execute('DELETE FROM pages WHERE key NOT IN (SELECT key FROM chunks)')
+
+            df: Counter = Counter()
+            for (text,) in conn.execute('SELECT text FROM chunks'):
+                df.update(self._vectorize(text)[1])
+            conn.execute('DELETE FROM buckets')
+            conn.executemany('INSERT INTO buckets (bucket, df) VALUES (?, ?)', df.items())
+            conn.execute("UPDATE meta SET value = ? WHERE name = 'generation'", (generation + 1,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        # Searches that already mapped the old file keep reading it until they finish
+        for name in os.listdir(self.directory):
+            if name.startswith('vectors-') and name != os.path.basename(self._path(generation + 1)):
+                os.remove(os.path.join(self.directory, name))
+
+    def __len__(self) -> int:
+        return self._generation_and_rows(self._conn)[1]
+
+    def _vectorize(self, text: str) -> Tuple[np.ndarray, Set[int]]:
+        """Signed hashed TF vector of a text and the buckets it touches"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        buckets = set()
+        for term, count in Counter(tokenize(text)).items():
+            digest = zlib.crc32(term.encode('utf-8'))
+            bucket = digest & (self.dim - 1)
+            vector[bucket] += (1 + math.log(count)) * (1 if digest & 0x80000000 else -1)
+            buckets.add(bucket)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector, buckets
+
+    def _idf_weights(self, rows: int) -> np.ndarray:
+        with self._lock:
+            if self._idf is not None and self._idf[0] == rows:
+                return self._idf[1]
+        df = np.zeros(self.dim, dtype=np.float32)
+        for bucket, count in self._conn.execute('SELECT bucket, df FROM buckets'):
+            df[bucket] = count
+        idf = np.log((1 + rows) / (1 + df)) + 1
+        with self._lock:
+            self._idf = (rows, idf)
+        return idf
+
+    def _matrix(self) -> Tuple[int, np.ndarray]:
+        """Memory map of the committed rows, remapped when the index has grown"""
+        generation, rows = self._generation_and_rows(self._conn)
+        with self._lock:
+            if self._mapped is None or self._mapped[:2] != (generation, rows):
+                self._mapped = (generation, rows, self._open(generation, rows))
+            return generation, self._mapped[2]
+
+    def _open(self, generation: int, rows: int) -> np.ndarray:
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float16)
+        return np.memmap(self._path(generation), dtype=np.float16, mode='r', shape=(rows, self.dim))
+
+    def _append(self, generation: int, rows: int, matrix: np.ndarray):
+        """Write rows after the last committed one, dropping any left by a failed append"""
+        path = self._path(generation)
+        with open(path, 'ab') as f:
+            f.truncate(rows * self.dim * 2)
+            f.write(matrix.tobytes())
+
+    def _path(self, generation: int) -> str:
+        return os.path.join(self.directory, f'vectors-{generation}.f16')
+
+    @staticmethod
+    def _generation_and_rows(conn: sqlite3.Connection) -> Tuple[int, int]:
+        generation = conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+        last = conn.execute('SELECT max(id) FROM chunks').fetchone()[0]
+        return generation, 0 if last is None else last + 1
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+
+
+# Create a shared memory instance
+research_memory = ResearchMemory()
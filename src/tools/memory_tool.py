@@ -0,0 +1,57 @@
+import time
+
+from crewai.tools import BaseTool
+from event_system import event_system
+from cancellation import check_cancelled
+from tracing import tracer
+from tools.memory_index import research_memory
+
+
+class ResearchMemoryTool(BaseTool):
+    name: str = "Research Memory"
+    description: str = (
+        "Search pages already read in earlier research before browsing. "
+        "Input: what you are looking for. Returns matching passages with their source URL and "
+        "when they were fetched; use the Browser only for what it does not cover."
+    )
+
+    def _run(self, query: str) -> str:
+        """Look the query up in the local research memory"""
+        check_cancelled()
+        with tracer.span("memory.search") as span:
+            results = research_memory.search(query)
+            span.set(results=len(results))
+
+        if not results:
+            event_system.notify_step(
+                thought="Searched research memory",
+                action="Research Memory",
+                input_data=query,
+                observation="No stored passages matched; browsing is needed"
+            )
+            return "No relevant passages in research memory. Use the Browser tool to find sources."
+
+        sources = list(dict.fromkeys(result["url"] for result in results))
+        event_system.notify_step(
+            thought="Searched research memory",
+            action="Research Memory",
+            input_data=query,
+            observation=f"Found {len(results)} passages from {len(sources)} previously read pages "
+                        f"({research_memory.stats['hits']} of {research_memory.stats['searches']} "
+                        f"searches answered from memory)"
+        )
+
+        sections = []
+        for index, result in enumerate(results, start=1):
+            event_system.notify_citation(
+                title=result["title"],
+                url=result["url"],
+                content=result["text"]
+            )
+            fetched = time.strftime('%Y-%m-%d', time.localtime(result["fetched_at"]))
+            sections.append(
+                f"=== Memory {index}: {result['title'] or result['url']} ===\n"
+                f"URL: {result['url']}\nFetched: {fetched} (relevance {result['score']:.2f})\n"
+                f"[chars {result['start']}-{result['start'] + len(result['text'])}] {result['text']}"
+            )
+        return "\n\n".join(sections)
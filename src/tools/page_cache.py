@@ -0,0 +1,196 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Cache configuration
+# Every cache, store and log lives under this directory. Other modules import
+# it from here; the default is anchored to the project root, not the cwd.
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESEARCH_CACHE_DIR = os.getenv('RESEARCH_CACHE_DIR', os.path.join(_PROJECT_ROOT, '.research_cache'))
+PAGE_CACHE_ENABLED = os.getenv('PAGE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PAGE_CACHE_PATH = os.getenv('PAGE_CACHE_PATH', os.path.join(RESEARCH_CACHE_DIR, 'pages.sqlite3'))
+PAGE_CACHE_TTL = float(os.getenv('PAGE_CACHE_TTL', '86400'))
+PAGE_CACHE_MAX_MB = float(os.getenv('PAGE_CACHE_MAX_MB', '512'))
+# Comma-separated domain=seconds overrides, e.g. "news.ycombinator.com=300,wikipedia.org=604800"
+PAGE_CACHE_DOMAIN_TTLS = os.getenv('PAGE_CACHE_DOMAIN_TTLS', '')
+
+_TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    title TEXT,
+    html_sha TEXT NOT NULL,
+    text TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    html_size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at);
+"""
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a URL used as the cache key"""
+    if '://' not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and not ((scheme == 'http' and parts.port == 80) or (scheme == 'https' and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(_TRACKING_PARAMS)
+    )
+    return urlunsplit((scheme, host, parts.path or '/', urlencode(query), ''))
+
+
+def _parse_domain_ttls(spec: str) -> Dict[str, float]:
+    ttls = {}
+    for item in spec.split(','):
+        if '=' in item:
+            domain, seconds = item.split('=', 1)
+            ttls[domain.strip().lower()] = float(seconds)
+    return ttls
+
+
+class PageCache:
+    """Persistent cache of fetched pages shared by every process on the box.
+
+    Entries are keyed by normalized URL and keep the extracted text next to
+    the raw HTML, which is stored compressed and content-addressed so
+    identical pages served under several URLs are kept once. SQLite in WAL
+    mode handles locking between processes; the least recently used pages
+    are evicted once the cache grows past PAGE_CACHE_MAX_MB.
+    """
+
+    def __init__(self, path: str = PAGE_CACHE_PATH, max_bytes: int = int(PAGE_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.domain_ttls = _parse_domain_ttls(PAGE_CACHE_DOMAIN_TTLS)
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "bytes_saved": 0}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection; sqlite3 connections must not cross threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def ttl_for(self, url: str) -> float:
+        """TTL for a URL, using the most specific matching domain override"""
+        host = (urlsplit(normalize_url(url)).hostname or '')
+        labels = host.split('.')
+        for i in range(len(labels)):
+            ttl = self.domain_ttls.get('.'.join(labels[i:]))
+            if ttl is not None:
+                return ttl
+        return PAGE_CACHE_TTL
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Look up a page; the result carries a ``fresh`` flag based on its TTL"""
+        key = normalize_url(url)
+        row = self._conn.execute(
+            'SELECT url, title, text, etag, last_modified, fetched_at, html_size FROM pages WHERE key = ?',
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self._conn.execute('UPDATE pages SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        return {
+            "url": row[0],
+            "title": row[1],
+            "text": row[2],
+            "etag": row[3],
+            "last_modified": row[4],
+            "fetched_at": row[5],
+            "html_size": row[6],
+            "fresh": time.time() - row[5] < self.ttl_for(url),
+        }
+
+    def get_html(self, url: str) -> Optional[str]:
+        """Raw HTML for a cached page"""
+        row = self._conn.execute(
+            'SELECT b.data FROM pages p JOIN blobs b ON b.sha = p.html_sha WHERE p.key = ?',
+            (normalize_url(url),)
+        ).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def put(self, url: str, title: str, html: str, text: str,
+            etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """Store a freshly fetched page and evict old entries if over the size cap"""
+        raw = html.encode('utf-8')
+        sha = hashlib.sha256(raw).hexdigest()
+        data = zlib.compress(raw, 6)
+        now = time.time()
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT OR IGNORE INTO blobs (sha, data) VALUES (?, ?)', (sha, data))
+            conn.execute(
+                'INSERT OR REPLACE INTO pages '
+                '(key, url, title, html_sha, text, etag, last_modified, html_size, fetched_at, accessed_at, size) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (normalize_url(url), url, title, sha, text, etag, last_modified, len(raw), now, now,
+                 len(data) + len(text.encode('utf-8')))
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def touch(self, url: str):
+        """Mark a stale page as fresh again after a successful revalidation"""
+        now = time.time()
+        self._conn.execute(
+            'UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE key = ?',
+            (now, now, normalize_url(url))
+        )
+
+    def record(self, outcome: str, bytes_saved: int = 0):
+        """Count a hit, miss or revalidation"""
+        with self._lock:
+            self.stats[outcome] += 1
+            self.stats["bytes_saved"] += bytes_saved
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used pages until the cache fits its cap"""
+        total = conn.execute('SELECT coalesce(sum(size), 0) FROM pages').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict down to 90% so we don't pay for eviction on every insert
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        for key, size in conn.execute('SELECT key, size FROM pages ORDER BY accessed_at').fetchall():
+            if freed >= target:
+                break
+            conn.execute('DELETE FROM pages WHERE key = ?', (key,))
+            freed += size
+        conn.execute('DELETE FROM blobs WHERE sha NOT IN (SELECT html_sha FROM pages)')
+
+
+# Create a shared cache instance
+page_cache = PageCache()
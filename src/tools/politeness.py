@@ -0,0 +1,241 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Optional
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+from event_system import event_system
+from cancellation import check_cancelled
+from tracing import tracer
+
+# Politeness configuration
+POLITENESS_ENABLED = os.getenv('POLITENESS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Sustained requests per second to one host, and how many may be sent back to back
+POLITENESS_HOST_RATE = float(os.getenv('POLITENESS_HOST_RATE', '2'))
+POLITENESS_HOST_BURST = int(os.getenv('POLITENESS_HOST_BURST', '4'))
+POLITENESS_HOST_CONNECTIONS = int(os.getenv('POLITENESS_HOST_CONNECTIONS', '2'))
+POLITENESS_MAX_RETRIES = int(os.getenv('POLITENESS_MAX_RETRIES', '2'))
+POLITENESS_BACKOFF_BASE = float(os.getenv('POLITENESS_BACKOFF_BASE', '2'))
+POLITENESS_BACKOFF_MAX = float(os.getenv('POLITENESS_BACKOFF_MAX', '60'))
+ROBOTS_ENABLED = os.getenv('ROBOTS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ROBOTS_CACHE_TTL = float(os.getenv('ROBOTS_CACHE_TTL', '86400'))
+ROBOTS_USER_AGENT = os.getenv('ROBOTS_USER_AGENT', '*')
+_MAX_HOSTS = 1024
+
+THROTTLE_STATUSES = (429, 503)
+
+
+class RobotsDisallowed(Exception):
+    """Raised when a site's robots.txt forbids fetching a URL"""
+
+
+class HostThrottled(Exception):
+    """Raised when a host answers 429 or 503"""
+
+    def __init__(self, url: str, status: int, retry_after: Optional[str] = None):
+        super().__init__(f"{host_of(url)} answered HTTP {status}")
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+
+def host_of(url: str) -> str:
+    parts = urlsplit(url if '://' in url else f"https://{url}")
+    return (parts.netloc or '').lower()
+
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given as seconds or an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class _HostState:
+    __slots__ = ('tokens', 'refilled', 'active', 'blocked_until', 'failures', 'crawl_delay',
+                 'robots', 'robots_fetched', 'robots_lock')
+
+    def __init__(self, burst: int):
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.active = 0
+        self.blocked_until = 0.0
+        self.failures = 0
+        self.crawl_delay = 0.0
+        self.robots: Optional[RobotFileParser] = None
+        self.robots_fetched = 0.0
+        self.robots_lock = threading.Lock()
+
+
+class PolitenessScheduler:
+    """Per-host admission control shared by every fetch in the process.
+
+    Each host gets a token bucket (``rate`` requests per second with bursts
+    of ``burst``, slowed further by a robots.txt Crawl-delay), a cap on
+    concurrent connections, and a backoff window that opens when the host
+    answers 429 or 503 (honouring Retry-After, otherwise exponential with
+    jitter). robots.txt is fetched once per host and cached for
+    ROBOTS_CACHE_TTL; hosts without one are unrestricted.
+    """
+
+    def __init__(self, rate: float = POLITENESS_HOST_RATE, burst: int = POLITENESS_HOST_BURST,
+                 connections: int = POLITENESS_HOST_CONNECTIONS, max_hosts: int = _MAX_HOSTS):
+        self.rate = max(rate, 0.01)
+        self.burst = max(1, burst)
+        self.connections = max(1, connections)
+        self.max_hosts = max_hosts
+        self._hosts: 'OrderedDict[str, _HostState]' = OrderedDict()
+        self._cond = threading.Condition()
+        self.stats = {"requests": 0, "delayed": 0, "wait_seconds": 0.0, "throttled": 0, "disallowed": 0}
+
+    @contextmanager
+    def slot(self, url: str):
+        """Hold one of the host's connections for the enclosed request"""
+        host = host_of(url)
+        waited = self._acquire(host)
+        try:
+            yield waited
+        finally:
+            with self._cond:
+                self._state(host).active -= 1
+                self._cond.notify_all()
+
+    def run(self, url: str, attempt: Callable[[], Any], retries: int = POLITENESS_MAX_RETRIES) -> Any:
+        """Call ``attempt`` while holding a slot for the URL's host.
+
+        If it raises HostThrottled the host is backed off and the call is
+        retried, up to ``retries`` times.
+        """
+        for tries in range(retries + 1):
+            try:
+                with self.slot(url):
+                    result = attempt()
+            except HostThrottled as e:
+                delay = self.throttled(url, e.retry_after)
+                if tries == retries:
+                    raise
+                event_system.notify_step(
+                    thought="Host asked us to slow down",
+                    action="Fetch Backoff",
+                    input_data=url,
+                    observation=f"{e}; retrying in {delay:.1f}s (attempt {tries + 2} of {retries + 1})"
+                )
+                continue
+            self.succeeded(url)
+            return result
+
+    def throttled(self, url: str, retry_after: Optional[str] = None) -> float:
+        """Record a 429/503 from the host; returns how long it will be left alone"""
+        host = host_of(url)
+        with self._cond:
+            state = self._state(host)
+            state.failures += 1
+            delay = retry_after_seconds(retry_after)
+            if delay is None:
+                delay = POLITENESS_BACKOFF_BASE * 2 ** (state.failures - 1) * random.uniform(0.5, 1.0)
+            delay = min(delay, POLITENESS_BACKOFF_MAX)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+            self.stats["throttled"] += 1
+        # Not labelled by host: every site ever fetched would become its own series
+        tracer.metrics.inc("fetch_throttled_total", help="Responses asking us to slow down")
+        return delay
+
+    def succeeded(self, url: str):
+        """Reset the host's backoff after a normal response"""
+        with self._cond:
+            self._state(host_of(url)).failures = 0
+
+    def allowed(self, url: str, fetch_robots: Callable[[str], Optional[str]]) -> bool:
+        """Check robots.txt, fetching it with ``fetch_robots(robots_url)`` when not cached.
+
+        ``fetch_robots`` returns the file's text, or None when the site has none.
+        """
+        if not ROBOTS_ENABLED:
+            return True
+        parts = urlsplit(url if '://' in url else f"https://{url}")
+        host = parts.netloc.lower()
+        with self._cond:
+            state = self._state(host)
+        with state.robots_lock:
+            if state.robots is None or time.time() - state.robots_fetched > ROBOTS_CACHE_TTL:
+                parser = RobotFileParser()
+                try:
+                    # robots.txt is a request to the host like any other, so it
+                    # takes a connection and a token from the host's budget
+                    with self.slot(url):
+                        text = fetch_robots(f"{parts.scheme}://{parts.netloc}/robots.txt")
+                except Exception:
+                    text = None  # Unreachable robots.txt: treat the site as unrestricted
+                parser.parse((text or '').splitlines())
+                with self._cond:
+                    state.robots = parser
+                    state.robots_fetched = time.time()
+                    state.crawl_delay = float(parser.crawl_delay(ROBOTS_USER_AGENT) or 0)
+            allowed = state.robots.can_fetch(ROBOTS_USER_AGENT, url)
+        if not allowed:
+            with self._cond:
+                self.stats["disallowed"] += 1
+        return allowed
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.burst)
+            while len(self._hosts) > self.max_hosts:
+                # Only forget hosts with nothing in flight
+                idle = next((key for key, other in self._hosts.items() if not other.active), None)
+                if idle is None or idle == host:
+                    break
+                del self._hosts[idle]
+        else:
+            self._hosts.move_to_end(host)
+        return state
+
+    def _acquire(self, host: str) -> float:
+        start = time.perf_counter()
+        with self._cond:
+            self.stats["requests"] += 1
+            while True:
+                state = self._state(host)
+                now = time.monotonic()
+                rate = min(self.rate, 1 / state.crawl_delay) if state.crawl_delay else self.rate
+                state.tokens = min(self.burst, state.tokens + (now - state.refilled) * rate)
+                state.refilled = now
+
+                if now < state.blocked_until:
+                    delay = state.blocked_until - now
+                elif state.active >= self.connections:
+                    delay = 0.5  # Woken early when a connection is released
+                elif state.tokens < 1:
+                    delay = (1 - state.tokens) / rate
+                else:
+                    state.tokens -= 1
+                    state.active += 1
+                    break
+                # Wake at least every half second so a cancelled job stops waiting
+                self._cond.wait(timeout=min(delay, 0.5))
+                check_cancelled()
+
+            waited = time.perf_counter() - start
+            if waited > 0.001:
+                self.stats["delayed"] += 1
+                self.stats["wait_seconds"] += waited
+        if waited > 0.001:
+            tracer.metrics.observe("fetch_politeness_wait_seconds", waited,
+                                   help="Time fetches waited for their host's rate limit")
+        return waited
+
+
+# Create a shared scheduler instance
+politeness = PolitenessScheduler()
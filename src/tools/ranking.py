@@ -0,0 +1,130 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List
+
+# Ranking configuration
+RANK_CHUNK_CHARS = int(os.getenv('RANK_CHUNK_CHARS', '1200'))
+RANK_CHUNK_OVERLAP = int(os.getenv('RANK_CHUNK_OVERLAP', '200'))
+RANK_TOKEN_BUDGET = int(os.getenv('RANK_TOKEN_BUDGET', '1500'))
+CHARS_PER_TOKEN = 4  # Rough average for English text with local tokenizers
+
+_WORD_RE = re.compile(r'\w+')
+_URL_RE = re.compile(r'https?://\S+|www\.\S+')
+_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its of on or that the this to was
+were will with what which who how why when where about into than then there these those
+go find get look search page site website browse information
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in _STOPWORDS and len(w) > 1]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def chunk_text(text: str, size: int = RANK_CHUNK_CHARS, overlap: int = RANK_CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    """Split text into overlapping passages, breaking on whitespace where possible"""
+    passages = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            space = text.rfind(' ', start + size // 2, end)
+            if space != -1:
+                end = space
+        passages.append({"start": start, "end": end, "text": text[start:end]})
+        if end >= length:
+            break
+        next_start = max(end - overlap, start + 1)
+        # Start the next passage on a word boundary too
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return passages
+
+
+def bm25_scores(passages: List[Dict[str, Any]], query: str, k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """Okapi BM25 score of each passage against the query"""
+    query_terms = set(tokenize(query))
+    if not query_terms:
+        return [0.0] * len(passages)
+
+    docs = [Counter(tokenize(p["text"])) for p in passages]
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    doc_freq = Counter(term for d in docs for term in query_terms if term in d)
+    n = len(docs)
+
+    scores = []
+    for d in docs:
+        doc_len = sum(d.values())
+        score = 0.0
+        for term in query_terms:
+            tf = d.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * doc_len / avg_len))
+        scores.append(score)
+    return scores
+
+
+def select_passages(text: str, query: str, token_budget: int = RANK_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """Most relevant passages of ``text`` for ``query`` that fit the token budget.
+
+    Passages come back in document order with their character offsets;
+    overlapping picks are merged into one span. Pages that already fit the
+    budget are returned whole. Passages shrink to fit small budgets, and
+    the best one is truncated rather than dropped when nothing fits, so
+    non-empty text always yields at least one passage.
+    """
+    if estimate_tokens(text) <= token_budget:
+        return [{"start": 0, "end": len(text), "text": text, "score": None}]
+
+    # A passage must fit the budget on its own (estimate_tokens adds one)
+    max_chars = max((token_budget - 1) * CHARS_PER_TOKEN, 1)
+    size = min(RANK_CHUNK_CHARS, max_chars)
+    passages = chunk_text(text, size, min(RANK_CHUNK_OVERLAP, size // 6))
+    scores = bm25_scores(passages, _URL_RE.sub(' ', query))
+    # Without any query signal, fall back to the lead of the page
+    order = sorted(range(len(passages)), key=lambda i: (-scores[i], i))
+
+    chosen = []
+    used = 0
+    for i in order:
+        cost = estimate_tokens(passages[i]["text"])
+        if used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+
+    if not chosen:
+        best = passages[order[0]]
+        end = best["start"] + max_chars
+        if end < best["end"]:
+            space = text.rfind(' ', best["start"] + max_chars // 2, end)
+            end = space if space != -1 else end
+        return [{"start": best["start"], "end": end, "text": text[best["start"]:end], "score": scores[order[0]]}]
+
+    spans: List[Dict[str, Any]] = []
+    for i in sorted(chosen):
+        passage = passages[i]
+        if spans and passage["start"] <= spans[-1]["end"]:
+            spans[-1]["end"] = max(spans[-1]["end"], passage["end"])
+            spans[-1]["score"] = max(spans[-1]["score"], scores[i])
+        else:
+            spans.append({"start": passage["start"], "end": passage["end"], "score": scores[i]})
+    for span in spans:
+        span["text"] = text[span["start"]:span["end"]]
+    return spans
+
+
+def format_passages(passages: List[Dict[str, Any]]) -> str:
+    """Render passages with offsets so citations can point at the exact span"""
+    if len(passages) == 1 and passages[0]["score"] is None:
+        return passages[0]["text"]
+    return "\n\n".join(f"[chars {p['start']}-{p['end']}] {p['text']}" for p in passages)
@@ -0,0 +1,311 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from event_system import event_system
+
+# Tracing configuration
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# JSONL span export is opt-in: set a file path to enable it
+TRACE_PATH = os.getenv('TRACE_PATH', '')
+# Exported files rotate to <path>.1 past this size, so at most twice it is kept on disk
+TRACE_MAX_MB = float(os.getenv('TRACE_MAX_MB', '64'))
+TRACE_MAX_SPANS = int(os.getenv('TRACE_MAX_SPANS', '2000'))  # kept in memory per session
+TRACE_MAX_SESSIONS = int(os.getenv('TRACE_MAX_SESSIONS', '256'))
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # 0 disables the /metrics endpoint
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')  # 0.0.0.0 exposes it beyond this machine
+
+# Histogram buckets, in the unit of the metric
+LATENCY_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+# Span enclosing code run in the current context, used as the parent of new spans
+_current_span: contextvars.ContextVar = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    """One timed operation within a research run"""
+
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'session_id',
+                 'start', 'end', 'attributes', '_start_perf', '_tracer')
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.session_id = event_system.current_session()
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self._start_perf = time.perf_counter()
+        self._tracer = tracer
+
+    @property
+    def duration(self) -> float:
+        return self.attributes.get('duration', time.perf_counter() - self._start_perf)
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def finish(self, **attributes: Any):
+        if self.end is not None:
+            return
+        self.attributes.update(attributes)
+        self.attributes['duration'] = time.perf_counter() - self._start_perf
+        self.end = time.time()
+        self._tracer._record(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "session_id": self.session_id,
+            "start": self.start,
+            "end": self.end,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for a span while tracing is disabled"""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any):
+        pass
+
+    def finish(self, **attributes: Any):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters, gauges and histograms rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple, float]] = defaultdict(lambda: defaultdict(float))
+        self._gauges: Dict[str, Dict[Tuple, float]] = defaultdict(dict)
+        self._histograms: Dict[str, Dict[Tuple, Histogram]] = defaultdict(dict)
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels: str):
+        with self._lock:
+            self._help.setdefault(name, help)
+            self._counters[name][tuple(sorted(labels.items()))] += value
+
+    def set(self, name: str, value: float, help: str = "", **labels: str):
+        with self._lock:
+            self._help.setdefault(name, help)
+            self._gauges[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS,
+                help: str = "", **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._help.setdefault(name, help)
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} counter"]
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(labels)} {value:g}")
+            for name, series in sorted(self._gauges.items()):
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} gauge"]
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {self._help[name]}", f"# TYPE {name} histogram"]
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class JsonlExport:
+    """Thread-safe JSON Lines file that rotates to ``<path>.1`` once it outgrows ``max_bytes``.
+
+    An empty path disables it. Write errors are swallowed: exports must
+    never break a research run.
+    """
+
+    def __init__(self, path: str, max_bytes: int = int(TRACE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        if not self.path:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            try:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                size = self._file.tell()
+                if self.max_bytes and size and size + len(line) > self.max_bytes:
+                    self._file.close()
+                    os.replace(self.path, self.path + '.1')
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+            except OSError:
+                self._file = None
+
+
+class Tracer:
+    """Records spans for research runs and aggregates them into metrics.
+
+    Spans nest through a context variable, so a browser fetch made while a
+    crew runs becomes a child of that crew's span, and they carry the event
+    session so each UI session can show its own latency breakdown. Finished
+    spans are folded into Prometheus histograms and, when TRACE_PATH is
+    set, appended to a size-capped JSONL trace file. When tracing is
+    disabled every call returns a shared no-op span without touching the
+    clock.
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, path: str = TRACE_PATH):
+        self.enabled = enabled
+        self.path = path
+        self.metrics = Metrics()
+        self._lock = threading.Lock()
+        self._export = JsonlExport(path)
+        self._sessions: 'OrderedDict[str, deque]' = OrderedDict()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any):
+        """Time the enclosed block as a span, nested under the current one"""
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        span = Span(self, name, _current_span.get(), attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+    def start_span(self, name: str, **attributes: Any):
+        """Start a span that is finished explicitly, for callback-style code"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, _current_span.get(), attributes)
+
+    def session_spans(self, session_id: str) -> List[Span]:
+        """Finished spans of one event session"""
+        with self._lock:
+            return list(self._sessions.get(session_id, ()))
+
+    def discard_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def breakdown(self, session_id: str) -> List[Dict[str, Any]]:
+        """Per-span-name count and total seconds for one session, slowest first"""
+        totals: Dict[str, Dict[str, Any]] = {}
+        for span in self.session_spans(session_id):
+            entry = totals.setdefault(span.name, {"name": span.name, "count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += span.duration
+        return sorted(totals.values(), key=lambda entry: entry["seconds"], reverse=True)
+
+    def _record(self, span: Span):
+        labels = {"span": span.name}
+        if 'agent' in span.attributes:
+            labels["agent"] = str(span.attributes['agent'])
+        self.metrics.observe("research_span_seconds", span.attributes['duration'],
+                             help="Duration of traced pipeline operations", **labels)
+        if 'error' in span.attributes:
+            self.metrics.inc("research_span_errors_total", help="Traced operations that raised", **labels)
+
+        with self._lock:
+            if span.session_id is not None:
+                spans = self._sessions.get(span.session_id)
+                if spans is None:
+                    spans = self._sessions[span.session_id] = deque(maxlen=TRACE_MAX_SPANS)
+                    # Sessions nobody discards (batch runs, abandoned jobs) age out
+                    while len(self._sessions) > TRACE_MAX_SESSIONS:
+                        self._sessions.popitem(last=False)
+                spans.append(span)
+        self._export.write(span.to_dict())
+
+
+def serve_metrics(port: int = METRICS_PORT, host: str = METRICS_HOST):
+    """Expose tracer.metrics on http://<host>:<port>/metrics in a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = tracer.metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+# Create a shared tracer instance
+tracer = Tracer()
@@ -1,32 +1,58 @@
 import gradio as gr
 from datetime import datetime
 import json
+import os
+import threading
 from typing import Dict, Any, List
-from crewai import Crew
 from event_system import event_system
-from agents import web_research_specialist, content_analyzer, fact_checker
-from tasks import get_research_task, get_analysis_task, get_fact_checking_task
+from citations import CitationIndex
+from run_store import STAGES
+from serving import RESEARCH_QUEUE_SIZE, RESEARCH_WORKERS, QueueFull, research_server
+from tracing import METRICS_PORT, serve_metrics, tracer
+
+# UI refresh configuration
+UI_REFRESH_INTERVAL = float(os.getenv('UI_REFRESH_INTERVAL', '0.25'))
+STREAM_PREVIEW_CHARS = int(os.getenv('STREAM_PREVIEW_CHARS', '4000'))
 
 class ResearchVisualizer:
-    def __init__(self):
+    def __init__(self, session_id=None):
+        self.session_id = session_id
         self.chat_history = []
         self.research_steps = []
-        self.citations = []
+        self.citations = CitationIndex()
         self.start_time = None
         self.current_thought = ""
         self.current_action = ""
         self.current_observation = ""
+
+        # Append-only render buffers; the joined text is cached until the next update
+        self._history_rows = []
+        self._step_blocks = []
+        self._steps_text = None
+        self._citations_text = None
+        self._stream_source = None
+        self._stream_parts = []
+        self._lock = threading.Lock()
+        self.changed = threading.Event()
         
-        # Subscribe to events
-        event_system.subscribe_to_step(self.update_step)
-        event_system.subscribe_to_citation(self.update_citation)
-        event_system.subscribe_to_message(self.update_message)
+        # Subscribe to this session's events only
+        self.subscriptions = [
+            event_system.subscribe_to_step(self.update_step, session_id),
+            event_system.subscribe_to_citation(self.update_citation, session_id),
+            event_system.subscribe_to_message(self.update_message, session_id),
+            event_system.subscribe_to_token(self.update_token, session_id),
+        ]
+
+    def close(self):
+        """Unsubscribe from the event system"""
+        for subscription in self.subscriptions:
+            subscription.unsubscribe()
+        self.subscriptions = []
+        if self.session_id is not None:
+            tracer.discard_session(self.session_id)
 
     def update_step(self, thought, action, input_data, observation):
         """Update research step information"""
-        self.current_thought = thought
-        self.current_action = action
-        self.current_observation = observation
         step = {
             "timestamp": datetime.now().strftime("%H:%M:%S"),
             "thought": thought,
@@ -34,63 +60,99 @@ class ResearchVisualizer:
             "input": input_data,
             "observation": observation
         }
-        self.research_steps.append(step)
-        return self.format_research_steps()  # Return updated steps for real-time display
+        block = f"[{step['timestamp']}] 🤖 {action}\n💭 Thought: {thought}\n"
+        if input_data:
+            block += f"📥 Input: {input_data}\n"
+        block += f"📝 Observation: {observation}\n\n"
+
+        with self._lock:
+            self.current_thought = thought
+            self.current_action = action
+            self.current_observation = observation
+            self.research_steps.append(step)
+            self._step_blocks.append(block)
+            self._steps_text = None
+        self.changed.set()
 
     def update_citation(self, title, url, content):
         """Update citation information"""
-        citation = {
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-            "title": title,
-            "url": url,
-            "content": content
-        }
-        self.citations.append(citation)
-        return self.format_citations()  # Return updated citations for real-time display
+        # Repeat visits and near-duplicate copies only bump the source's access count
+        self.citations.add(title, url, content)
+        with self._lock:
+            self._citations_text = None
+        self.changed.set()
 
     def update_message(self, role, content):
         """Update chat message"""
-        self.chat_history.append((role, content))
-        return self.format_chat_history()  # Return updated chat history for real-time display
-
-    def format_chat_history(self):
-        """Format chat history for Gradio"""
-        formatted_history = []
-        for role, content in self.chat_history:
+        with self._lock:
+            self.chat_history.append((role, content))
             if role == "user":
-                formatted_history.append([content, None])
+                self._history_rows.append([content, None])
             else:
-                if formatted_history and formatted_history[-1][1] is None:
-                    formatted_history[-1][1] = content
+                if self._history_rows and self._history_rows[-1][1] is None:
+                    self._history_rows[-1][1] = content
                 else:
-                    formatted_history.append([None, content])
+                    self._history_rows.append([None, content])
+                # A posted message supersedes the live token preview
+                self._stream_source = None
+                self._stream_parts = []
+        self.changed.set()
+
+    def update_token(self, source, token):
+        """Append a streamed LLM token to the live preview"""
+        with self._lock:
+            if source != self._stream_source:
+                self._stream_source = source
+                self._stream_parts = []
+            self._stream_parts.append(token)
+            # Keep the preview buffer bounded on long generations
+            if len(self._stream_parts) > 1024:
+                self._stream_parts = [''.join(self._stream_parts)[-STREAM_PREVIEW_CHARS:]]
+        self.changed.set()
+
+    def format_chat_history(self):
+        """Format chat history for Gradio"""
+        with self._lock:
+            formatted_history = [list(row) for row in self._history_rows]
+            if self._stream_parts:
+                preview = ''.join(self._stream_parts)[-STREAM_PREVIEW_CHARS:]
+                formatted_history.append([None, f"✍️ {self._stream_source} is writing...\n\n{preview}"])
         return formatted_history
 
     def format_research_steps(self):
         """Format research steps for display"""
-        if not self.research_steps:
-            return "No research steps yet."
-        
-        steps_text = "🔍 Research Process:\n\n"
-        for step in self.research_steps:
-            steps_text += f"[{step['timestamp']}] 🤖 {step['action']}\n"
-            steps_text += f"💭 Thought: {step['thought']}\n"
-            if step['input']:
-                steps_text += f"📥 Input: {step['input']}\n"
-            steps_text += f"📝 Observation: {step['observation']}\n\n"
-        return steps_text
+        with self._lock:
+            if not self._step_blocks:
+                return "No research steps yet."
+            if self._steps_text is None:
+                self._steps_text = "🔍 Research Process:\n\n" + ''.join(self._step_blocks)
+            return self._steps_text
 
     def format_citations(self):
         """Format citations for display"""
-        if not self.citations:
-            return "No citations yet."
-        
-        citations_text = "📚 Citations:\n\n"
-        for citation in self.citations:
-            citations_text += f"[{citation['timestamp']}] 📄 {citation['title']}\n"
-            citations_text += f"🔗 URL: {citation['url']}\n"
-            citations_text += f"📝 Content: {citation['content']}\n\n"
-        return citations_text
+        with self._lock:
+            if self._citations_text is None:
+                blocks = []
+                for citation in self.citations:
+                    block = (f"[{datetime.fromtimestamp(citation.first_seen).strftime('%H:%M:%S')}] "
+                             f"📄 {citation.title}\n"
+                             f"🔗 URL: {citation.url}\n")
+                    if citation.aliases:
+                        block += f"🪞 Also at: {', '.join(citation.aliases)}\n"
+                    if citation.count > 1:
+                        block += f"🔁 Accessed {citation.count} times\n"
+                    blocks.append(block + f"📝 Content: {citation.preview}\n\n")
+                self._citations_text = "📚 Citations:\n\n" + ''.join(blocks) if blocks else "No citations yet."
+            return self._citations_text
+
+    def render(self):
+        """Current state of every interface component"""
+        return (
+            self.format_chat_history(),
+            self.format_research_steps(),
+            self.format_citations(),
+            self.get_research_summary()
+        )
 
     def get_research_summary(self):
         """Get research summary statistics"""
@@ -98,86 +160,88 @@ class ResearchVisualizer:
             return "Research not started yet."
         
         duration = datetime.now() - self.start_time
-        return f"""
+        summary = f"""
         📊 Research Summary:
         - Total Steps: {len(self.research_steps)}
-        - Citations Collected: {len(self.citations)}
+        - Citations Collected: {len(self.citations)} sources ({self.citations.accesses} accesses)
         - Time Elapsed: {duration.seconds // 60}m {duration.seconds % 60}s
         """
+        if self.session_id is None or not tracer.enabled:
+            return summary
+        return summary + self.format_latency_breakdown()
+
+    def format_latency_breakdown(self):
+        """Where the time went, from this session's trace spans"""
+        breakdown = tracer.breakdown(self.session_id)
+        if not breakdown:
+            return ""
+        lines = ["", "⏱️ Latency Breakdown:"]
+        for entry in breakdown:
+            lines.append(f"- {entry['name']}: {entry['seconds']:.1f}s over {entry['count']} call(s)")
+
+        llm_calls = [span for span in tracer.session_spans(self.session_id) if span.name == "llm.call"]
+        if llm_calls:
+            prompt_tokens = sum(span.attributes.get('prompt_tokens', 0) for span in llm_calls)
+            completion_tokens = sum(span.attributes.get('completion_tokens', 0) for span in llm_calls)
+            ttft = sum(span.attributes.get('ttft', 0.0) for span in llm_calls) / len(llm_calls)
+            rates = [span.attributes['tokens_per_second'] for span in llm_calls
+                     if span.attributes.get('tokens_per_second')]
+            rate = sum(rates) / len(rates) if rates else 0.0
+            lines += ["", "🧠 LLM Usage:",
+                      f"- Calls: {len(llm_calls)}",
+                      f"- Tokens: {prompt_tokens} prompt, {completion_tokens} completion",
+                      f"- Avg time to first token: {ttft:.2f}s",
+                      f"- Avg throughput: {rate:.1f} tokens/s"]
+        return "\n".join(lines)
 
-def run_research_process(query, history):
-    """Run the research process and update the interface"""
+def run_research_process(query, history, rerun_from=""):
+    """Run the research process, streaming interface updates as events arrive.
+
+    ``rerun_from`` names the first stage to run again instead of loading its
+    checkpoint; empty reuses every checkpoint of an earlier identical run.
+    """
     if not query:
-        return history, "", "", ""
+        yield history, "", "", ""
+        return
     
-    # Initialize research
-    visualizer = ResearchVisualizer()
+    # Initialize research in its own event session
+    with event_system.session() as session_id:
+        visualizer = ResearchVisualizer(session_id)
     visualizer.start_time = datetime.now()
-    
-    # Add initial message
-    event_system.notify_message("user", query)
-    event_system.notify_message("assistant", "🔍 Starting research process...")
-    
+
     try:
-        # 1. Research Task
-        research_task = get_research_task(query)
-        research_crew = Crew(
-            agents=[web_research_specialist],
-            tasks=[research_task],
-            process="sequential",
-            verbose=True
-        )
-        research_output = research_crew.kickoff()
-        event_system.notify_message("assistant", f"📝 Research Findings:\n\n{research_output}")
-        
-        # 2. Analysis Task with research results as input
-        analysis_task = get_analysis_task(research_output)
-        analysis_crew = Crew(
-            agents=[content_analyzer],
-            tasks=[analysis_task],
-            process="sequential",
-            verbose=True
-        )
-        analysis_output = analysis_crew.kickoff()
-        event_system.notify_message("assistant", f"🔍 Analysis Results:\n\n{analysis_output}")
-        
-        # 3. Fact Checking Task with analysis results as input
-        fact_checking_task = get_fact_checking_task(analysis_output)
-        fact_checking_crew = Crew(
-            agents=[fact_checker],
-            tasks=[fact_checking_task],
-            process="sequential",
-            verbose=True
-        )
-        final_output = fact_checking_crew.kickoff()
-        
-        # Add final comprehensive result
-        final_summary = f"""
-        🎯 Final Research Results:
-        
-        1️⃣ Initial Research:
-        {research_output}
-        
-        2️⃣ Analysis:
-        {analysis_output}
-        
-        3️⃣ Fact Check:
-        {final_output}
-        """
-        event_system.notify_message("assistant", final_summary)
-        
-    except Exception as e:
-        error_msg = f"❌ An error occurred: {str(e)}"
-        event_system.notify_message("assistant", error_msg)
-        print(f"Error details: {e}")
-    
-    # Format and return updated interface components
-    formatted_history = visualizer.format_chat_history()
-    steps_text = visualizer.format_research_steps()
-    citations_text = visualizer.format_citations()
-    summary_text = visualizer.get_research_summary()
-    
-    return formatted_history, steps_text, citations_text, summary_text
+        job = research_server.submit(query, session_id, rerun_from or None)
+    except QueueFull:
+        visualizer.close()
+        busy = "🚦 All research slots are busy and the queue is full. Please try again in a few minutes."
+        yield history + [[query, busy]], "", "", ""
+        return
+
+    try:
+        while not job.done.is_set():
+            if job.status == "queued":
+                position = research_server.position(job)
+                eta = research_server.eta(job)
+                waiting = f"⏳ Waiting for a research slot: position {position} in queue, starts in about {eta / 60:.0f}m."
+                yield history + [[query, waiting]], "", "", ""
+                job.done.wait(timeout=1.0)
+                continue
+
+            # Wake on new events (or once a second for the elapsed-time counter),
+            # then sleep briefly so bursts of events coalesce into one refresh
+            visualizer.changed.wait(timeout=1.0)
+            visualizer.changed.clear()
+            yield visualizer.render()
+            job.done.wait(timeout=UI_REFRESH_INTERVAL)
+
+        # Deliver everything still queued before the final render
+        event_system.flush(timeout=5)
+        yield visualizer.render()
+    finally:
+        # The client disconnected or pressed Clear; stop the job if it is still going
+        if not job.done.is_set():
+            research_server.cancel(job)
+        visualizer.close()
 
 def create_gradio_interface():
     """Create the Gradio interface"""
@@ -197,7 +261,15 @@ def create_gradio_interface():
                     placeholder="Enter your research question...",
                     show_label=False
                 )
-                clear = gr.Button("Clear")
+                with gr.Row():
+                    rerun_from = gr.Dropdown(
+                        choices=[("Reuse saved stages", "")] + [(f"Re-run from {stage.replace('_', ' ')}", stage)
+                                                                for stage in STAGES],
+                        value="",
+                        show_label=False,
+                        scale=3
+                    )
+                    clear = gr.Button("Clear", scale=1)
             
             with gr.Column(scale=1):
                 with gr.Tab("Research Steps"):
@@ -218,25 +290,32 @@ def create_gradio_interface():
                     summary_display = gr.Textbox(
                         value="Research not started yet.",
                         label="Research Summary",
-                        lines=10
+                        lines=20
                     )
         
         # Set up event handlers
-        query.submit(
+        # Admission control happens in research_server, so let every admitted
+        # or queued request hold a Gradio slot while it streams updates
+        research_event = query.submit(
             run_research_process,
-            [query, chatbot],
-            [chatbot, steps_display, citations_display, summary_display]
+            [query, chatbot, rerun_from],
+            [chatbot, steps_display, citations_display, summary_display],
+            concurrency_limit=RESEARCH_WORKERS + RESEARCH_QUEUE_SIZE
         )
         
+        # Clearing cancels the in-flight job through the generator's cleanup
         clear.click(
             lambda: ([], "", "", ""),
             None,
             [chatbot, steps_display, citations_display, summary_display],
+            cancels=[research_event],
             queue=False
         )
     
     return interface
 
 if __name__ == "__main__":
+    if METRICS_PORT:
+        serve_metrics(METRICS_PORT)
     interface = create_gradio_interface()
     interface.launch(share=False) 
\ No newline at end of file
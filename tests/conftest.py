@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Modules read their configuration at import time, so point every cache at a
+# scratch directory and deliver events synchronously before anything imports them
+os.environ.setdefault('RESEARCH_CACHE_DIR', tempfile.mkdtemp(prefix='research-tests-'))
+os.environ.setdefault('EVENT_DISPATCH', 'sync')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -0,0 +1,110 @@
+import pytest
+
+from tools import browser_pool as pool_module
+from tools.browser_pool import BrowserPool, _BrowserWorker
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+
+    def new_page(self):
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+    def clear_cookies(self):
+        pass
+
+    def route(self, pattern, handler):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+
+    def is_connected(self):
+        return self.connected and not self.closed
+
+    def new_context(self):
+        return FakeContext()
+
+    def close(self):
+        self.closed = True
+
+
+class FakeChromium:
+    def __init__(self):
+        self.launched = []
+
+    def launch(self, headless=True):
+        browser = FakeBrowser()
+        self.launched.append(browser)
+        return browser
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+
+def _worker():
+    worker = _BrowserWorker(BrowserPool(size=1), 0)
+    worker._playwright = FakePlaywright()
+    return worker
+
+
+def test_page_is_closed_when_the_job_raises():
+    def failing_job(page):
+        raise ValueError("boom")
+
+    worker = _worker()
+    with pytest.raises(ValueError):
+        worker._execute(failing_job)
+    assert worker._context.pages[0].closed
+    # The warm browser survives a failing job
+    assert worker._execute(lambda page: "ok") == "ok"
+    assert len(worker._playwright.chromium.launched) == 1
+
+
+def test_browser_is_recycled_after_max_navigations(monkeypatch):
+    monkeypatch.setattr(pool_module, 'BROWSER_MAX_NAVIGATIONS', 2)
+    worker = _worker()
+    for _ in range(3):
+        worker._execute(lambda page: None)
+    launched = worker._playwright.chromium.launched
+    assert len(launched) == 2 and launched[0].closed and not launched[1].closed
+
+
+def test_browser_is_recycled_when_rss_exceeds_limit(monkeypatch):
+    monkeypatch.setattr(pool_module, 'BROWSER_MAX_NAVIGATIONS', 0)
+    monkeypatch.setattr(pool_module, 'BROWSER_MAX_RSS_MB', 100)
+    rss = [50.0]
+    monkeypatch.setattr(pool_module, '_descendant_rss_mb', lambda: rss[0])
+    worker = _worker()
+    worker._execute(lambda page: None)
+    worker._execute(lambda page: None)
+    assert len(worker._playwright.chromium.launched) == 1
+    rss[0] = 500.0
+    worker._execute(lambda page: None)
+    assert len(worker._playwright.chromium.launched) == 2
+
+
+def test_disconnected_browser_is_relaunched_by_the_health_check():
+    worker = _worker()
+    worker._execute(lambda page: None)
+    first = worker._playwright.chromium.launched[0]
+    first.connected = False
+    worker._execute(lambda page: None)
+    launched = worker._playwright.chromium.launched
+    assert len(launched) == 2 and launched[1] is worker._browser
@@ -0,0 +1,25 @@
+from citations import CITATION_PREVIEW_CHARS, CitationIndex
+
+
+INTRO = " ".join(f"Shared site header word{i} about the publisher and its newsletter." for i in range(12))
+
+
+def _article(topic):
+    return INTRO + " " + " ".join(f"Paragraph {i} reports on {topic} with detail number {i * 7}." for i in range(60))
+
+
+def test_pages_sharing_a_long_intro_stay_separate_sources():
+    index = CitationIndex()
+    assert len(INTRO) > CITATION_PREVIEW_CHARS
+    _, new_a = index.add("A", "https://a.example/story", _article("solar panel tariffs"))
+    _, new_b = index.add("B", "https://a.example/other", _article("river flood defences"))
+    assert new_a and new_b and len(index) == 2
+
+
+def test_mirrored_page_is_folded_into_the_first_source():
+    index = CitationIndex()
+    article = _article("solar panel tariffs")
+    first, _ = index.add("A", "https://a.example/story", article)
+    mirror, new = index.add("A (syndicated)", "https://mirror.example/a", article.replace("detail number 7.", "detail 7."))
+    assert not new and mirror is first and first.aliases == ("https://mirror.example/a",)
+    assert first.preview == article[:CITATION_PREVIEW_CHARS] + "..."
@@ -0,0 +1,40 @@
+import agents
+from claims import ClaimVerifier, VerdictCache
+from llm_gateway import llm_gateway
+
+
+def test_verdict_cache_key_covers_model_settings_and_evidence(tmp_path):
+    cache = VerdictCache(str(tmp_path / "verdicts.sqlite3"))
+    result = {"verdict": "supported", "confidence": "high", "explanation": "x", "sources": ["https://a.org"]}
+    cache.put("Acme was founded in 1999.", "ollama/m@temperature=0.3", "evidence A", result)
+
+    # Claim text and evidence whitespace are normalized
+    assert cache.get("acme was founded in 1999", "ollama/m@temperature=0.3", "evidence  A")["cached"]
+    assert cache.get("Acme was founded in 1999.", "ollama/m@temperature=0.7", "evidence A") is None
+    assert cache.get("Acme was founded in 1999.", "ollama/small@temperature=0.3", "evidence A") is None
+    assert cache.get("Acme was founded in 1999.", "ollama/m@temperature=0.3", "evidence B") is None
+
+
+def test_verdict_cache_respects_ttl(tmp_path):
+    cache = VerdictCache(str(tmp_path / "verdicts.sqlite3"), ttl=-1)
+    cache.put("Acme was founded in 1999.", "m", "", {"verdict": "refuted", "confidence": "low",
+                                                     "explanation": "", "sources": []})
+    assert cache.get("Acme was founded in 1999.", "m", "") is None
+
+
+def test_claim_parallelism_defaults_to_one_more_than_the_gateway_limit(monkeypatch):
+    monkeypatch.setattr(llm_gateway, 'max_in_flight', 2)
+    assert ClaimVerifier(object()).parallelism == 3
+    assert ClaimVerifier(object(), parallelism=5).parallelism == 5
+
+
+def test_fact_checkers_are_reused_but_never_shared(monkeypatch):
+    built = []
+    monkeypatch.setattr(agents, 'build_fact_checker', lambda *key: built.append(object()) or built[-1])
+    monkeypatch.setattr(agents, '_idle_fact_checkers', {})
+    with agents.lease_fact_checker("m", "http://ollama") as first:
+        with agents.lease_fact_checker("m", "http://ollama") as second:
+            assert first is not second
+    with agents.lease_fact_checker("m", "http://ollama") as again:
+        assert again in (first, second)
+    assert len(built) == 2
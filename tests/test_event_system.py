@@ -0,0 +1,99 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from event_system import _EventQueue, event_system
+
+
+def test_session_subscribers_only_see_their_own_session():
+    seen_a, seen_all = [], []
+    with event_system.subscribe_to_message(lambda *args: seen_all.append(args)):
+        with event_system.session("a"):
+            subscription = event_system.subscribe_to_message(lambda *args: seen_a.append(args))
+        with subscription:
+            with event_system.session("a"):
+                event_system.notify_message("assistant", "for a")
+            with event_system.session("b"):
+                event_system.notify_message("assistant", "for b")
+            event_system.flush(timeout=5)
+
+    assert seen_a == [("assistant", "for a")]
+    assert seen_all == [("assistant", "for a"), ("assistant", "for b")]
+
+
+def test_session_follows_work_submitted_with_a_copied_context():
+    seen = []
+    with event_system.session("worker") as session_id:
+        with event_system.subscribe_to_step(lambda *args: seen.append(args[0])):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, event_system.notify_step,
+                                           f"step {i}", "Test", "", "") for i in range(4)]
+                for future in futures:
+                    future.result()
+            # Published from a thread without the session: must not leak in
+            thread = threading.Thread(target=event_system.notify_step, args=("stray", "Test", "", ""))
+            thread.start()
+            thread.join()
+            event_system.flush(timeout=5)
+    assert session_id == "worker"
+    assert sorted(seen) == ["step 0", "step 1", "step 2", "step 3"]
+
+
+def test_muted_context_publishes_nothing():
+    seen = []
+    with event_system.subscribe_to_citation(lambda *args: seen.append(args)):
+        with event_system.muted():
+            event_system.notify_citation("t", "https://a.org", "c")
+        event_system.notify_citation("t", "https://b.org", "c")
+        event_system.flush(timeout=5)
+    assert [url for _, url, _ in seen] == ["https://b.org"]
+
+
+def test_coalesce_merges_tokens_and_never_drops_them():
+    queue = _EventQueue(3, 'coalesce')
+    queue.put(('token', 's1', ('agent', 'hel')))
+    queue.put(('step', 's2', ('t', 'a', 'i', 'o')))
+    queue.put(('message', 's2', ('assistant', 'hi')))
+    queue.put(('token', 's1', ('agent', 'lo')))  # Full: merged into the queued token
+    queue.put(('citation', 's2', ('t', 'u', 'c')))  # Full, nothing to merge: the step goes
+
+    assert list(queue._items) == [
+        ('token', 's1', ('agent', 'hello')),
+        ('message', 's2', ('assistant', 'hi')),
+        ('citation', 's2', ('t', 'u', 'c')),
+    ]
+    assert queue.dropped == 1
+
+
+def test_coalesce_keeps_per_session_order():
+    queue = _EventQueue(2, 'coalesce')
+    queue.put(('token', 's1', ('agent', 'a')))
+    queue.put(('message', 's1', ('assistant', 'done')))
+    waiting = threading.Thread(target=queue.put, args=(('token', 's1', ('agent', 'b')),))
+    waiting.start()
+    waiting.join(timeout=0.2)
+    # The token can't be merged past the message, so the publisher waits for room
+    assert waiting.is_alive()
+    assert queue.get() == ('token', 's1', ('agent', 'a'))
+    waiting.join(timeout=5)
+    assert list(queue._items) == [('message', 's1', ('assistant', 'done')), ('token', 's1', ('agent', 'b'))]
+
+
+def test_block_policy_handler_republishing_into_a_full_queue_does_not_deadlock():
+    queue = _EventQueue(2, 'block')
+    queue.put(('token', 's1', ('agent', 'a')))
+    queue.put(('step', 's1', ('t', 'a', 'i', 'o')))
+
+    def dispatch_once():
+        queue.get()
+        queue.put(('message', 's1', ('assistant', 'x')))  # Fills the queue again
+        # A handler reacting to that event publishes once more
+        queue.put(('message', 's1', ('assistant', 'y')))
+
+    dispatcher = threading.Thread(target=dispatch_once)
+    dispatcher.start()
+    dispatcher.join(timeout=5)
+    assert not dispatcher.is_alive()
+    # The queued step made room, as under the coalesce policy
+    assert list(queue._items) == [('message', 's1', ('assistant', 'x')), ('message', 's1', ('assistant', 'y'))]
+    assert queue.dropped == 1
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain_community")
+
+from langchain_core.messages import HumanMessage
+
+import llm_cache
+from llm_cache import CachedChatOllama
+from routing import RouteDecision, route_scope
+
+
+def test_llm_cache_key_covers_routed_model_and_sampling():
+    llm = CachedChatOllama(model="ollama/big", temperature=0)
+    messages = [HumanMessage(content="What  is X?")]
+    key = llm._cache_key(messages, None)
+    assert key == llm._cache_key([HumanMessage(content="What is X?")], None)
+    assert key != CachedChatOllama(model="ollama/other", temperature=0)._cache_key(messages, None)
+    with route_scope(RouteDecision("research", "q", "ollama/big", "ollama/small", 0, [])):
+        assert llm._cache_key(messages, None) != key
+
+
+def test_payload_names_the_routed_model_without_provider_prefix(monkeypatch):
+    sent = []
+
+    def fake_stream(url, payload, headers, timeout, check):
+        sent.append(payload["model"])
+        yield json.dumps({"message": {"content": "ok"}, "done": True})
+
+    monkeypatch.setattr(llm_cache.llm_gateway, 'stream', fake_stream)
+    llm = CachedChatOllama(model="ollama/big", temperature=0)
+    list(llm._create_stream("http://ollama/api/chat", {"messages": []}))
+    with route_scope(RouteDecision("research", "q", "ollama/big", "ollama/small", 0, [])):
+        list(llm._create_stream("http://ollama/api/chat", {"messages": []}))
+    assert sent == ["big", "small"]
+
+
+def test_sampling_agents_are_cached_end_to_end(monkeypatch, tmp_path):
+    calls = []
+
+    def fake_stream(url, payload, headers, timeout, check):
+        calls.append(payload)
+        for token in ("Cached ", "answer"):
+            yield json.dumps({"message": {"role": "assistant", "content": token}, "done": False})
+        yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True})
+
+    monkeypatch.setattr(llm_cache.llm_gateway, 'stream', fake_stream)
+    monkeypatch.setattr(llm_cache, 'llm_cache', llm_cache.LLMResponseCache(str(tmp_path / "llm.sqlite3")))
+    # The agents' own settings: a sampling temperature with streaming on
+    llm = CachedChatOllama(agent_name="Content Analyzer", model="ollama/big", temperature=0.5, streaming=True)
+
+    first = llm.invoke([HumanMessage(content="Summarise X")])
+    second = llm.invoke([HumanMessage(content="Summarise X")])
+    assert first.content == second.content == "Cached answer"
+    assert len(calls) == 1
+    assert calls[0]["options"]["seed"] == llm_cache.LLM_CACHE_SEED
+    assert llm_cache.llm_cache.stats["Content Analyzer"]["hits"] == 1
@@ -0,0 +1,16 @@
+from tools.page_cache import PageCache, normalize_url
+
+
+def test_normalize_url_ignores_tracking_params_default_ports_and_fragments():
+    assert normalize_url("HTTPS://Example.com:443/a?b=2&utm_source=x&a=1#top") == "https://example.com/a?a=1&b=2"
+    assert normalize_url("example.com") == "https://example.com/"
+    assert normalize_url("http://example.com:8080/") != normalize_url("http://example.com/")
+
+
+def test_page_cache_round_trip_shares_entry_between_equivalent_urls(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite3"))
+    cache.put("https://example.com/a?utm_campaign=z", "Title", "<p>Hello</p>", "Hello", etag='"v1"')
+    cached = cache.get("https://EXAMPLE.com/a")
+    assert cached["text"] == "Hello" and cached["etag"] == '"v1"' and cached["fresh"]
+    assert cache.get_html("https://example.com/a") == "<p>Hello</p>"
+    assert cache.get("https://example.com/b") is None
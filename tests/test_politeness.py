@@ -0,0 +1,46 @@
+import threading
+
+from tools.politeness import PolitenessScheduler
+from tracing import tracer
+
+
+def test_robots_fetch_holds_a_host_slot():
+    scheduler = PolitenessScheduler(rate=100, burst=10, connections=1)
+    seen = []
+
+    def fetch_robots(robots_url):
+        seen.append((robots_url, scheduler._hosts["example.com"].active))
+        return "User-agent: *\nDisallow: /private"
+
+    assert scheduler.allowed("https://example.com/page", fetch_robots)
+    assert not scheduler.allowed("https://example.com/private/x", fetch_robots)
+    assert seen == [("https://example.com/robots.txt", 1)]
+    assert scheduler._hosts["example.com"].active == 0
+
+
+def test_robots_fetch_waits_for_a_busy_host():
+    scheduler = PolitenessScheduler(rate=100, burst=10, connections=1)
+    holding, released = threading.Event(), threading.Event()
+
+    def hold_slot():
+        with scheduler.slot("https://example.com/a"):
+            holding.set()
+            released.wait(5)
+
+    worker = threading.Thread(target=hold_slot)
+    worker.start()
+    holding.wait(5)
+    threading.Timer(0.1, released.set).start()
+    fetched_while_busy = []
+    scheduler.allowed("https://example.com/b", lambda robots_url: fetched_while_busy.append(not released.is_set()))
+    worker.join()
+    assert fetched_while_busy == [False]
+
+
+def test_throttled_metric_has_no_per_host_series():
+    scheduler = PolitenessScheduler()
+    for host in ("a.example", "b.example", "c.example"):
+        scheduler.throttled(f"https://{host}/", retry_after="0")
+    rendered = tracer.metrics.render()
+    assert "fetch_throttled_total" in rendered
+    assert "a.example" not in rendered
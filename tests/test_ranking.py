@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from tools.ranking import RANK_CHUNK_CHARS, estimate_tokens, format_passages, select_passages
+
+WORDS = "solar wind grid price subsidy market energy policy storage demand".split()
+
+
+def page(words: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def test_short_page_is_returned_whole():
+    text = page(20)
+    assert select_passages(text, "solar subsidy", 1500) == [
+        {"start": 0, "end": len(text), "text": text, "score": None}]
+
+
+@pytest.mark.parametrize("budget", [1, 2, 5, 50, 150, 200, 250, 1500])
+@pytest.mark.parametrize("seed", range(5))
+def test_long_page_always_yields_passages_within_budget(budget, seed):
+    text = page(3000, seed)
+    passages = select_passages(text, "solar subsidy impact", budget)
+    assert passages
+    assert sum(estimate_tokens(p["text"]) for p in passages) <= budget + len(passages)
+    for passage in passages:
+        assert text[passage["start"]:passage["end"]] == passage["text"]
+
+
+def test_budget_smaller_than_a_default_chunk_keeps_relevant_text():
+    filler = page(1000, seed=1).replace('solar', 'sun')
+    text = f"{filler} the solar subsidy doubled installations {filler}"
+    budget = RANK_CHUNK_CHARS // 8  # Far below one default chunk
+    passages = select_passages(text, "solar subsidy", budget)
+    assert "solar subsidy" in format_passages(passages)
+
+
+def test_unbreakable_text_is_truncated_not_dropped():
+    passages = select_passages("x" * 5000, "anything", 3)
+    assert len(passages) == 1 and 0 < len(passages[0]["text"]) <= 8
@@ -0,0 +1,41 @@
+import json
+
+import routing
+from routing import RouteDecision, filter_stream, ollama_model_name
+
+
+def _lines(text, size=20):
+    return [json.dumps({"message": {"content": text[i:i + size]}}) for i in range(0, len(text), size)]
+
+
+def _decision():
+    decision = RouteDecision("analysis", "q", "ollama/big", "ollama/small", 0, [])
+    decision.sections = ["key findings", "sources"]
+    return decision
+
+
+ANSWER = ("Final Answer:\nKey findings\n" + "Finding text. " * 20 + "\n\n"
+          "Sources\n" + "First source paragraph. " * 10 + "\n\n" + "Second source paragraph. " * 10)
+
+
+def test_ollama_model_name_strips_the_provider_prefix():
+    assert ollama_model_name("ollama/qwen2.5:3b") == "qwen2.5:3b"
+    assert ollama_model_name("qwen2.5:3b") == "qwen2.5:3b"
+    assert ollama_model_name("library/model") == "library/model"
+
+
+def test_early_stop_is_off_by_default():
+    decision = _decision()
+    streamed = ''.join(json.loads(line)["message"]["content"] for line in filter_stream(_lines(ANSWER), decision))
+    assert streamed == ANSWER
+    assert decision.early_stops == 0
+
+
+def test_early_stop_keeps_a_full_paragraph_of_the_last_section(monkeypatch):
+    monkeypatch.setattr(routing, 'ROUTING_EARLY_STOP', True)
+    decision = _decision()
+    streamed = ''.join(json.loads(line)["message"]["content"] for line in filter_stream(_lines(ANSWER), decision))
+    assert decision.early_stops == 1
+    # Stops within the chunk that ends the first paragraph after the last heading
+    assert "First source paragraph. " * 10 in streamed
+    assert len(streamed) < ANSWER.index("Second") + 20
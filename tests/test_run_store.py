@@ -0,0 +1,59 @@
+import json
+import os
+import time
+
+from run_store import RunStore, run_store
+
+
+def test_stage_key_depends_on_upstream_and_variant():
+    class Agent:
+        role = "Analyst"
+        llm = None
+
+    key = run_store.stage_key("What is X?", "analysis", Agent(), "up1")
+    assert key == run_store.stage_key("What   is X?", "analysis", Agent(), "up1")
+    assert key != run_store.stage_key("What is X?", "analysis", Agent(), "up2")
+    assert key != run_store.stage_key("What is X?", "analysis", Agent(), "up1", variant="ollama/small")
+
+
+def _backdate(store, query, stage, key, seconds):
+    """Make a saved checkpoint look ``seconds`` old"""
+    path = store._path(query, stage, key)
+    past = time.time() - seconds
+    with open(path, encoding='utf-8') as f:
+        record = json.load(f)
+    record["created_at"] = past
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    os.utime(path, (past, past))
+    return path
+
+
+def test_expired_checkpoints_are_not_loaded(tmp_path):
+    store = RunStore(str(tmp_path), max_age=3600)
+    store.save("q", "research", "k1", "findings", [])
+    assert store.load("q", "research", "k1")["output"] == "findings"
+    _backdate(store, "q", "research", "k1", 7200)
+    assert store.load("q", "research", "k1") is None
+    assert RunStore(str(tmp_path), max_age=0).load("q", "research", "k1")["output"] == "findings"
+
+
+def test_prune_removes_expired_checkpoints_and_empty_runs(tmp_path):
+    store = RunStore(str(tmp_path), max_age=3600)
+    store.save("old", "research", "k1", "stale", [])
+    store.save("new", "research", "k2", "fresh", [])
+    old_path = _backdate(store, "old", "research", "k1", 7200)
+
+    assert store.prune() == 1
+    assert not os.path.exists(old_path) and not os.path.exists(os.path.dirname(old_path))
+    assert store.load("new", "research", "k2")["output"] == "fresh"
+
+
+def test_stage_key_changes_with_the_task_prompt():
+    class Agent:
+        role = "Analyst"
+        llm = None
+
+    key = run_store.stage_key("q", "analysis", Agent(), "up", prompt="Analyze the findings below")
+    assert key == run_store.stage_key("q", "analysis", Agent(), "up", prompt="Analyze the findings below")
+    assert key != run_store.stage_key("q", "analysis", Agent(), "up", prompt="Analyze and rank the findings below")